@@ -0,0 +1,46 @@
+"""
+Measures building of a serialized 100k-call batch.
+
+    python benchmarks/bench_batch_assembly.py
+
+Compares the batch mode of Client (one dict and uuid4 id per call, then
+`dumps` of the whole list) with `Client.dump_batch`.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import os
+import sys
+import timeit
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsonrpcparts import Client, JSONRPC20Serializer
+
+SIZE = 100000
+
+
+def batch_mode():
+    with Client(JSONRPC20Serializer) as batch:
+        for index in xrange(SIZE):
+            batch.call('store', index, 'value')
+        return JSONRPC20Serializer.dumps(batch.get_batched())
+
+
+def bulk():
+    output = StringIO()
+    Client(JSONRPC20Serializer).dump_batch((('store', [index, 'value']) for index in xrange(SIZE)), output)
+    return output.getvalue()
+
+
+def main():
+    previous = min(timeit.repeat(batch_mode, number=1, repeat=3))
+    current = min(timeit.repeat(bulk, number=1, repeat=3))
+
+    print 'Serialized batch of %d calls (milliseconds):' % SIZE
+    print '  batch mode + dumps: %8.1f' % (previous * 1e3)
+    print '  dump_batch:         %8.1f  (%.1fx faster)' % (current * 1e3, previous / current)
+
+
+if __name__ == '__main__':
+    main()
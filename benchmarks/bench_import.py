@@ -0,0 +1,49 @@
+"""
+Measures the time it takes to import the package in a fresh interpreter.
+
+    python benchmarks/bench_import.py
+
+Compares `import jsonrpcparts` (what a server process pays) with importing
+the web client and with `import requests` alone (what the package used
+to pay on import, because `jsonrpcparts/__init__.py` imported the client).
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import sys, time
+sys.path.insert(0, %r)
+before = len(sys.modules)
+started = time.time()
+%s
+print time.time() - started, len(sys.modules) - before
+"""
+
+
+def measure(statement, repeat=7):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', MEASURE % (ROOT, statement)])
+        seconds, modules = output.split()
+        runs.append((float(seconds), int(modules)))
+    return min(runs)
+
+
+def main():
+    print 'Import in a fresh interpreter (best of 7, milliseconds, modules loaded):'
+    for statement in (
+        'import jsonrpcparts',
+        'from jsonrpcparts import WebClient',
+        'import requests',
+    ):
+        seconds, modules = measure(statement)
+        print '  %-36s %6.1f  %4d' % (statement, seconds * 1e3, modules)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Measures the cost of call middleware.
+
+    python benchmarks/bench_middleware.py
+
+Chains of pass-through middleware of several depths are called directly,
+then with a batch of 100 calls going through `handle_request_string`.
+Compares the compiled chain (add_call_middleware) with the usual
+alternative - a process_method override that walks the list of
+middleware, making a closure per step.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsonrpcparts import JSONPRCApplication, JSONRPC20Serializer
+
+DEPTHS = [0, 1, 2, 4, 8]
+
+
+def passing(call_next, name, method, args, kwargs, request_id, context):
+    return call_next(name, method, args, kwargs, request_id, context)
+
+
+def add(a, b):
+    return a + b
+
+
+class LoopingApplication(JSONPRCApplication):
+    """Middleware the way subclasses do it without the middleware API"""
+
+    def __init__(self, middleware):
+        super(LoopingApplication, self).__init__()
+        self.middleware = middleware
+
+    def process_method(self, method, args, kwargs, request_id=None, **context):
+        middleware = self.middleware
+
+        def call(index, name, method, args, kwargs, request_id, context):
+            if index == len(middleware):
+                return method(*args, **kwargs)
+
+            def call_next(name, method, args, kwargs, request_id, context):
+                return call(index + 1, name, method, args, kwargs, request_id, context)
+
+            return middleware[index](call_next, None, method, args, kwargs, request_id, context)
+
+        return call(0, None, method, args, kwargs, request_id, context)
+
+
+def best_of(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    batch = JSONRPC20Serializer.json_dumps([
+        JSONRPC20Serializer.assemble_request('add', [1, 2])
+        for _ in range(100)
+    ])
+
+    number = 100000
+    print 'Chain alone (microseconds per call):'
+    print '  depth   compiled   looping'
+    for depth in DEPTHS:
+        compiled = JSONPRCApplication()
+        for _ in range(depth):
+            compiled.add_call_middleware(passing)
+        chain = compiled._process_call or compiled._call_method
+        looping = LoopingApplication([passing] * depth)
+
+        print '  %5d   %8.2f  %8.2f' % (
+            depth,
+            best_of(lambda: chain('add', add, [1, 2], {}, 1, {}), number),
+            best_of(lambda: looping.process_method(add, [1, 2], {}, request_id=1), number)
+        )
+
+    number = 200
+    print 'Batch of 100 calls through handle_request_string (microseconds per call):'
+    print '  depth   compiled   looping'
+    for depth in DEPTHS:
+        compiled = JSONPRCApplication()
+        compiled.register_function(add)
+        for _ in range(depth):
+            compiled.add_call_middleware(passing)
+
+        looping = LoopingApplication([passing] * depth)
+        looping.register_function(add)
+
+        print '  %5d   %8.2f  %8.2f' % (
+            depth,
+            best_of(lambda: compiled.handle_request_string(batch), number) / 100,
+            best_of(lambda: looping.handle_request_string(batch), number) / 100
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Measures validation of request objects in big batches.
+
+    python benchmarks/bench_parse_request.py
+
+Compares `JSONRPC20Serializer._parse_batch` with the element by element
+parsing it replaced (kept below as `previous_parse_single_request`), on
+already decoded batches - JSON decoding costs the same either way - and
+shows the share of validation in the whole `parse_request`.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsonrpcparts import JSONRPC20Serializer, errors
+from jsonrpcparts.rawjson import RawJSON
+from jsonrpcparts.serializers import ParsedRequest
+
+
+def previous_parse_single_request(request_data):
+    request_id = request_data.get('id', None)
+
+    for argument in ['jsonrpc', 'method']:
+        if argument not in request_data:
+            raise errors.RPCInvalidRequest('argument "%s" missing.' % argument, request_id)
+        if not isinstance(request_data[argument], (str, unicode)):
+            raise errors.RPCInvalidRequest('value of argument "%s" must be a string.' % argument, request_id)
+
+    if request_data["jsonrpc"] != "2.0":
+        raise errors.RPCInvalidRequest('Invalid jsonrpc version.', request_id)
+
+    if "params" in request_data:
+        if not isinstance(request_data["params"], (list, tuple, dict, RawJSON)):
+            raise errors.RPCInvalidMethodParams(
+                'value of argument "parameter" is of non-supported type %s' % type(request_data["params"]),
+                request_id
+            )
+
+    return (
+        request_data["method"],
+        request_data.get("params", None),
+        request_id
+    )
+
+
+def previous_parse_batch(batch):
+    parsed = []
+    for request_data in batch:
+        try:
+            method, params, request_id = previous_parse_single_request(request_data)
+            parsed.append(ParsedRequest(method, params, request_id, None))
+        except errors.RPCFault as ex:
+            parsed.append(ParsedRequest(None, None, ex.request_id, ex))
+    return parsed
+
+
+def best_of(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number
+
+
+def main():
+    size = 10000
+    requests = [
+        JSONRPC20Serializer.assemble_request('method_%d' % (index % 10), [index, 'a'])
+        for index in range(size)
+    ]
+    request_string = JSONRPC20Serializer.json_dumps(requests)
+    batch = JSONRPC20Serializer.json_loads(request_string)
+
+    assert previous_parse_batch(batch) == JSONRPC20Serializer._parse_batch(batch)
+
+    number = 20
+    previous = best_of(lambda: previous_parse_batch(batch), number)
+    bulk = best_of(lambda: JSONRPC20Serializer._parse_batch(batch), number)
+    single = best_of(
+        lambda: [JSONRPC20Serializer._parse_single_request_trap_errors(request) for request in batch],
+        number
+    )
+    whole = best_of(lambda: JSONRPC20Serializer.parse_request(request_string), number)
+
+    print 'Validating a decoded batch of %d request objects (milliseconds):' % size
+    print '  previous element by element:  %7.2f' % (previous * 1e3)
+    print '  element by element now:       %7.2f' % (single * 1e3)
+    print '  bulk (_parse_batch):          %7.2f  (%.1fx faster than previous)' % (bulk * 1e3, previous / bulk)
+    print 'Whole parse_request, JSON decoding included: %.2f' % (whole * 1e3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Measures the cost of params validation.
+
+    python benchmarks/bench_validation.py
+
+Compares a compiled validator with handwritten checks of the same rules,
+and a whole batch going through `handle_request_string` with and without
+a params schema.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsonrpcparts import JSONPRCApplication, JSONRPC20Serializer
+from jsonrpcparts.validation import compile_params_validator
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'user_id': {'type': 'integer', 'minimum': 1},
+        'name': {'type': 'string', 'maxLength': 64},
+        'tags': {'type': 'array', 'items': {'type': 'string'}, 'maxItems': 10}
+    },
+    'required': ['user_id', 'name'],
+    'additionalProperties': False
+}
+
+PARAMS = {'user_id': 42, 'name': u'Somebody', 'tags': [u'a', u'b', u'c']}
+
+
+def handwritten(params):
+    if not isinstance(params, dict):
+        raise ValueError('params')
+    if 'user_id' not in params or 'name' not in params:
+        raise ValueError('required')
+    user_id = params['user_id']
+    if not isinstance(user_id, (int, long)) or isinstance(user_id, bool) or user_id < 1:
+        raise ValueError('user_id')
+    name = params['name']
+    if not isinstance(name, basestring) or len(name) > 64:
+        raise ValueError('name')
+    if 'tags' in params:
+        tags = params['tags']
+        if not isinstance(tags, list) or len(tags) > 10:
+            raise ValueError('tags')
+        for tag in tags:
+            if not isinstance(tag, basestring):
+                raise ValueError('tag')
+    if set(params) - set(['user_id', 'name', 'tags']):
+        raise ValueError('additional')
+
+
+def update_user(user_id, name, tags=()):
+    return user_id
+
+
+def best_of(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    compiled = compile_params_validator(SCHEMA, ['user_id', 'name', 'tags'])
+
+    number = 100000
+    print 'Validator alone (microseconds per call):'
+    print '  compiled schema: %6.2f' % best_of(lambda: compiled(PARAMS), number)
+    print '  handwritten:     %6.2f' % best_of(lambda: handwritten(PARAMS), number)
+
+    plain = JSONPRCApplication()
+    plain.register_function(update_user)
+    validated = JSONPRCApplication()
+    validated.register_function(update_user, params_schema=SCHEMA)
+
+    batch = JSONRPC20Serializer.json_dumps([
+        JSONRPC20Serializer.assemble_request('update_user', PARAMS)
+        for _ in range(100)
+    ])
+
+    number = 200
+    print 'Batch of 100 calls through handle_request_string (microseconds per call):'
+    print '  without schema:  %6.2f' % (best_of(lambda: plain.handle_request_string(batch), number) / 100)
+    print '  with schema:     %6.2f' % (best_of(lambda: validated.handle_request_string(batch), number) / 100)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,48 @@
+import importlib
+import sys
+import types
+
 from . import errors
 from .application import JSONPRCCollection, JSONPRCApplication
 from .serializers import JSONRPC20Serializer, JSONRPC10Serializer
-from .client import Client, WebClient
 
 __version__ = '0.4.1'
+
+# Names the package offers, defined in modules that are imported on first
+# use of the name. The clients need `requests`, which takes longer to
+# import than all of the rest, and servers do not need the clients.
+_LAZY_NAMES = {
+    'Client': 'client',
+    'WebClient': 'client',
+}
+
+# `from jsonrpcparts import *` imports the lazy names too
+__all__ = [
+    'errors',
+    'JSONPRCCollection',
+    'JSONPRCApplication',
+    'JSONRPC20Serializer',
+    'JSONRPC10Serializer',
+] + sorted(_LAZY_NAMES)
+
+
+class _Package(types.ModuleType):
+    """The package module, with the names in _LAZY_NAMES loaded on first use"""
+
+    def __getattr__(self, name):
+        module_name = _LAZY_NAMES.get(name)
+        if module_name is None:
+            raise AttributeError("'module' object has no attribute '%s'" % name)
+        value = getattr(importlib.import_module('.' + module_name, __name__), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_LAZY_NAMES))
+
+
+_package = _Package(__name__)
+_package.__dict__.update(sys.modules[__name__].__dict__)
+# Python 2 clears globals of a module object that goes away, and the functions above use these
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
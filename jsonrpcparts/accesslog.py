@@ -0,0 +1,291 @@
+"""
+Structured access log: a JSON line per call (batch element) with the
+method, id, duration, error code, HTTP status and message sizes::
+
+    access_log = AccessLog(BackgroundLineWriter('/var/log/rpc/access.log'))
+    access_log.install(application)
+
+    {"time": 1700000000.12, "method": "get_user", "id": 7, "duration_ms": 1.9, "error": null,
+     "index": 0, "batch_size": 1, "status": 200, "request_bytes": 61, "response_bytes": 74,
+     "request_ms": 2.4, "remote_addr": "10.0.0.7", "path": "/rpc"}
+
+The request thread only puts the records into a queue. A background thread
+encodes them and writes them out in batches. When the queue is full,
+records are dropped and counted instead of slowing the requests down.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import collections
+import json
+import os
+import threading
+import time
+
+from . import errors
+from .context import RequestContext
+
+
+def _encode_json_line(record):
+    return json.dumps(record, separators=(',', ':'), default=repr)
+
+
+class BackgroundLineWriter(object):
+    """
+    Writes lines made of records by a background thread, a batch at a time.
+
+    Adding a record takes no lock: the queue is a deque. With a file path
+    as the output, each batch is one write(2) to a file opened for
+    appending, so processes sharing the file do not mix up their lines.
+
+    :Variables:
+        - written: number of lines written
+        - dropped: number of records dropped because the queue was full
+        - errors: number of records that could not be encoded
+    """
+
+    def __init__(self, output, encode=_encode_json_line, max_queue=10000, batch_size=512, flush_interval=0.2):
+        """
+        :Parameters:
+            - output: path of the file to append to, or a file-like object
+            - encode: function making a line (without the line end) of a record
+            - max_queue: records waiting to be written above this many are dropped
+            - batch_size: the writer wakes up early when this many records wait
+            - flush_interval: seconds the records wait at most
+        """
+        self.encode = encode
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        if isinstance(output, basestring):
+            self._fd = os.open(output, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+            self._output = None
+        else:
+            self._fd = None
+            self._output = output
+        self._queue = collections.deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def write(self, record):
+        """Queues the record for writing
+
+        :return: False if it was dropped (the queue is full or the writer closed)
+        """
+        queue = self._queue
+        if len(queue) >= self.max_queue or self._closed:
+            with self._lock:
+                self.dropped += 1
+            return False
+        if self._pid != os.getpid():
+            self._start()
+        queue.append(record)
+        if len(queue) >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _start(self):
+        with self._lock:
+            # threads do not survive fork, every process needs a writer of its own
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # waiting to be written by the parent process
+                self._queue.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='jsonrpcparts-access-log')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes out the queued records now"""
+        queue = self._queue
+        with self._write_lock:
+            while queue:
+                lines = []
+                while queue and len(lines) < self.batch_size:
+                    record = queue.popleft()
+                    try:
+                        lines.append(self.encode(record))
+                    except Exception:
+                        self.errors += 1
+                if not lines:
+                    continue
+                data = '\n'.join(lines) + '\n'
+                if isinstance(data, unicode):
+                    data = data.encode('utf-8')
+                if self._fd is not None:
+                    while data:
+                        data = data[os.write(self._fd, data):]
+                else:
+                    self._output.write(data)
+                    self._output.flush()
+                self.written += len(lines)
+
+    def close(self):
+        """Writes out what is queued and stops the writer. Records written afterwards are dropped."""
+        self._closed = True
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join()
+        self.flush()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class AccessLog(object):
+    """
+    Makes the access log records of the requests an application handles,
+    and hands them to a writer (BackgroundLineWriter).
+
+    Needs both of its middleware in the application, see `install`.
+    JSONPRCWSGIApplication adds HTTP status, sizes and the like to the
+    records. Requests handled elsewhere are logged without those.
+    """
+
+    def __init__(self, writer, clock=time.time):
+        """
+        :Parameters:
+            - writer: BackgroundLineWriter or anything with write(record) method
+            - clock: function returning current time in seconds
+        """
+        self.writer = writer
+        self.clock = clock
+
+    def install(self, application):
+        """Adds the middleware to the application (JSONPRCApplication) and
+        makes it (if it is a JSONPRCWSGIApplication) log HTTP data too"""
+        application.add_message_middleware(self.log_messages)
+        application.add_call_middleware(self.time_call)
+        if hasattr(application, 'handle_wsgi_request'):
+            application.access_log = self
+
+    def log_messages(self, process_next, requests, context):
+        """Message middleware making a record of every request of the message"""
+        request_context = context.get('request_context')
+        if request_context is None:
+            request_context = RequestContext()
+            context = dict(context, request_context=request_context)
+        if request_context.data is None:
+            request_context.data = {}
+        data = request_context.data
+        calls = data['access_log.calls'] = []
+
+        started = self.clock()
+        responses = process_next(requests, context)
+
+        errors_by_id = {}
+        for response in responses:
+            error = getattr(response, 'error', None)
+            if error is not None:
+                errors_by_id[getattr(response, 'request_id', None)] = error.error_code
+
+        records = []
+        call_index = 0
+        batch_size = len(requests)
+        for index, (method, params, request_id, error) in enumerate(requests):
+            duration_ms = None
+            if error is not None:
+                error_code = error.error_code
+            else:
+                error_code = errors_by_id.get(request_id) if request_id is not None else None
+                # calls were made in the order of the requests, skipping the failed ones
+                if call_index < len(calls) and calls[call_index][:2] == (method, request_id):
+                    _, _, duration, call_error_code = calls[call_index]
+                    call_index += 1
+                    duration_ms = duration * 1000
+                    if call_error_code is not None:
+                        error_code = call_error_code
+            records.append({
+                'time': started,
+                'method': method,
+                'id': request_id,
+                'duration_ms': duration_ms,
+                'error': error_code,
+                'index': index,
+                'batch_size': batch_size
+            })
+
+        if 'access_log.http' in data:
+            # written with the HTTP data, by log_http
+            data['access_log'] = records
+        else:
+            for record in records:
+                self.writer.write(record)
+        return responses
+
+    def time_call(self, call_next, name, method, args, kwargs, request_id, context):
+        """Call middleware timing the calls for log_messages"""
+        request_context = context.get('request_context')
+        calls = request_context.data.get('access_log.calls') if request_context and request_context.data else None
+        if calls is None:
+            return call_next(name, method, args, kwargs, request_id, context)
+
+        clock = self.clock
+        started = clock()
+        error_code = None
+        try:
+            return call_next(name, method, args, kwargs, request_id, context)
+        except errors.RPCFault as ex:
+            error_code = ex.error_code
+            raise
+        except Exception:
+            error_code = errors.INTERNAL_ERROR
+            raise
+        finally:
+            calls.append((name, request_id, clock() - started, error_code))
+
+    def start_http(self, request_context, start_response):
+        """Called by JSONPRCWSGIApplication before it handles a request
+
+        :return: start_response that notes the HTTP status for log_http
+        """
+        if request_context.data is None:
+            request_context.data = {}
+        data = request_context.data
+        data['access_log.http'] = None
+
+        def noting_start_response(status, headers, exc_info=None):
+            data['access_log.http'] = status
+            if exc_info is None:
+                return start_response(status, headers)
+            return start_response(status, headers, exc_info)
+
+        return noting_start_response
+
+    def log_http(self, request_context, body):
+        """Called by JSONPRCWSGIApplication with the response body, writes the records of the request"""
+        data = request_context.data
+        environ = request_context.environ or {}
+        status = data.get('access_log.http')
+        try:
+            request_bytes = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            request_bytes = None
+        http = {
+            'status': int(status.split(None, 1)[0]) if status else None,
+            'request_bytes': request_bytes,
+            'response_bytes': sum(len(chunk) for chunk in body),
+            'request_ms': (self.clock() - request_context.started) * 1000,
+            'remote_addr': environ.get('REMOTE_ADDR'),
+            'path': environ.get('PATH_INFO')
+        }
+        # requests that were not processed (unsupported Content-Type, say) get a record too
+        records = data.get('access_log') or [{'time': request_context.started, 'method': None, 'id': None}]
+        for record in records:
+            record.update(http)
+            self.writer.write(record)
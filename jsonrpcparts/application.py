@@ -8,56 +8,272 @@ that supports discovery and use of the registered methods.
 
 This file is part of `jsonrpcparts` project. See project's source for license and copyright.
 """
-import json
+import functools
+import threading
+import types
 
 from . import errors
+from .rawjson import RawJSON
 from .serializers import JSONRPC20Serializer
+from .validation import ValidationError, compile_params_validator
+
+def _argument_names(function):
+    """
+    :return: names of the function's arguments that can be passed by position or None if unknown
+    """
+    # what inspect.getargspec would tell, without importing inspect (slow to import)
+    if isinstance(function, (type, types.ClassType)):
+        function = getattr(function, '__init__', None)
+    elif not isinstance(function, (types.FunctionType, types.MethodType)):
+        function = getattr(function, '__call__', None)
+    bound = False
+    if isinstance(function, types.MethodType):
+        bound = function.__self__ is not None
+        function = function.__func__
+    if not isinstance(function, types.FunctionType):
+        return None
+    code = function.__code__
+    names = list(code.co_varnames[:code.co_argcount])
+    if bound:
+        names = names[1:]
+    return names
+
+
+def _changing(method):
+    """Wraps dict's method changing the collection into one that takes the lock and drops the dispatch table"""
+    def change(self, *args, **kw):
+        with self._lock:
+            try:
+                return method(self, *args, **kw)
+            finally:
+                self._table = None
+    change.__name__ = method.__name__
+    change.__doc__ = method.__doc__
+    return change
+
+
+class _DispatchTable(object):
+    """
+    Read-only snapshot of the methods, validators and namespaces of a collection.
+
+    Requests are processed with the table that was current when they
+    came, so they never see a change of the collection half done.
+    """
+    __slots__ = ('methods', 'validators', 'namespaces', 'resolved')
+
+    def __init__(self, methods, validators, namespaces):
+        self.methods = methods
+        self.validators = validators
+        self.namespaces = namespaces
+        # method name > (function, validator) found through an object namespace.
+        # Only ever added to, and a lookup gives the same answer every time.
+        self.resolved = {}
+
+    def lookup(self, name):
+        """:return: (function, validator) of method name. function is None if there is no such method."""
+        function = self.methods.get(name)
+        if function is not None:
+            return function, self.validators.get(name)
+        if not self.namespaces:
+            return None, None
+        found = self.resolved.get(name)
+        if found is None:
+            found = self._lookup_namespaces(name)
+        return found
+
+    def _lookup_namespaces(self, name):
+        namespaces = self.namespaces
+        prefix = name
+        while True:
+            # the longest registered prefix wins
+            prefix = prefix.rpartition('.')[0]
+            if not prefix:
+                return None, None
+            if prefix in namespaces:
+                break
+        handler = namespaces[prefix]
+        method_name = name[len(prefix) + 1:]
+
+        if isinstance(handler, JSONPRCCollection):
+            # not remembered - the mounted collection may change on its own
+            return handler._dispatch_table().lookup(method_name)
+
+        if not method_name or method_name[0] == '_' or '.' in method_name:
+            return None, None
+        function = getattr(handler, method_name, None)
+        if function is None or not callable(function) or isinstance(function, (type, types.ClassType)):
+            return None, None
+        params_schema = getattr(function, 'params_schema', None)
+        if params_schema is None:
+            found = function, None
+        else:
+            found = function, compile_params_validator(params_schema, _argument_names(function))
+        self.resolved[name] = found
+        return found
+
 
 class JSONPRCCollection(dict):
     """
     A dictionary-like collection that helps with registration
     and use (calling of) JSON-RPC methods.
+
+    The collection may be changed while requests are processed (by other
+    threads). Changes build a new dispatch table that replaces the old one
+    at once: requests that already started finish with the old methods,
+    the following ones get the new. Processing of requests takes no lock.
     """
 
+    # the collection that serves the methods of this one in its stead (see
+    # serve.load_application), or None. reloading.Reloader replaces its methods too.
+    served_by = None
+
+    def __init__(self, *args, **kw):
+        super(JSONPRCCollection, self).__init__(*args, **kw)
+        # method name > params validator, see register_function
+        self._validators = {}
+        # prefix > handler object or JSONPRCCollection, see register_namespace
+        self._namespaces = {}
+        # held while the collection is changed, see _dispatch_table
+        self._lock = threading.RLock()
+        self._table = None
+
+    __setitem__ = _changing(dict.__setitem__)
+    __delitem__ = _changing(dict.__delitem__)
+    clear = _changing(dict.clear)
+    pop = _changing(dict.pop)
+    popitem = _changing(dict.popitem)
+    setdefault = _changing(dict.setdefault)
+    update = _changing(dict.update)
+
+    def _dispatch_table(self):
+        """
+        :return: _DispatchTable of the collection as it is now. Built on the
+            first call after a change - only that call takes the lock.
+        """
+        table = self._table
+        if table is None:
+            with self._lock:
+                table = self._table
+                if table is None:
+                    table = self._table = _DispatchTable(dict(self), dict(self._validators), dict(self._namespaces))
+        return table
+
     def register_class(self, instance, name=None):
-        """Add all functions of a class-instance to the RPC-services.
+        """Add all methods of a class-instance to the RPC-services.
 
-        All entries of the instance which do not begin with '_' are added.
+        All callable attributes of the instance which do not begin with '_' are added.
 
         :Parameters:
             - myinst: class-instance containing the functions
             - name:   | hierarchical prefix.
                       | If omitted, the functions are added directly.
                       | If given, the functions are added as "name.function".
-        :TODO:
-            - only add functions and omit attributes?
-            - improve hierarchy?
+
+        See register_namespace for the lazy alternative.
         """
         prefix_name = name or instance.__class__.__name__
 
-        for e in dir(instance):
-            if e[0][0] != "_":
-                self.register_function(
-                    getattr(instance, e),
-                    name="%s.%s" % (prefix_name, e)
-                )
+        # all methods of the class show up at once
+        with self._lock:
+            for e in dir(instance):
+                if e[0][0] != "_":
+                    function = getattr(instance, e)
+                    if callable(function):
+                        self.register_function(
+                            function,
+                            name="%s.%s" % (prefix_name, e)
+                        )
+
+    def register_namespace(self, prefix, handler):
+        """Serves methods of handler as "prefix.method", found on first call.
 
-    def register_function(self, function, name=None):
+        Unlike register_class, nothing is looked at up front, so registering
+        hundreds of handler classes costs next to nothing at startup. A call
+        of "prefix.method" looks up the handler by prefix (one dict lookup per
+        dot in the name) and then the method on it. Found methods are
+        remembered (until the collection changes), so following calls find
+        them right away.
+
+        :Parameters:
+            - prefix: the namespace, like "users" or "api.v2". Must not be empty.
+            - handler: | an object - its callable attributes not beginning
+                       |   with '_' are the methods, or
+                       | a JSONPRCCollection - gets mounted: its methods (and
+                       |   namespaces) are served under the prefix.
+                       | Registering the prefix again replaces the handler.
+        """
+        if not prefix:
+            raise ValueError("Namespace prefix must not be empty.")
+        with self._lock:
+            self._namespaces[prefix] = handler
+            self._table = None
+
+    def resolve_method(self, name):
+        """Finds the JSON-RPC method registered (directly or through a namespace) as name
+
+        :return: the callable or None if there is no such method
+        """
+        return self._dispatch_table().lookup(name)[0]
+
+    def register_function(self, function, name=None, params_schema=None):
         """Add a function to the RPC-services.
 
         :Parameters:
             - function: function to add
             - name:     RPC-name for the function. If omitted/None, the original
                         name of the function is used.
+            - params_schema: JSON Schema (subset, see `validation` module) the
+                        params of the calls must match. Calls with params that
+                        do not are answered with RPCInvalidMethodParams error
+                        without calling the function. Defaults to the schema
+                        attached with `validation.params_schema` decorator.
         """
-        if name:
-            self[name] = function
+        name = name or function.__name__
+
+        if params_schema is None:
+            params_schema = getattr(function, 'params_schema', None)
+        if params_schema is None:
+            validator = None
+        elif getattr(function, 'takes_raw_params', False):
+            raise ValueError("Params of methods that take raw params can not be validated.")
         else:
-            self[function.__name__] = function
+            validator = compile_params_validator(params_schema, _argument_names(function))
+
+        with self._lock:
+            self[name] = function
+            if validator is None:
+                self._validators.pop(name, None)
+            else:
+                self._validators[name] = validator
+
+    def replace(self, collection):
+        """Makes the methods (and namespaces) of the collection the only ones of this one, at once
+
+        Meant for reloading the methods of a running server: register them
+        into a new JSONPRCCollection and replace the served ones with it.
+        Requests never see a mix of the old and the new methods.
+        """
+        with collection._lock:
+            methods = dict(collection)
+            validators = dict(collection._validators)
+            namespaces = dict(collection._namespaces)
+        table = _DispatchTable(dict(methods), dict(validators), dict(namespaces))
+        with self._lock:
+            dict.clear(self)
+            dict.update(self, methods)
+            self._validators = validators
+            self._namespaces = namespaces
+            self._table = table
 
 
 class JSONPRCApplication(JSONPRCCollection):
 
+    # tracing.Tracer recording spans of parsing, calls and serializing, see set_tracer
+    tracer = None
+    # workers.WorkerPool to run notifications in, so the response does not wait for them.
+    # None runs them with the other calls of the message.
+    notification_pool = None
+
     def __init__(self, data_serializer=JSONRPC20Serializer, *args, **kw):
         """
         :Parameters:
@@ -65,6 +281,144 @@ class JSONPRCApplication(JSONPRCCollection):
         """
         super(JSONPRCApplication, self).__init__(*args, **kw)
         self._data_serializer = data_serializer
+        self._message_middleware = []
+        self._call_middleware = []
+        # the middleware chains compiled into one callable each, None when there is no middleware
+        self._process_messages = None
+        self._process_call = None
+
+    @property
+    def data_serializer(self):
+        """The serializer the application parses requests and encodes responses with by default"""
+        return self._data_serializer
+
+    def add_message_middleware(self, middleware):
+        """Adds middleware that sees every request message as a whole (all calls of a batch).
+
+        Middleware is a callable::
+
+            def middleware(process_next, requests, context):
+                return process_next(requests, context)
+
+        where requests is the list of parsed requests (see process_requests),
+        context the dict of named arguments handle_request_string got and
+        process_next the next middleware (or process_requests at the end).
+        It returns the list of responses - of process_next or its own.
+
+        The middleware added first is the outermost. Adding middleware
+        compiles the chain anew, so add it all at startup.
+        """
+        self._message_middleware.append(middleware)
+        self._process_messages = self._compile(self._message_middleware, self._process_requests)
+
+    def add_call_middleware(self, middleware):
+        """Adds middleware that sees every method call.
+
+        Middleware is a callable::
+
+            def middleware(call_next, name, method, args, kwargs, request_id, context):
+                return call_next(name, method, args, kwargs, request_id, context)
+
+        where name is the called method's name, method the registered callable,
+        args and kwargs the params, context the dict of named arguments
+        handle_request_string got and call_next the next middleware (or
+        process_method at the end). It returns the result of the call.
+        errors.RPCFault it raises is sent to the client as the error of the call.
+
+        The middleware added first is the outermost. Adding middleware
+        compiles the chain anew, so add it all at startup.
+        """
+        self._call_middleware.append(middleware)
+        self._process_call = self._compile(self._call_middleware, self._call_method)
+
+    def set_tracer(self, tracer):
+        """Makes the application record spans (see `tracing`) of parsing the
+        requests, of every call and of serializing the responses.
+
+        :param tracer: tracing.Tracer, or None to stop tracing
+        """
+        if self.tracer is not None:
+            self._call_middleware.remove(self.tracer.trace_call)
+        self.tracer = tracer
+        if tracer is not None:
+            # outermost, so the spans include the time of the other middleware
+            self._call_middleware.insert(0, tracer.trace_call)
+        if self._call_middleware:
+            self._process_call = self._compile(self._call_middleware, self._call_method)
+        else:
+            self._process_call = None
+
+    def copy_settings(self, application):
+        """Makes this application process messages as the other one
+        (JSONPRCApplication) does: with its middleware, tracer and
+        notification_pool. The methods are taken over by `replace`.
+        """
+        self._message_middleware = list(application._message_middleware)
+        self._call_middleware = list(application._call_middleware)
+        self._process_messages = application._process_messages and self._compile(
+            self._message_middleware, self._process_requests
+        )
+        self._process_call = application._process_call and self._compile(
+            self._call_middleware, self._call_method
+        )
+        self.tracer = application.tracer
+        self.notification_pool = application.notification_pool
+
+    @staticmethod
+    def _compile(middleware, last):
+        """:return: callable that calls the middleware in turn, each getting the next as first argument"""
+        chain = last
+        for outer in reversed(middleware):
+            chain = functools.partial(outer, chain)
+        return chain
+
+    def _process_requests(self, requests, context):
+        return self.process_requests(requests, **context)
+
+    def _call_method(self, name, method, args, kwargs, request_id, context):
+        return self.process_method(method, args, kwargs, request_id=request_id, **context)
+
+    def _defer_notifications(self, calls, context):
+        request_context = context.get('request_context')
+        if request_context is not None:
+            # the request's context is reused for another request once the response is sent
+            context = dict(context, request_context=request_context.copy())
+        submit = self.notification_pool.submit
+        for name, function, args, kwargs in calls:
+            submit(self._call_notification, name, function, args, kwargs, context)
+
+    def _call_notification(self, name, function, args, kwargs, context):
+        tracer = self.tracer
+        request_context = context.get('request_context')
+        span = request_context.span if request_context is not None else None
+        if tracer is None or span is None:
+            self._run_notification(name, function, args, kwargs, context)
+        else:
+            # spans of the call join the trace of the request it came with
+            with tracer.use_span(span):
+                self._run_notification(name, function, args, kwargs, context)
+
+    def _run_notification(self, name, function, args, kwargs, context):
+        process_call = self._process_call
+        try:
+            if process_call is None:
+                self.process_method(function, args, kwargs, request_id=None, **context)
+            else:
+                process_call(name, function, args, kwargs, None, context)
+        except errors.RPCFault:
+            # nobody to tell about it, as with notifications run inline
+            pass
+
+    def drain_notifications(self, timeout=None):
+        """Stops the notification_pool once the notifications queued so far are done.
+        Call on graceful shutdown. Notifications handled afterwards run inline.
+
+        :param timeout: seconds to wait at most, None for no limit
+        :return: True if all the queued notifications are done
+        """
+        if self.notification_pool is None:
+            return True
+        return self.notification_pool.shutdown(wait=True, timeout=timeout)
 
     def process_method(self, method, args, kwargs, request_id=None, **context):
         """
@@ -91,9 +445,20 @@ class JSONPRCApplication(JSONPRCCollection):
             actionable / flag objects and putting them into **context.
             Then override this method and fold the arguments into the call
             (which may be a decorated function, where decorator unfolds the params and calls the actual method)
-            By default, context is not passed to method call below.
-        :return: The value method returns
+            By default, context is not passed to method call below, except for
+            `request_context` (context.RequestContext) which methods marked with
+            context.takes_request_context get as named argument.
+        :return: The value method returns. Return rawjson.RawJSON to have
+            already encoded JSON copied into the response as is.
         """
+        if getattr(method, 'takes_request_context', False):
+            request_context = context.get('request_context')
+            if request_context is not None:
+                return method(
+                    *([] if args is None else args),
+                    request_context=request_context,
+                    **({} if kwargs is None else kwargs)
+                )
         return method(*([] if args is None else args), **({} if kwargs is None else kwargs))
 
     def process_requests(self, requests, **context):
@@ -101,7 +466,7 @@ class JSONPRCApplication(JSONPRCCollection):
         Turns a list of request objects into a list of
         response objects.
 
-        :param requests: A list of tuples describing the RPC call
+        :param requests: A list of ParsedRequest tuples describing the RPC call
         :type requests: list[list[callable,object,object,list]]
         :param context:
             A dict with additional parameters passed to handle_request_string and process_requests
@@ -112,9 +477,16 @@ class JSONPRCApplication(JSONPRCCollection):
             Then override this method and fold the arguments into the call
             (which may be a decorated function, where decorator unfolds the params and calls the actual method)
             By default, context is not passed to method call below.
+
+        With notification_pool set, the notifications are handed to it once
+        the other calls are done, and the responses returned without waiting for them.
         """
 
         ds = self._data_serializer
+        # the methods as they are now, for the whole batch
+        table = self._dispatch_table()
+        process_call = self._process_call
+        deferred = [] if self.notification_pool is not None else None
 
         responses = []
         for method, params, request_id, error in requests:
@@ -124,7 +496,8 @@ class JSONPRCApplication(JSONPRCCollection):
                     responses.append(ds.assemble_error_response(error))
                 continue
 
-            if method not in self:
+            function, validator = table.lookup(method)
+            if function is None:
                 if request_id:
                     responses.append(ds.assemble_error_response(
                         errors.RPCMethodNotFound(
@@ -137,22 +510,45 @@ class JSONPRCApplication(JSONPRCCollection):
             try:
                 args = []
                 kwargs = {}
-                if isinstance(params, dict):
-                    kwargs = params
-                elif params: # and/or must be type(params, list):
-                    args = params
-                result = self.process_method(
-                    self[method],
-                    args,
-                    kwargs,
-                    request_id=request_id,
-                    **context
-                )
+                if getattr(function, 'takes_raw_params', False):
+                    if params is not None and not isinstance(params, RawJSON):
+                        params = RawJSON(ds.json_dumps(params))
+                    args = [params]
+                else:
+                    if isinstance(params, RawJSON):
+                        try:
+                            params = ds.json_loads(params.json)
+                        except ValueError as ex:
+                            raise errors.RPCParseError("No valid JSON in params. (%s)" % str(ex), request_id)
+                    if validator is not None:
+                        validator(params)
+                    if isinstance(params, dict):
+                        kwargs = params
+                    elif params: # and/or must be type(params, list):
+                        args = params
+                if deferred is not None and not request_id:
+                    deferred.append((method, function, args, kwargs))
+                    continue
+                if process_call is None:
+                    result = self.process_method(
+                        function,
+                        args,
+                        kwargs,
+                        request_id=request_id,
+                        **context
+                    )
+                else:
+                    result = process_call(method, function, args, kwargs, request_id, context)
                 if request_id:
                     responses.append(ds.assemble_response(result, request_id))
             except errors.RPCFault as ex:
                 if request_id:
                     responses.append(ds.assemble_error_response(ex))
+            except ValidationError as ex:
+                if request_id:
+                    responses.append(ds.assemble_error_response(
+                        errors.RPCInvalidMethodParams(ex.data, request_id, str(ex))
+                    ))
             except Exception as ex:
                 if request_id:
                     responses.append(ds.assemble_error_response(
@@ -164,12 +560,19 @@ class JSONPRCApplication(JSONPRCCollection):
                         )
                     ))
 
+        if deferred:
+            self._defer_notifications(deferred, context)
         return responses
 
-    def handle_request_string(self, request_string, **context):
+    def handle_request_string(self, request_string, data_serializer=None, response_serializer=None, **context):
         """Handle a RPC-Request.
 
         :param request_string: the received rpc-string
+        :param data_serializer:
+            Serializer to parse the request with. Defaults to the one the application was created with.
+            Allows one application to talk several encodings (JSON, MessagePack, ...) of the same protocol.
+        :param response_serializer:
+            Serializer to encode the response with. Defaults to data_serializer.
         :param context:
             A dict with additional parameters passed to process_requests and process_method
             Allows wrapping code to pass additional parameters deep into parsing stack, override process_method
@@ -179,35 +582,51 @@ class JSONPRCApplication(JSONPRCCollection):
             Then override this method and fold the arguments into the call
             (which may be a decorated function, where decorator unfolds the params and calls the actual method)
             By default, context is not passed to method call below.
+            Rather than many separate parameters, pass one `request_context`
+            (context.RequestContext) - it is handed down by reference.
         :return: the encoded (serialized as string) JSON of the response
         """
 
-        ds = self._data_serializer
+        ds = data_serializer or self._data_serializer
+        tracer = self.tracer
 
         try:
-            requests, is_batch_mode = ds.parse_request(request_string)
+            if tracer is None:
+                requests, is_batch_mode = ds.parse_request(request_string)
+            else:
+                with tracer.start_span('jsonrpc.parse', attributes={'rpc.jsonrpc.message_size': len(request_string)}):
+                    requests, is_batch_mode = ds.parse_request(request_string)
         except errors.RPCFault as ex:
-            return ds.json_dumps(ds.assemble_error_response(ex))
+            ds = response_serializer or ds
+            return ds.dumps(ds.assemble_error_response(ex))
         except Exception as ex:
-            return ds.json_dumps(ds.assemble_error_response(
+            ds = response_serializer or ds
+            return ds.dumps(ds.assemble_error_response(
                 errors.RPCInternalError(
                     'While processing the follwoing message "%s" ' % request_string +\
                     'encountered the following error message "%s"' % ex.message
                 )
             ))
 
-        responses = self.process_requests(requests, **context)
+        if self._process_messages is None:
+            responses = self.process_requests(requests, **context)
+        else:
+            responses = self._process_messages(requests, context)
 
         if not responses:
             return None
 
+        ds = response_serializer or ds
+
         try:
-            if is_batch_mode:
-                return ds.json_dumps(responses)
-            else:
-                return ds.json_dumps(responses[0])
+            if not is_batch_mode:
+                responses = responses[0]
+            if tracer is None:
+                return ds.dumps(responses)
+            with tracer.start_span('jsonrpc.serialize'):
+                return ds.dumps(responses)
         except Exception as ex:
-            return json.dumps(
+            return ds.dumps(
                 ds.assemble_error_response(
                     errors.RPCInternalError(
                         'While processing the follwoing message "%s" ' % request_string +\
@@ -0,0 +1,335 @@
+"""
+Web client that spreads the requests over several servers (replicas of
+one JSON-RPC service).
+
+Every request goes to one endpoint, picked by the number of requests
+in flight to each ("least outstanding") or out of two random ones
+("power of two choices"). Endpoints that keep failing are taken out of
+rotation for a while by their circuit breakers.
+
+Calls of methods declared idempotent are hedged: when the answer takes
+longer than most answers do (a latency percentile), the same request is
+sent to another endpoint too, and the first answer wins::
+
+    client = BalancingWebClient(
+        ['http://10.0.0.1:8080/rpc', 'http://10.0.0.2:8080/rpc', 'http://10.0.0.3:8080/rpc'],
+        idempotent_methods=['get_user', 'search']
+    )
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import collections
+import Queue
+import random
+import threading
+import time
+
+import requests
+
+from . import JSONRPC20Serializer
+from .client import WebClient
+
+
+class NoEndpointAvailableError(Exception):
+    """All endpoints are taken out of rotation by their circuit breakers"""
+
+
+class CircuitBreaker(object):
+    """
+    Counts consecutive failures of one endpoint.
+
+    After `failure_threshold` of them the breaker opens - the endpoint gets
+    no requests. `reset_timeout` seconds later it is half-open: one trial
+    request is let through. Its success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.time):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._trial or self._clock() >= self._opened_at + self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def available(self):
+        """:return: True if a request may be sent to the endpoint now"""
+        if self._opened_at is None:
+            return True
+        return not self._trial and self._clock() >= self._opened_at + self.reset_timeout
+
+    def acquire(self):
+        """Called when a request is about to go to the endpoint.
+
+        :return: False if it should not (another thread took the half-open trial)
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or self._clock() < self._opened_at + self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._trial = False
+
+
+class Endpoint(object):
+    """
+    One server of the pool, with its breaker and load figures.
+
+    :Variables:
+        - url: URL of the server
+        - breaker: CircuitBreaker instance
+        - outstanding: number of requests in flight
+        - latency: moving average of response times in seconds, None before the first response
+        - requests, failures: counters
+    """
+
+    # weight of the newest response time in the moving average
+    latency_smoothing = 0.2
+
+    def __init__(self, url, breaker):
+        self.url = url
+        self.breaker = breaker
+        self.outstanding = 0
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+
+    def __repr__(self):
+        return 'Endpoint(%r, %s, outstanding=%d)' % (self.url, self.breaker.state, self.outstanding)
+
+
+class LatencyWindow(object):
+    """Response times of the last `size` successful requests, for percentiles"""
+
+    def __init__(self, size=200):
+        self._samples = collections.deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, percent):
+        """:return: the response time `percent` % of the samples do not exceed, or None without samples"""
+        samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = int(round(percent / 100.0 * (len(samples) - 1)))
+        return samples[index]
+
+
+class BalancingWebClient(WebClient):
+    """
+    WebClient talking to a pool of equivalent servers.
+
+    :Variables:
+        - endpoints: list of Endpoint instances
+        - hedges: number of hedged (second) requests sent
+        - hedge_wins: number of times the hedged request answered first
+        - failovers: number of idempotent calls repeated on another endpoint after a failure
+    """
+
+    LEAST_OUTSTANDING = 'least-outstanding'
+    POWER_OF_TWO = 'power-of-two'
+
+    # hedging starts once this many response times are known
+    hedge_min_samples = 20
+
+    def __init__(self, rpc_server_urls, data_serializer=JSONRPC20Serializer, content_encoding=None,
+                 strategy=LEAST_OUTSTANDING, idempotent_methods=(), hedge_percentile=95.0, hedge_delay=None,
+                 failure_threshold=5, reset_timeout=30.0, clock=time.time):
+        """
+        :Parameters:
+            - rpc_server_urls: list of URLs of the servers
+            - data_serializer: a data_structure+serializer-instance
+            - content_encoding: see WebClient
+            - strategy: LEAST_OUTSTANDING or POWER_OF_TWO
+            - idempotent_methods: names of methods that are safe to call twice.
+                Their calls are hedged and fail over to another endpoint on
+                connection errors. Batches are never hedged.
+            - hedge_percentile: a call is hedged when it takes longer than this
+                percentile of recent response times
+            - hedge_delay: fixed delay (seconds) before hedging, instead of the percentile
+            - failure_threshold, reset_timeout: see CircuitBreaker
+            - clock: function returning current time in seconds (for the breakers)
+        """
+        if not rpc_server_urls:
+            raise ValueError("At least one endpoint URL is needed.")
+        if strategy not in (self.LEAST_OUTSTANDING, self.POWER_OF_TWO):
+            raise ValueError('Unknown balancing strategy "%s".' % strategy)
+        super(BalancingWebClient, self).__init__(rpc_server_urls[0], data_serializer, content_encoding)
+        self.endpoints = [
+            Endpoint(url, CircuitBreaker(failure_threshold, reset_timeout, clock))
+            for url in rpc_server_urls
+        ]
+        self.strategy = strategy
+        self.idempotent_methods = frozenset(idempotent_methods)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self._latencies = LatencyWindow()
+        self._lock = threading.Lock()
+
+    def _choose(self, exclude=None):
+        """Picks the endpoint for a request and counts the request in its outstanding ones
+
+        :return: Endpoint or None if none is available
+        """
+        with self._lock:
+            candidates = [
+                endpoint for endpoint in self.endpoints
+                if endpoint is not exclude and endpoint.breaker.available()
+            ]
+            while candidates:
+                if self.strategy == self.POWER_OF_TWO and len(candidates) > 2:
+                    pool = random.sample(candidates, 2)
+                else:
+                    pool = candidates
+                # least outstanding first, faster on a tie. Shuffled, so ties are broken at random.
+                random.shuffle(pool)
+                endpoint = min(pool, key=lambda endpoint: (endpoint.outstanding, endpoint.latency))
+                if endpoint.breaker.acquire():
+                    endpoint.outstanding += 1
+                    endpoint.requests += 1
+                    return endpoint
+                candidates.remove(endpoint)
+        return None
+
+    def _attempt(self, endpoint, data, headers, stream):
+        """Sends the request to the endpoint, keeping its books
+
+        :return: (endpoint, response, exception) - one of the latter two is None
+        """
+        started = time.time()
+        try:
+            if stream:
+                response = requests.post(endpoint.url, data=data, headers=headers, stream=True)
+            else:
+                response = requests.post(endpoint.url, data=data, headers=headers)
+        except requests.RequestException as ex:
+            with self._lock:
+                endpoint.outstanding -= 1
+                endpoint.failures += 1
+            endpoint.breaker.failure()
+            return endpoint, None, ex
+
+        elapsed = time.time() - started
+        with self._lock:
+            endpoint.outstanding -= 1
+            if response.status_code >= 500:
+                endpoint.failures += 1
+            else:
+                if endpoint.latency is None:
+                    endpoint.latency = elapsed
+                else:
+                    endpoint.latency += endpoint.latency_smoothing * (elapsed - endpoint.latency)
+                self._latencies.add(elapsed)
+        if response.status_code >= 500:
+            endpoint.breaker.failure()
+        else:
+            endpoint.breaker.success()
+        return endpoint, response, None
+
+    def _hedge_after(self):
+        """:return: seconds to wait for the first answer before hedging, or None to not hedge"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            return self._latencies.percentile(self.hedge_percentile)
+
+    def _http_post(self, data, headers, stream, request_json):
+        endpoint = self._choose()
+        if endpoint is None:
+            raise NoEndpointAvailableError("All %d endpoints are failing." % len(self.endpoints))
+
+        idempotent = (
+            not stream and
+            isinstance(request_json, dict) and
+            request_json.get('method') in self.idempotent_methods
+        )
+        if not idempotent:
+            endpoint, response, error = self._attempt(endpoint, data, headers, stream)
+            if error is not None:
+                raise error
+            return response
+
+        return self._hedged_post(endpoint, data, headers)
+
+    def _hedged_post(self, endpoint, data, headers):
+        outcomes = Queue.Queue()
+
+        def attempt(endpoint):
+            outcomes.put(self._attempt(endpoint, data, headers, False))
+
+        def start(endpoint):
+            thread = threading.Thread(target=attempt, args=(endpoint,), name='jsonrpcparts-hedge')
+            thread.daemon = True
+            thread.start()
+
+        start(endpoint)
+        pending = 1
+
+        hedge_after = self._hedge_after()
+        try:
+            outcome = outcomes.get(timeout=hedge_after) if hedge_after is not None else outcomes.get()
+            pending -= 1
+        except Queue.Empty:
+            outcome = None
+        if outcome is not None and outcome[2] is None and outcome[1].status_code < 500:
+            return outcome[1]
+
+        # slow (hedge) or failed (fail over) - another endpoint gets its chance
+        hedged = outcome is None
+        second = self._choose(exclude=endpoint)
+        if second is not None:
+            start(second)
+            pending += 1
+            with self._lock:
+                if hedged:
+                    self.hedges += 1
+                else:
+                    self.failovers += 1
+
+        while pending:
+            outcome = outcomes.get()
+            pending -= 1
+            if outcome[2] is None and outcome[1].status_code < 500:
+                break
+
+        if hedged and second is not None and outcome[0] is second and outcome[2] is None:
+            with self._lock:
+                self.hedge_wins += 1
+        if outcome[2] is not None:
+            raise outcome[2]
+        return outcome[1]
@@ -0,0 +1,158 @@
+"""
+JSON-RPC data structure does not have to travel as JSON text. For service-to-service
+traffic compact binary encodings of the same structure are cheaper to produce,
+to parse and to send.
+
+This module contains JSON-RPC v.2.0 serializers that use MessagePack and CBOR
+encodings. Message structure, batch mode and error semantics are exactly those
+of JSONRPC20Serializer, only the encoding of the messages differs.
+
+These need `msgpack` and `cbor2` packages respectively. The packages are
+imported (if installed) when this module is imported.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import itertools
+from io import BytesIO
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+from .serializers import BaseResponse, JSONRPC20Serializer
+
+
+def _text_strings(obj):
+    """
+    :return: obj with `str` (bytes in Python 2) turned into unicode.
+        Encoders write `str` as binary data, and peers in other languages would
+        then see bytes where they expect text ("jsonrpc", "result" keys and the like).
+        Strings that are not UTF-8 are left binary.
+    """
+    if isinstance(obj, str):
+        try:
+            return obj.decode('utf-8')
+        except UnicodeDecodeError:
+            return obj
+    if isinstance(obj, dict):
+        return dict((_text_strings(key), _text_strings(value)) for key, value in obj.iteritems())
+    if isinstance(obj, (list, tuple)):
+        return [_text_strings(item) for item in obj]
+    return obj
+
+
+class BinaryRPC20Serializer(JSONRPC20Serializer):
+    """
+    Common base class for serializers of JSON-RPC v.2.0 messages in binary encodings.
+
+    Subclasses set `content_type` and implement `pack` and `unpack`.
+
+    `json_dumps` and `json_loads` still work with JSON text. These are used for
+    RawJSON params and results, which are decoded before being packed.
+    """
+
+    content_type = None
+
+    @staticmethod
+    def pack(obj):
+        """Encodes plain data (dicts, lists, strings, numbers) into bytes"""
+        raise NotImplementedError
+
+    @staticmethod
+    def unpack(s):
+        """Decodes bytes produced by `pack`"""
+        raise NotImplementedError
+
+    @classmethod
+    def dumps(cls, obj):
+        if isinstance(obj, BaseResponse):
+            obj = cls._response_to_dict(obj)
+        elif isinstance(obj, list) and obj and all(isinstance(item, BaseResponse) for item in obj):
+            obj = [cls._response_to_dict(item) for item in obj]
+        return cls.pack(obj)
+
+    @classmethod
+    def loads(cls, s):
+        try:
+            return cls.unpack(s)
+        except (ValueError, ImportError):
+            raise
+        except Exception as ex:
+            # decoders of binary formats raise a zoo of exception types
+            raise ValueError("%s: %s" % (ex.__class__.__name__, ex))
+
+    @classmethod
+    def json_loads_raw_params(cls, s):
+        # there is no JSON text to keep slices of. Params are decoded eagerly.
+        return cls.loads(s)
+
+    @classmethod
+    def dump_batch(cls, calls, fp, ids=None, notification=False):
+        # binary encoders want the whole structure at once
+        if ids is None:
+            ids = itertools.count(1)
+        positions = {}
+        batch = []
+        for index, (method, params) in enumerate(calls):
+            # assembled as notification, to skip generation of an id we'd replace
+            request = cls.assemble_request(method, params, notification=True)
+            if not notification:
+                request['id'] = request_id = ids.next()
+                positions[request_id] = index
+            batch.append(request)
+        if not batch:
+            raise ValueError("Batch must have at least one call.")
+        fp.write(cls.dumps(batch))
+        return positions
+
+    @classmethod
+    def iter_parse_response(cls, chunks):
+        # binary decoders need the whole message
+        for parsed in cls.parse_response(''.join(chunks))[0]:
+            yield parsed
+
+
+class MsgPackRPC20Serializer(BinaryRPC20Serializer):
+    """JSON-RPC v.2.0 messages encoded with MessagePack. Needs `msgpack` package."""
+
+    content_type = 'application/msgpack'
+
+    @staticmethod
+    def pack(obj):
+        if msgpack is None:
+            raise ImportError('MsgPackRPC20Serializer needs "msgpack" package.')
+        return msgpack.packb(_text_strings(obj), use_bin_type=True)
+
+    @staticmethod
+    def unpack(s):
+        if msgpack is None:
+            raise ImportError('MsgPackRPC20Serializer needs "msgpack" package.')
+        return msgpack.unpackb(s, raw=False)
+
+
+class CBORRPC20Serializer(BinaryRPC20Serializer):
+    """JSON-RPC v.2.0 messages encoded with CBOR (RFC 7049). Needs `cbor2` package."""
+
+    content_type = 'application/cbor'
+
+    @staticmethod
+    def pack(obj):
+        if cbor2 is None:
+            raise ImportError('CBORRPC20Serializer needs "cbor2" package.')
+        return cbor2.dumps(_text_strings(obj))
+
+    @staticmethod
+    def unpack(s):
+        if cbor2 is None:
+            raise ImportError('CBORRPC20Serializer needs "cbor2" package.')
+        stream = BytesIO(s)
+        obj = cbor2.load(stream)
+        if stream.tell() != len(s):
+            raise ValueError("Extra data after CBOR item at %d" % stream.tell())
+        return obj
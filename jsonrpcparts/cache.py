@@ -0,0 +1,327 @@
+"""
+Client-side cache of results of read-only JSON-RPC methods.
+
+Results are kept per method and params for the method's time-to-live.
+Only the methods that are given a TTL are cached. Nothing else can tell
+a read-only method from one that changes things on the server::
+
+    cache = ResponseCache(ttls={'get_user': 30, 'list_countries': 3600})
+    client = CachingWebClient('http://example.com/rpc', cache=cache)
+    client.call('get_user', 42)     # goes to the server
+    client.call('get_user', 42)     # does not, for the next 30 seconds
+
+The server may shorten the TTL (or forbid caching) with Cache-Control
+header of the response. If it sends an ETag (see `etags` of
+JSONPRCWSGIApplication), expired results are revalidated with
+If-None-Match instead of being fetched anew.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import collections
+import json
+import threading
+import time
+from cStringIO import StringIO
+
+from . import errors
+from . import JSONRPC20Serializer
+from .client import WebClient
+
+
+def canonical_params(params):
+    """Returns JSON text of params that is the same for all equal params
+    (keys of objects are sorted, tuples are written as lists)
+
+    :Raises: TypeError, ValueError if params are not JSON-serializable
+    """
+    if params is None:
+        return ''
+    return json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+
+def parse_cache_control(value):
+    """Picks the directives of Cache-Control header that matter to the client cache
+
+    :param value: value of Cache-Control header (or None)
+    :return: (max_age, store) where max_age is number of seconds or None when
+        not given, store is False when the response must not be cached.
+        "no-cache" is max-age=0 - the result is only used after revalidation.
+    """
+    max_age = None
+    store = True
+    for directive in (value or '').split(','):
+        name, _, argument = directive.partition('=')
+        name = name.strip().lower()
+        if name == 'no-store':
+            store = False
+        elif name == 'no-cache':
+            max_age = 0
+        elif name in ('max-age', 's-maxage') and max_age is None:
+            try:
+                max_age = max(int(argument.strip().strip('"')), 0)
+            except ValueError:
+                pass
+    return max_age, store
+
+
+class CacheEntry(object):
+    """One cached result
+
+    :Variables:
+        - result: the cached result
+        - expires: time (of cache's clock) the result stops being fresh at
+        - etag: ETag of the response the result came in, or None
+        - request_id: id of the request the result was given for. The
+            server's response - and ETag - depends on it, so revalidation repeats it.
+        - size: approximate size of the entry in bytes
+    """
+    __slots__ = ('result', 'expires', 'etag', 'request_id', 'size')
+
+    def __init__(self, result, expires, etag=None, request_id=None, size=0):
+        self.result = result
+        self.expires = expires
+        self.etag = etag
+        self.request_id = request_id
+        self.size = size
+
+
+class ResponseCache(object):
+    """
+    Bounded LRU cache of method results, keyed by method name and
+    canonical params. Safe to share between threads (and clients).
+    """
+
+    def __init__(self, ttls=None, default_ttl=None, max_entries=1024, max_bytes=None, clock=time.time):
+        """
+        :Parameters:
+            - ttls: dict of method name -> time-to-live of its results, in seconds.
+            - default_ttl: time-to-live for methods not in `ttls`. None
+                (the default) leaves these uncached.
+            - max_entries: the least recently used entries are evicted above this
+            - max_bytes: same, for approximate size of the entries (length of
+                the JSON text of the params and the result). None for no limit.
+            - clock: function returning current time in seconds
+        """
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ['hits', 'misses', 'stale', 'revalidated', 'stores', 'evictions'],
+            0
+        )
+
+    def ttl(self, method):
+        """:return: time-to-live of results of the method or None if they are not cached"""
+        return self.ttls.get(method, self.default_ttl)
+
+    def key(self, method, params):
+        """
+        :return: cache key of the call or None if the call is not cached
+            (method has no TTL or params are not JSON-serializable)
+        """
+        if self.ttl(method) is None:
+            return None
+        try:
+            return method, canonical_params(params)
+        except (TypeError, ValueError):
+            return None
+
+    def lookup(self, key):
+        """
+        :return: (entry, fresh). entry is None on a miss. Expired entries
+            are returned (with fresh False) only when they can be revalidated
+            - have an ETag.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None, False
+            if entry.expires > self._clock():
+                self._stats['hits'] += 1
+                del self._entries[key]
+                self._entries[key] = entry
+                return entry, True
+            self._stats['stale'] += 1
+            if entry.etag is None:
+                self._remove(key)
+                return None, False
+            return entry, False
+
+    def store(self, key, result, ttl, etag=None, request_id=None):
+        """Puts result into the cache for ttl seconds
+
+        Results with no time to live are only kept when they can be revalidated.
+        """
+        if ttl <= 0 and etag is None:
+            return
+        size = 0
+        if self.max_bytes is not None:
+            size = len(key[0]) + len(key[1]) + len(json.dumps(result))
+            if size > self.max_bytes:
+                return
+        entry = CacheEntry(result, self._clock() + ttl, etag, request_id, size)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += size
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._size > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def revalidated(self, key, ttl):
+        """Marks the entry fresh for another ttl seconds, after server said it did not change"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires = self._clock() + ttl
+                del self._entries[key]
+                self._entries[key] = entry
+                self._stats['revalidated'] += 1
+
+    def invalidate(self, method=None, params=None):
+        """Drops cached results of the method (of the call, if params are given), or all of them"""
+        with self._lock:
+            if method is None:
+                self._entries.clear()
+                self._size = 0
+            elif params is not None:
+                key = (method, canonical_params(params))
+                if key in self._entries:
+                    self._remove(key)
+            else:
+                for key in [key for key in self._entries if key[0] == method]:
+                    self._remove(key)
+
+    def _remove(self, key):
+        self._size -= self._entries.pop(key).size
+
+    def stats(self):
+        """:return: dict of counters, and number and size of the entries"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._size
+        return stats
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CachingWebClient(WebClient):
+    """
+    WebClient that answers calls of the cached methods (the ones the cache
+    has TTLs for) from its ResponseCache when it can.
+
+    Only successful results are cached. Notifications and batch mode
+    (`with client as batch:`) are not affected. `call_bulk` sends only
+    the calls that missed the cache.
+    """
+
+    def __init__(self, rpc_server_url, cache=None, data_serializer=JSONRPC20Serializer, content_encoding=None):
+        """
+        :Parameters:
+            - prc_server_url: string
+            - cache: ResponseCache instance. The default one caches nothing,
+                until methods are given TTLs (`cache.ttls['method'] = 60`).
+            - data_serializer: a data_structure+serializer-instance
+            - content_encoding: see WebClient
+        """
+        super(CachingWebClient, self).__init__(rpc_server_url, data_serializer, content_encoding)
+        self.cache = ResponseCache() if cache is None else cache
+
+    def _ttl(self, method, response):
+        """:return: (ttl, store) - method's TTL shortened by the server's Cache-Control"""
+        max_age, store = parse_cache_control(response.headers.get('Cache-Control'))
+        ttl = self.cache.ttl(method)
+        if max_age is not None:
+            ttl = min(ttl, max_age)
+        return ttl, store
+
+    def call(self, method, *args, **kw):
+        if self._in_batch_mode or (args and kw) or not method:
+            # the latter two are refused by WebClient
+            return super(CachingWebClient, self).call(method, *args, **kw)
+
+        cache = self.cache
+        key = cache.key(method, args or kw or None)
+        if key is None:
+            return super(CachingWebClient, self).call(method, *args, **kw)
+
+        entry, fresh = cache.lookup(key)
+        if fresh:
+            return entry.result
+
+        request_json = self._data_serializer.assemble_request(method, args or kw or None)
+        extra_headers = None
+        if entry is not None:
+            request_json['id'] = entry.request_id
+            extra_headers = {'If-None-Match': entry.etag}
+
+        response = self._send(self._data_serializer.dumps(request_json), request_json, extra_headers=extra_headers)
+        ttl, store = self._ttl(method, response)
+        if response.status_code == 304:
+            cache.revalidated(key, ttl)
+            return entry.result
+
+        result = self._process_response(self._decode(response))
+        if store:
+            cache.store(key, result, ttl, response.headers.get('ETag'), request_json.get('id'))
+        return result
+
+    def call_bulk(self, calls):
+        """
+        Same as RemoteClient.call_bulk, but results that are in the cache
+        are taken from there. The rest of the calls - each distinct one
+        once - go to the server in one batch.
+        """
+        cache = self.cache
+        calls = list(calls)
+        results = [None] * len(calls)
+        # cache key -> positions of the calls with that key
+        missing = collections.OrderedDict()
+        uncached = []
+        for position, (method, params) in enumerate(calls):
+            key = cache.key(method, params)
+            if key is None:
+                uncached.append(position)
+                continue
+            if key not in missing:
+                entry, fresh = cache.lookup(key)
+                if fresh:
+                    results[position] = entry.result
+                    continue
+                missing[key] = []
+            missing[key].append(position)
+
+        # one call per key, followed by the calls that are not cached
+        sent = [positions[0] for positions in missing.itervalues()] + uncached
+        if not sent:
+            return results
+
+        batch = StringIO()
+        positions = self.dump_batch((calls[position] for position in sent), batch)
+        response = self._send(batch.getvalue(), batch.getvalue())
+        sent_results = self._bulk_results(positions, self._decode(response))
+
+        for position, result in zip(sent, sent_results):
+            results[position] = result
+
+        for key, key_positions in missing.iteritems():
+            result = results[key_positions[0]]
+            for position in key_positions[1:]:
+                results[position] = result
+            if not isinstance(result, errors.RPCError):
+                ttl, store = self._ttl(key[0], response)
+                if store:
+                    cache.store(key, result, ttl)
+        return results
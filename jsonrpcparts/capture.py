@@ -0,0 +1,191 @@
+"""
+Capture of the requests (and responses) a server gets, for replaying
+production load against new releases (see `replay`)::
+
+    application.recorder = CaptureRecorder('/var/log/rpc/capture.jsonl.gz', sample_rate=0.05)
+
+The capture is a gzip-compressed JSON lines file, a record per request::
+
+    {"time": 1700000000.12, "content_type": "application/json", "request": "{...}", "response": "{...}"}
+
+("response" only with record_responses, "accept" when the client sent Accept header.)
+
+Bodies that are not UTF-8 text (MessagePack, CBOR) are stored base64
+encoded, as "request_base64" and "response_base64". The file is only ever
+appended to. Each batch of records is a gzip member of its own, so a
+crash loses no more than the batch being written.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import base64
+import gzip
+import json
+import os
+import random
+import time
+import zlib
+from cStringIO import StringIO
+
+from .accesslog import BackgroundLineWriter
+
+
+def _body_fields(record, name, body):
+    if body is None:
+        return
+    try:
+        record[name] = body.decode('utf-8') if isinstance(body, str) else body
+    except UnicodeDecodeError:
+        record[name + '_base64'] = base64.b64encode(body)
+
+
+def record_body(record, name):
+    """:return: the body (str) stored as name ("request" or "response") in the record, or None"""
+    if name in record:
+        body = record[name]
+        return body.encode('utf-8') if isinstance(body, unicode) else body
+    if name + '_base64' in record:
+        return base64.b64decode(record[name + '_base64'])
+    return None
+
+
+class GzipAppendFile(object):
+    """File-like output appending every write to the file as a gzip member of its own"""
+
+    def __init__(self, path, compression_level=6):
+        self.compression_level = compression_level
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+
+    def write(self, data):
+        buffer = StringIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=self.compression_level) as member:
+            member.write(data)
+        data = buffer.getvalue()
+        while data:
+            data = data[os.write(self._fd, data):]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def read_records(path, chunk_size=64 * 1024):
+    """Reads a capture file - gzip-compressed or plain JSON lines
+
+    The file is read as the records are taken, a gzip member at a time, so
+    captures need not fit in memory. Reading stops quietly at a damaged end
+    (of a file being written, or of one cut short by a crash).
+
+    :return: iterator of the records (dicts)
+    """
+    with open(path, 'rb') as capture_file:
+        compressed = capture_file.read(2) == '\x1f\x8b'
+        capture_file.seek(0)
+        if compressed:
+            lines = (
+                line
+                for member in _gunzip_members(capture_file, chunk_size)
+                for line in member.splitlines()
+            )
+        else:
+            lines = capture_file
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def _gunzip_members(capture_file, chunk_size):
+    """:return: generator of the decompressed contents of the complete gzip members of the file"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    member = []
+    while True:
+        data = capture_file.read(chunk_size)
+        if not data:
+            if member and _ended(decompressor):
+                yield ''.join(member)
+            return
+        while data:
+            try:
+                member.append(decompressor.decompress(data))
+            except zlib.error:
+                return
+            # input after the end of a member is left unused - it is the next member
+            data = decompressor.unused_data
+            if data:
+                yield ''.join(member)
+                member = []
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _ended(decompressor):
+    """:return: True if the decompressor got to the end of its stream"""
+    # zlib of Python 2 has no `eof`, but input given after the end is left unused
+    try:
+        decompressor.decompress('\x00')
+    except zlib.error:
+        return False
+    return decompressor.unused_data == '\x00'
+
+
+class CaptureRecorder(object):
+    """
+    Records a sample of the requests a JSONPRCWSGIApplication handles
+    (set as its `recorder`). Writing happens in a background thread (see
+    accesslog.BackgroundLineWriter); when it falls behind, records are dropped.
+
+    :Variables:
+        - writer: the BackgroundLineWriter - see its counters
+    """
+
+    def __init__(self, output, sample_rate=1.0, record_responses=False, clock=time.time, **writer_options):
+        """
+        :Parameters:
+            - output: path of the capture file, or a file-like object to write the
+                (uncompressed) JSON lines to
+            - sample_rate: part (0 to 1) of the requests to record
+            - record_responses: record the responses too, so a replay can
+                compare them with the new ones
+            - clock: function returning current time in seconds
+            - writer_options: more arguments for BackgroundLineWriter
+        """
+        self._file = None
+        if isinstance(output, basestring):
+            output = self._file = GzipAppendFile(output)
+        self.writer = BackgroundLineWriter(output, **writer_options)
+        self.sample_rate = sample_rate
+        self.record_responses = record_responses
+        self.clock = clock
+
+    def record(self, content_type, request_body, response_body=None, accept=None):
+        """Records the request (if sampled)
+
+        :Parameters:
+            - content_type: value of Content-Type header of the request
+            - request_body: the request (decompressed)
+            - response_body: the response (before compression), None if there was none
+            - accept: value of Accept header of the request, if any
+        :return: True if it was recorded
+        """
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return False
+        record = {'time': self.clock(), 'content_type': content_type}
+        if accept:
+            record['accept'] = accept
+        _body_fields(record, 'request', request_body)
+        if self.record_responses:
+            _body_fields(record, 'response', response_body)
+        return self.writer.write(record)
+
+    def close(self):
+        """Writes out the queued records and closes the capture file"""
+        self.writer.close()
+        if self._file is not None:
+            self._file.close()
@@ -3,9 +3,10 @@ This module contains code that simplifies the job of JSON-RPC clients.
 
 This file is part of `jsonrpcparts` project. See project's source for license and copyright.
 """
-import json
-import requests
+import itertools
+from cStringIO import StringIO
 
+from . import compression
 from . import errors
 from . import JSONRPC20Serializer
 
@@ -33,6 +34,8 @@ class Client(object):
         self._in_batch_mode = False
         self._requests = []
         self._data_serializer = data_serializer
+        # ids of dump_batch requests
+        self._ids = itertools.count(1)
 
     # Context manager API
     def __enter__(self):
@@ -87,51 +90,40 @@ class Client(object):
         else:
             return self._requests
 
-class WebClient(Client):
-    """
-    This class internalizes the JSON RPC Client class which allows batching of requests
-    and adds code that turns RPC call / notification run into HTTP requests.
-    """
-
-    def __init__(self, rpc_server_url, data_serializer=JSONRPC20Serializer):
+    def dump_batch(self, calls, fp, notification=False):
         """
+        Bulk alternative to batch mode (`with client as batch:`) for huge batches.
+
+        Serializes the calls straight into fp, with sequential ids, unique
+        within this client. See serializer's dump_batch.
+
         :Parameters:
-            - prc_server_url: string
-            - data_serializer: a data_structure+serializer-instance
+            - calls: iterable of (method, params) pairs. params is a list/tuple/dict or None
+            - fp: file-like object the serialized batch is written to
+            - notification: send notifications instead of calls
+        :Returns: dict of request id -> position of the call in `calls`
         """
-        super(WebClient, self).__init__(data_serializer)
-        self._rpc_server_url = rpc_server_url
-
-    def _communicate(self, request_json, expect_response):
-        response = requests.post(
-            self._rpc_server_url,
-            data=json.dumps(request_json),
-            headers={'Content-Type': 'application/json'}
-        )
+        return self._data_serializer.dump_batch(calls, fp, self._ids, notification)
 
-        if response.status_code != 200:
-            raise ResponseStatusError(request_json, response)
+class RemoteClient(Client):
+    """
+    Base class for clients that deliver the requests to the server
+    and bring back the responses over some transport.
 
-        if expect_response:
-            return response.json()
+    Subclasses implement `_communicate`.
+    """
 
-    def notify(self, method, *args, **kw):
-        """
+    def _communicate(self, request_json, expect_response):
+        """Delivers the request to the server
 
+        :param request_json: request data structure (as returned by the serializer's assemble_request)
+        :param expect_response: when False (notifications) response is not waited for
+        :return: decoded response data structure or None
         """
-        self._communicate(
-            super(WebClient, self).notify(method, *args, **kw),
-            expect_response=False
-        )
+        raise NotImplementedError
 
-    def call(self, method, *args, **kw):
-        """
-`
-        """
-        json_rpc_response = self._communicate(
-            super(WebClient, self).call(method, *args, **kw),
-            expect_response=True
-        )
+    def _process_response(self, json_rpc_response):
+        """Raises the error described in the response data or returns the result"""
 
         #base['error'] = {
         #    'message':error.message,
@@ -155,3 +147,234 @@ class WebClient(Client):
                 )
 
         return json_rpc_response['result']
+
+    def notify(self, method, *args, **kw):
+        """
+
+        """
+        self._communicate(
+            super(RemoteClient, self).notify(method, *args, **kw),
+            expect_response=False
+        )
+
+    def call(self, method, *args, **kw):
+        """
+`
+        """
+        json_rpc_response = self._communicate(
+            super(RemoteClient, self).call(method, *args, **kw),
+            expect_response=True
+        )
+
+        return self._process_response(json_rpc_response)
+
+    def _communicate_batch(self, batch_data, expect_response, request_ids=()):
+        """Delivers already serialized batch to the server
+
+        :param request_ids: ids of the calls in the batch, for transports
+            that match the responses to the calls by id
+        :return: decoded response data structure or None
+        """
+        raise NotImplementedError
+
+    def call_bulk(self, calls):
+        """
+        Sends many calls as one batch, built with `dump_batch`.
+
+        :param calls: iterable of (method, params) pairs. params is a list/tuple/dict or None
+        :return: list of results, in order of the calls. Calls that failed
+            have the error (RPCError instance) in place of the result.
+        """
+        batch = StringIO()
+        positions = self.dump_batch(calls, batch)
+        return self._bulk_results(
+            positions,
+            self._communicate_batch(batch.getvalue(), expect_response=True, request_ids=positions.keys())
+        )
+
+    def _bulk_results(self, positions, json_rpc_responses):
+        """Orders the results of a batch sent with `dump_batch` by position of the calls
+
+        :param positions: dict of request id -> position of the call, as `dump_batch` returns
+        :param json_rpc_responses: decoded batch response
+        """
+        if isinstance(json_rpc_responses, dict):
+            # server could not make sense of the batch as a whole
+            self._process_response(json_rpc_responses)
+            raise errors.RPCInvalidRequest("Batch response is not a list.")
+
+        results = [None] * len(positions)
+        for json_rpc_response in json_rpc_responses:
+            position = positions.get(json_rpc_response.get('id'))
+            if position is None:
+                continue
+            try:
+                results[position] = self._process_response(json_rpc_response)
+            except errors.RPCError as ex:
+                results[position] = ex
+        return results
+
+    def _iter_batch_responses(self, batch_data, request_ids=()):
+        """Delivers already serialized batch to the server
+
+        Transports that can read the response as it arrives override this
+        to yield the parsed responses early.
+
+        :param request_ids: ids of the calls in the batch, see _communicate_batch
+        :return: iterable of (result, request_id, error) tuples, see serializer's parse_response
+        """
+        json_rpc_responses = self._communicate_batch(batch_data, expect_response=True, request_ids=request_ids)
+        if isinstance(json_rpc_responses, dict):
+            json_rpc_responses = [json_rpc_responses]
+        return [
+            self._data_serializer._parse_single_response_trap_errors(json_rpc_response)
+            for json_rpc_response in json_rpc_responses
+        ]
+
+    def iter_call_bulk(self, calls):
+        """
+        Like `call_bulk`, but hands out the results one by one, as soon as
+        they come in. Over the web client the response is parsed while it
+        is downloading, so results of huge batches do not pile up in memory.
+
+        :param calls: iterable of (method, params) pairs. params is a list/tuple/dict or None
+        :return: generator of (position of the call in `calls`, result) pairs,
+            in order the server answers. Calls that failed have the error
+            (RPCError instance) in place of the result.
+        """
+        batch = StringIO()
+        positions = self.dump_batch(calls, batch)
+        for result, request_id, error in self._iter_batch_responses(batch.getvalue(), positions.keys()):
+            position = positions.get(request_id)
+            if position is None:
+                if request_id is None and error is not None:
+                    # server could not make sense of the batch as a whole
+                    raise error
+                continue
+            yield position, (result if error is None else error)
+
+    def notify_bulk(self, calls):
+        """
+        Sends many notifications as one batch, built with `dump_batch`.
+
+        :param calls: iterable of (method, params) pairs. params is a list/tuple/dict or None
+        """
+        batch = StringIO()
+        self.dump_batch(calls, batch, notification=True)
+        self._communicate_batch(batch.getvalue(), expect_response=False)
+
+
+class WebClient(RemoteClient):
+    """
+    This class internalizes the JSON RPC Client class which allows batching of requests
+    and adds code that turns RPC call / notification run into HTTP requests.
+    """
+
+    # request bodies shorter than this (bytes) are sent uncompressed
+    compression_threshold = 1024
+
+    # bytes read from the response at a time by `iter_call_bulk`
+    stream_chunk_size = 64 * 1024
+
+    # tracing.Tracer - when set, requests are made in spans of their own,
+    # and carry the trace context to the server in `traceparent` header
+    tracer = None
+
+    def __init__(self, rpc_server_url, data_serializer=JSONRPC20Serializer, content_encoding=None):
+        """
+        :Parameters:
+            - prc_server_url: string
+            - data_serializer: a data_structure+serializer-instance
+            - content_encoding: "gzip", "deflate" or "zstd" - encoding for request bodies
+                (the server must support Content-Encoding'd requests). Also
+                makes the client ask for zstd-compressed responses when zstd is
+                available. gzip and deflate responses are always accepted.
+        """
+        super(WebClient, self).__init__(data_serializer)
+        self._rpc_server_url = rpc_server_url
+        self._content_encoding = content_encoding and compression.normalize_encoding(content_encoding)
+
+    def _communicate(self, request_json, expect_response):
+        return self._post(self._data_serializer.dumps(request_json), request_json, expect_response)
+
+    def _communicate_batch(self, batch_data, expect_response, request_ids=()):
+        return self._post(batch_data, batch_data, expect_response)
+
+    def _iter_batch_responses(self, batch_data, request_ids=()):
+        response = self._send(batch_data, batch_data, stream=True)
+        try:
+            chunks = response.iter_content(self.stream_chunk_size)
+            # requests decodes gzip and deflate itself
+            if response.headers.get('Content-Encoding', '').strip().lower() == 'zstd':
+                chunks = compression.iter_decompress(chunks, 'zstd')
+            for parsed in self._data_serializer.iter_parse_response(chunks):
+                yield parsed
+        finally:
+            response.close()
+
+    def _post(self, data, request_json, expect_response):
+        response = self._send(data, request_json)
+
+        if expect_response:
+            return self._decode(response)
+
+    def _decode(self, response):
+        """Returns decoded body of the response (requests.Response)"""
+        content = response.content
+        # requests decodes gzip and deflate itself
+        if response.headers.get('Content-Encoding', '').strip().lower() == 'zstd':
+            content = compression.decompress(content, 'zstd')
+        return self._data_serializer.loads(content)
+
+    def _send(self, data, request_json, stream=False, extra_headers=None):
+        """POSTs the data, returns the response (requests.Response) of status 200
+
+        :param stream: leave the body unread, to be read with `iter_content`
+        :param extra_headers: dict of more request headers. With "If-None-Match"
+            among them, "304 Not Modified" responses are returned too.
+        """
+        ds = self._data_serializer
+        headers = {'Content-Type': ds.content_type, 'Accept': ds.content_type}
+        if extra_headers:
+            headers.update(extra_headers)
+
+        if self._content_encoding:
+            headers['Accept-Encoding'] = ', '.join(compression.available_encodings())
+            if len(data) >= self.compression_threshold:
+                data = compression.compress(data, self._content_encoding)
+                headers['Content-Encoding'] = self._content_encoding
+
+        tracer = self.tracer
+        if tracer is None:
+            response = self._http_post(data, headers, stream, request_json)
+        else:
+            with tracer.start_span(
+                request_json.get('method') if isinstance(request_json, dict) else 'jsonrpc.batch',
+                kind='client',
+                attributes={'rpc.system': 'jsonrpc', 'http.url': self._rpc_server_url}
+            ) as span:
+                tracer.inject(headers, span)
+                response = self._http_post(data, headers, stream, request_json)
+                span.set_attribute('http.status_code', response.status_code)
+                if response.status_code >= 400:
+                    span.status = span.ERROR
+
+        if response.status_code != 200 and not (
+            response.status_code == 304 and 'If-None-Match' in headers
+        ):
+            # reads the body of streamed responses, for the error's sake
+            response.content
+            raise ResponseStatusError(request_json, response)
+        return response
+
+    def _http_post(self, data, headers, stream, request_json):
+        """Makes the HTTP request. Subclasses that talk to more than one server override this.
+
+        :param request_json: request data structure or the serialized batch, for reference
+        :return: requests.Response
+        """
+        # imported on first use, importing the package should stay cheap for servers
+        import requests
+        if stream:
+            return requests.post(self._rpc_server_url, data=data, headers=headers, stream=True)
+        return requests.post(self._rpc_server_url, data=data, headers=headers)
@@ -0,0 +1,210 @@
+"""
+HTTP Content-Encoding support for the WSGI application and the web client.
+
+Supported encodings are "gzip", "deflate" and, when `zstandard` package is
+installed, "zstd".
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import io
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# used when level is not given
+DEFAULT_LEVELS = {
+    'gzip': 6,
+    'deflate': 6,
+    'zstd': 3
+}
+
+_ALIASES = {
+    'x-gzip': 'gzip'
+}
+
+
+def available_encodings():
+    """
+    :return: list of supported encodings, most preferred first
+    """
+    if zstandard is None:
+        return ['gzip', 'deflate']
+    return ['zstd', 'gzip', 'deflate']
+
+
+def normalize_encoding(encoding):
+    """
+    :return: name of the encoding as used in this module or None for "identity" (no encoding)
+    :Raises: ValueError when the encoding is not supported
+    """
+    encoding = encoding.strip().lower()
+    encoding = _ALIASES.get(encoding, encoding)
+    if not encoding or encoding == 'identity':
+        return None
+    if encoding not in available_encodings():
+        raise ValueError('Content-Encoding "%s" is not supported.' % encoding)
+    return encoding
+
+
+def choose_encoding(accept_encoding, encodings=None):
+    """
+    Picks the encoding for the response based on Accept-Encoding header.
+
+    Of the encodings with the highest q-value the one earlier in `encodings` wins.
+
+    :param accept_encoding: value of Accept-Encoding header or None
+    :param encodings: encodings to choose from, most preferred first. Defaults to available_encodings()
+    :return: encoding name or None when the response is to be sent as is
+    """
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for entry in accept_encoding.split(','):
+        parts = entry.split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for parameter in parts[1:]:
+            name, _, value = parameter.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[_ALIASES.get(coding, coding)] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings or available_encodings():
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, level=None):
+    """
+    :param data: str to compress
+    :param encoding: "gzip", "deflate" or "zstd"
+    :param level: compression level. Defaults to DEFAULT_LEVELS[encoding]
+    """
+    if level is None:
+        level = DEFAULT_LEVELS[encoding]
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == 'deflate':
+        return zlib.compress(data, level)
+    raise ValueError('Content-Encoding "%s" is not supported.' % encoding)
+
+
+def decompress(data, encoding, max_size=None):
+    """
+    :param data: compressed str
+    :param encoding: "gzip", "deflate" or "zstd"
+    :param max_size: longest result (in bytes) we agree to produce.
+        Guards against tiny requests that decompress into gigabytes.
+    :Raises: ValueError when data is corrupt, longer than max_size or encoding is not supported
+    """
+    if encoding == 'zstd':
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+        try:
+            if max_size is None:
+                result = reader.readall() if hasattr(reader, 'readall') else reader.read()
+            else:
+                result = reader.read(max_size + 1)
+        except zstandard.ZstdError as ex:
+            raise ValueError('Corrupt zstd data: %s' % ex)
+    elif encoding in ('gzip', 'deflate'):
+        if encoding == 'gzip':
+            wbits = _GZIP_WBITS
+        elif data[:1] and ord(data[0]) & 0x0F == 8:
+            wbits = zlib.MAX_WBITS
+        else:
+            # some clients send "deflate" without the zlib header
+            wbits = -zlib.MAX_WBITS
+        decompressor = zlib.decompressobj(wbits)
+        try:
+            if max_size is None:
+                result = decompressor.decompress(data) + decompressor.flush()
+            else:
+                result = decompressor.decompress(data, max_size + 1)
+        except zlib.error as ex:
+            raise ValueError('Corrupt %s data: %s' % (encoding, ex))
+    else:
+        raise ValueError('Content-Encoding "%s" is not supported.' % encoding)
+
+    if max_size is not None and len(result) > max_size:
+        raise ValueError('Decompressed data is longer than %d bytes.' % max_size)
+    return result
+
+
+def iter_compress(chunks, encoding, level=None):
+    """
+    Compresses an iterable of str chunks incrementally, for bodies that are
+    produced piece by piece and should not be buffered whole.
+
+    :return: generator of compressed chunks
+    """
+    if level is None:
+        level = DEFAULT_LEVELS[encoding]
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    elif encoding == 'deflate':
+        compressor = zlib.compressobj(level)
+    else:
+        raise ValueError('Content-Encoding "%s" is not supported.' % encoding)
+
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_decompress(chunks, encoding):
+    """
+    Decompresses an iterable of compressed str chunks incrementally,
+    counterpart of `iter_compress`.
+
+    :return: generator of decompressed chunks
+    :Raises: ValueError when data is corrupt or encoding is not supported
+    """
+    if encoding == 'zstd':
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        corrupt = zstandard.ZstdError
+    elif encoding == 'gzip':
+        decompressor = zlib.decompressobj(_GZIP_WBITS)
+        corrupt = zlib.error
+    elif encoding == 'deflate':
+        decompressor = None
+        corrupt = zlib.error
+    else:
+        raise ValueError('Content-Encoding "%s" is not supported.' % encoding)
+
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if decompressor is None:
+                # zlib header or not, see `decompress`
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS if ord(chunk[0]) & 0x0F == 8 else -zlib.MAX_WBITS)
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+        if encoding != 'zstd' and decompressor is not None:
+            data = decompressor.flush()
+            if data:
+                yield data
+    except corrupt as ex:
+        raise ValueError('Corrupt %s data: %s' % (encoding, ex))
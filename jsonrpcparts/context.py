@@ -0,0 +1,131 @@
+"""
+The context a request is processed in: who makes it, until when it may
+take, its trace span and metrics. One RequestContext is made per
+(HTTP) request and passed down to the methods by reference::
+
+    @takes_request_context
+    def delete_user(user_id, request_context):
+        if not request_context.auth.may_delete(user_id):
+            raise errors.RPCFault(...)
+
+Contexts come from RequestContextPool, which keeps the released ones of
+each thread for reuse.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import threading
+import time
+
+
+def takes_request_context(function):
+    """Marks a JSON-RPC method as one that wants the RequestContext of the request.
+
+    Such method is called with the context as `request_context` named
+    argument, in addition to the params of the call. It gets it only when
+    the request is processed with a context (JSONPRCWSGIApplication makes
+    one for every request).
+
+    The context is reused for another request once this one is answered,
+    so do not keep it (or let threads use it) past the call.
+    """
+    function.takes_request_context = True
+    return function
+
+
+class RequestContext(object):
+    """
+    Everything about one request that is not its params.
+
+    Subclass it (with __slots__ of your own) to give the middleware more
+    typed places for their data, and make the pool make your subclass.
+
+    :Variables:
+        - environ: WSGI environ of the HTTP request, or None
+        - started: time (time.time()) the processing started at
+        - deadline: time after which the answer is of no use, or None
+        - auth: whatever authentication put here (user, permissions), or None
+        - span: trace span of the request (see `tracing`), or None
+        - metrics: metrics handle, or None
+        - data: dict for anything else, or None until needed
+    """
+    __slots__ = ('environ', 'started', 'deadline', 'auth', 'span', 'metrics', 'data')
+
+    def __init__(self, environ=None):
+        self.reset(environ)
+
+    def reset(self, environ=None):
+        """Makes the context a fresh one, for another request"""
+        self.environ = environ
+        self.started = time.time()
+        self.deadline = None
+        self.auth = None
+        self.span = None
+        self.metrics = None
+        self.data = None
+
+    def copy(self):
+        """:return: a context like this one, for work that outlives the request (this one gets reused)"""
+        cls = self.__class__
+        context = cls.__new__(cls)
+        for klass in cls.__mro__:
+            for name in klass.__dict__.get('__slots__', ()):
+                if hasattr(self, name):
+                    setattr(context, name, getattr(self, name))
+        if self.data is not None:
+            context.data = dict(self.data)
+        return context
+
+    def remaining(self):
+        """:return: seconds left until the deadline (negative when past it), or None if there is none"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def expired(self):
+        """:return: True if the deadline has passed"""
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def __repr__(self):
+        return '<%s started=%r deadline=%r>' % (self.__class__.__name__, self.started, self.deadline)
+
+
+class RequestContextPool(object):
+    """
+    Hands out RequestContext instances and takes them back for reuse.
+
+    Each thread reuses its own released contexts, so no locks are taken.
+    """
+
+    def __init__(self, context_class=RequestContext, max_size=8):
+        """
+        :Parameters:
+            - context_class: RequestContext or its subclass
+            - max_size: at most this many released contexts are kept per thread
+        """
+        self.context_class = context_class
+        self.max_size = max_size
+        self._local = threading.local()
+
+    def _free(self):
+        try:
+            return self._local.free
+        except AttributeError:
+            free = self._local.free = []
+            return free
+
+    def acquire(self, environ=None):
+        """:return: fresh RequestContext for a request"""
+        free = self._free()
+        if free:
+            context = free.pop()
+            context.reset(environ)
+            return context
+        return self.context_class(environ)
+
+    def release(self, context):
+        """Takes back the context of a request that was answered"""
+        free = self._free()
+        if len(free) < self.max_size:
+            # drop the references now, not when the context is reused
+            context.reset()
+            free.append(context)
@@ -0,0 +1,315 @@
+"""
+Transport for callers that run on the same host as the JSON-RPC server.
+
+Messages travel over a Unix domain socket, each preceded by its length
+(like `streaming.LengthPrefixedFraming`). No HTTP, no TCP.
+
+Optionally the client sets up two shared memory ring buffers with the
+server, one per direction. Large messages are then copied into the ring
+and only their position in it travels over the socket:
+
+    client = LocalClient.connect('/run/myservice.sock', shm_size=16 * 1024 * 1024)
+    client.call('process', big_document)
+
+Server side:
+
+    server = make_local_server(application, '/run/myservice.sock')
+    server.serve_forever()
+
+Small messages, and messages that do not fit into the ring at the moment,
+are sent inline over the socket, so a full ring never blocks.
+
+Wire format. Header is 4-byte big-endian unsigned integer:
+
+- bits 0..29 - length of the frame that follows
+- bit 31 - frame is a (8-byte offset, 4-byte length) reference to a message
+  in the sender's ring
+- bit 30 - frame is a control message (JSON). Client sends
+  {"rings": [client_to_server_path, server_to_client_path]}, server answers
+  {"attached": true} or {"attached": false, "error": "..."}
+
+Ring is a file (in /dev/shm where available) mapped by both sides. Its first
+8 bytes hold the count of bytes the reader has consumed so far, the data
+area starts at byte 64. Writer tracks its own count of bytes produced.
+Offsets are monotonic byte counts, position in the data area is offset modulo
+its size. Each ring has exactly one writer and one reader.
+
+Server only maps regular files named like the ones clients create and owned
+by its own user. Ring files are created readable by their owner only, so
+shared memory works between processes of the same user.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import json
+import mmap
+import os
+import stat
+import struct
+import tempfile
+
+from .serializers import JSONRPC20Serializer
+from .streaming import FramingError, LengthPrefixedFraming, StreamClient, make_server
+
+_SHARED = 0x80000000
+_CONTROL = 0x40000000
+
+_RING_PREFIX = 'jsonrpcparts-'
+_RING_SUFFIX = '.ring'
+
+
+def _check_ring_file(path):
+    """Guards the server against clients passing paths of files other than ring files"""
+    name = os.path.basename(path)
+    if not (name.startswith(_RING_PREFIX) and name.endswith(_RING_SUFFIX)):
+        raise ValueError("%s is not a ring file." % path)
+    info = os.lstat(path)
+    if not stat.S_ISREG(info.st_mode) or info.st_uid != os.geteuid():
+        raise ValueError("%s is not a regular file owned by the server's user." % path)
+
+
+class SharedRing(object):
+    """
+    Single-producer single-consumer byte ring in a memory mapped file.
+    """
+
+    _counter = struct.Struct('>Q')
+    data_offset = 64
+
+    def __init__(self, path, size=None):
+        """
+        :Parameters:
+            - path: file backing the ring
+            - size: when given, the file is (re)sized to this many bytes.
+                    Otherwise the ring takes the size of the existing file.
+        """
+        self.path = path
+        fd = os.open(path, os.O_RDWR)
+        try:
+            if size is not None:
+                os.ftruncate(fd, size)
+            else:
+                size = os.fstat(fd).st_size
+            if size <= self.data_offset:
+                raise ValueError("Ring of %d bytes is too small." % size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.capacity = size - self.data_offset
+        self.produced = 0
+
+    @classmethod
+    def create(cls, size, directory=None):
+        """Creates ring in a new temporary file. Caller is responsible for removing the file."""
+        if directory is None and os.path.isdir('/dev/shm'):
+            directory = '/dev/shm'
+        fd, path = tempfile.mkstemp(prefix=_RING_PREFIX, suffix=_RING_SUFFIX, dir=directory)
+        os.close(fd)
+        try:
+            return cls(path, size)
+        except Exception:
+            os.remove(path)
+            raise
+
+    @property
+    def consumed(self):
+        return self._counter.unpack_from(self._map, 0)[0]
+
+    def write(self, message):
+        """
+        Copies the message into the ring.
+
+        :return: offset of the message or None when there is no room for it
+        """
+        size = len(message)
+        capacity = self.capacity
+        if size > capacity - (self.produced - self.consumed):
+            return None
+
+        offset = self.produced
+        start = self.data_offset + offset % capacity
+        first = min(size, self.data_offset + capacity - start)
+        self._map[start:start + first] = message[:first]
+        if first < size:
+            self._map[self.data_offset:self.data_offset + size - first] = message[first:]
+        self.produced = offset + size
+        return offset
+
+    def read(self, offset, size):
+        """
+        Copies the message out of the ring and releases its space.
+
+        Messages have to be read in the order they were written.
+        """
+        capacity = self.capacity
+        if size > capacity:
+            raise FramingError("Shared memory message is larger than the ring.")
+
+        start = self.data_offset + offset % capacity
+        first = min(size, self.data_offset + capacity - start)
+        message = self._map[start:start + first]
+        if first < size:
+            message += self._map[self.data_offset:self.data_offset + size - first]
+        self._counter.pack_into(self._map, 0, offset + size)
+        return message
+
+    def close(self):
+        self._map.close()
+
+
+class LocalFraming(LengthPrefixedFraming):
+    """
+    Length-prefixed framing that can pass large messages through shared memory rings.
+    """
+
+    _size_mask = 0x3FFFFFFF
+    _reference = struct.Struct('>QI')
+
+    # messages shorter than this are always sent inline
+    shm_threshold = 32 * 1024
+
+    def __init__(self, rfile, wfile):
+        super(LocalFraming, self).__init__(rfile, wfile)
+        self.send_ring = None
+        self.recv_ring = None
+
+    def read_message(self):
+        while True:
+            flags, message = self._read_frame()
+            if not flags:
+                return message
+            if flags & _SHARED:
+                if self.recv_ring is None:
+                    raise FramingError("Shared memory message arrived before the rings were attached.")
+                if len(message) != self._reference.size:
+                    raise FramingError("Malformed shared memory message reference.")
+                offset, size = self._reference.unpack(message)
+                return self.recv_ring.read(offset, size)
+            try:
+                control = json.loads(message)
+            except ValueError:
+                raise FramingError("Malformed control message.")
+            self._handle_control(control)
+
+    def write_message(self, message):
+        ring = self.send_ring
+        if ring is not None and len(message) >= self.shm_threshold:
+            offset = ring.write(message)
+            if offset is not None:
+                self._write_frame(_SHARED, self._reference.pack(offset, len(message)))
+                return
+        self._write_frame(0, message)
+
+    def _handle_control(self, control):
+        """Server side of the ring attachment"""
+        if not isinstance(control, dict) or 'rings' not in control:
+            return
+        try:
+            recv_path, send_path = control['rings']
+            _check_ring_file(recv_path)
+            _check_ring_file(send_path)
+            recv_ring = SharedRing(recv_path)
+            send_ring = SharedRing(send_path)
+        except Exception as ex:
+            reply = {'attached': False, 'error': str(ex)}
+        else:
+            self.close()
+            self.recv_ring = recv_ring
+            self.send_ring = send_ring
+            reply = {'attached': True}
+        self._write_frame(_CONTROL, json.dumps(reply))
+
+    def attach(self, size, directory=None):
+        """
+        Client side of the ring attachment. Creates the rings and hands them to the server.
+
+        No other messages may be in flight while this runs.
+
+        :return: True when the server attached the rings.
+        """
+        send_ring = SharedRing.create(size, directory)
+        try:
+            recv_ring = SharedRing.create(size, directory)
+        except Exception:
+            send_ring.close()
+            os.remove(send_ring.path)
+            raise
+
+        try:
+            self._write_frame(_CONTROL, json.dumps({'rings': [send_ring.path, recv_ring.path]}))
+            flags, reply = self._read_frame()
+        finally:
+            # both sides have them mapped by now, the files are not needed
+            os.remove(send_ring.path)
+            os.remove(recv_ring.path)
+
+        if flags != _CONTROL:
+            send_ring.close()
+            recv_ring.close()
+            raise FramingError("Server did not answer shared memory attachment.")
+
+        if not json.loads(reply).get('attached'):
+            send_ring.close()
+            recv_ring.close()
+            return False
+
+        self.close()
+        self.send_ring = send_ring
+        self.recv_ring = recv_ring
+        return True
+
+    def close(self):
+        for ring in (self.send_ring, self.recv_ring):
+            if ring is not None:
+                ring.close()
+        self.send_ring = self.recv_ring = None
+
+
+def make_local_server(application, path):
+    """
+    Creates (bound and listening) Unix domain socket server for `LocalClient`s.
+    Run it with `serve_forever()`.
+
+    :param application: JSONPRCApplication instance
+    :param path: file system path of the socket
+    """
+    return make_server(application, path, LocalFraming)
+
+
+class LocalClient(StreamClient):
+    """
+    Client of `make_local_server` servers.
+    """
+
+    @classmethod
+    def connect(cls, path, data_serializer=JSONRPC20Serializer, timeout=None, shm_size=None, shm_directory=None):
+        """
+        :Parameters:
+            - path: file system path of the server's socket
+            - data_serializer: a data_structure+serializer-instance
+            - timeout: socket timeout in seconds
+            - shm_size: size (bytes) of each of the two shared memory rings.
+                        None means large messages are sent over the socket too.
+            - shm_directory: where to create the ring files. Defaults to /dev/shm
+        """
+        client = super(LocalClient, cls).connect(path, LocalFraming, data_serializer, timeout)
+        if shm_size:
+            try:
+                client.attach_shared_memory(shm_size, shm_directory)
+            except Exception:
+                client.close()
+                raise
+        return client
+
+    def attach_shared_memory(self, size, directory=None):
+        """
+        Sets up shared memory rings with the server.
+
+        :return: True when the server attached the rings. Otherwise everything
+            keeps going over the socket.
+        """
+        with self._lock:
+            return self._stream.attach(size, directory)
+
+    @property
+    def uses_shared_memory(self):
+        return self._stream.send_ring is not None
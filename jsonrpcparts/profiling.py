@@ -0,0 +1,227 @@
+"""
+Profiling of JSON-RPC method calls in production, for finding out why a
+method is slow without redeploying with a profiler around it.
+
+CallProfiler is call middleware (see JSONPRCApplication.add_call_middleware)::
+
+    profiler = CallProfiler(sample_rate=0.01, slow_threshold=0.5)
+    application.add_call_middleware(profiler)
+    ...
+    profiler.dump('/tmp/profiles')
+
+It profiles a fraction of the calls (sample_rate) with cProfile, or with
+a statistical sampler of the call's stack. Calls running longer than
+slow_threshold get their stacks sampled too, whether they were picked or
+not. Profiles are kept per method name, and dumped as pstats files
+(`python -m pstats`, snakeviz) and collapsed stacks (flamegraph.pl, speedscope).
+
+The overhead stays bounded: calls that are not picked only pay for a
+random number (and, with slow_threshold, for noting the call's start
+time), the sampler looks at the stacks every `sampler_interval` seconds
+and no more than `max_stacks` distinct stacks are kept per method.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import cProfile
+import os
+import pstats
+import random
+import sys
+import thread
+import threading
+import time
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    label = '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+    # ; and space separate the frames and the count in collapsed stacks
+    return label.replace(';', ':').replace(' ', '_')
+
+
+class CallProfiler(object):
+    """
+    Call middleware that profiles some of the calls.
+
+    :Variables:
+        - profiled: number of calls picked for profiling
+        - slow: number of calls that ran longer than slow_threshold
+        - samples: number of stack samples taken
+        - dropped: number of samples not kept because of max_stacks
+    """
+
+    CPROFILE = 'cprofile'
+    SAMPLER = 'sampler'
+
+    def __init__(self, sample_rate=0.01, slow_threshold=None, mode=CPROFILE, sampler_interval=0.005,
+                 max_stacks=10000):
+        """
+        :Parameters:
+            - sample_rate: part (0 to 1) of the calls to profile
+            - slow_threshold: seconds after which a running call gets its stack
+                sampled, None for not watching for slow calls
+            - mode: CPROFILE - picked calls run under cProfile (exact, but
+                slows them down several times), or SAMPLER - their stacks are
+                sampled (see sampler_interval) like those of slow calls
+            - sampler_interval: seconds between samples of the stacks
+            - max_stacks: most distinct stacks kept per method
+        """
+        if mode not in (self.CPROFILE, self.SAMPLER):
+            raise ValueError('Unknown profiling mode "%s".' % mode)
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.mode = mode
+        self.sampler_interval = sampler_interval
+        self.max_stacks = max_stacks
+        self.profiled = 0
+        self.slow = 0
+        self.samples = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        # method name > pstats.Stats of its calls profiled with cProfile
+        self._stats = {}
+        # method name > {collapsed stack: number of samples}
+        self._stacks = {}
+        # thread id > (method name, frame of the call, time to start sampling its stack at)
+        self._running = {}
+        self._sampler = None
+        self._sampler_pid = None
+        self._stopped = threading.Event()
+
+    def __call__(self, call_next, name, method, args, kwargs, request_id, context):
+        picked = self.sample_rate > 0 and random.random() < self.sample_rate
+        if picked:
+            with self._lock:
+                self.profiled += 1
+            if self.mode == self.CPROFILE:
+                return self._profile(call_next, name, method, args, kwargs, request_id, context)
+        elif self.slow_threshold is None:
+            return call_next(name, method, args, kwargs, request_id, context)
+
+        started = time.time()
+        thread_id = thread.get_ident()
+        running = self._running
+        # a method may call the application again, in the same thread
+        outer = running.get(thread_id)
+        running[thread_id] = (name, sys._getframe(), started if picked else started + self.slow_threshold)
+        if self._sampler_pid != os.getpid():
+            self._start_sampler()
+        try:
+            return call_next(name, method, args, kwargs, request_id, context)
+        finally:
+            if outer is None:
+                del running[thread_id]
+            else:
+                running[thread_id] = outer
+            if self.slow_threshold is not None and time.time() - started >= self.slow_threshold:
+                with self._lock:
+                    self.slow += 1
+
+    def _profile(self, call_next, name, method, args, kwargs, request_id, context):
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(call_next, name, method, args, kwargs, request_id, context)
+        finally:
+            with self._lock:
+                stats = self._stats.get(name)
+                if stats is None:
+                    self._stats[name] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+
+    def _start_sampler(self):
+        with self._lock:
+            # threads do not survive fork, every process needs a sampler of its own
+            if self._sampler_pid == os.getpid():
+                return
+            self._sampler_pid = os.getpid()
+            self._stopped.clear()
+            self._sampler = threading.Thread(target=self._sample_forever, name='jsonrpcparts-profiler')
+            self._sampler.daemon = True
+            self._sampler.start()
+
+    def _sample_forever(self):
+        while not self._stopped.wait(self.sampler_interval):
+            if self._running:
+                self.sample()
+
+    def sample(self):
+        """Takes a sample of the stacks of the calls that are due to be sampled"""
+        now = time.time()
+        frames = sys._current_frames()
+        for thread_id, call in self._running.items():
+            name, call_frame, sample_from = call
+            if now < sample_from:
+                continue
+            frame = frames.get(thread_id)
+            labels = []
+            while frame is not None and frame is not call_frame:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if frame is None:
+                # the call ended meanwhile, the thread is elsewhere now
+                continue
+            labels.append(name)
+            stack = ';'.join(reversed(labels))
+            with self._lock:
+                self.samples += 1
+                stacks = self._stacks.setdefault(name, {})
+                if stack in stacks:
+                    stacks[stack] += 1
+                elif len(stacks) < self.max_stacks:
+                    stacks[stack] = 1
+                else:
+                    self.dropped += 1
+
+    def stop(self):
+        """Stops the sampler thread (it starts again with the next call to watch)"""
+        sampler = self._sampler
+        if sampler is None:
+            return
+        self._stopped.set()
+        if sampler.is_alive():
+            sampler.join()
+        self._sampler = None
+        self._sampler_pid = None
+
+    def methods(self):
+        """:return: sorted names of the methods there are profiles of"""
+        with self._lock:
+            return sorted(set(self._stats) | set(self._stacks))
+
+    def stats(self, name):
+        """:return: pstats.Stats of the method's calls profiled with cProfile, or None"""
+        with self._lock:
+            return self._stats.get(name)
+
+    def collapsed(self, name):
+        """:return: the sampled stacks of the method in collapsed format - "frame;frame;frame count" lines"""
+        with self._lock:
+            stacks = sorted(self._stacks.get(name, {}).items())
+        return ''.join('%s %d\n' % stack for stack in stacks)
+
+    def dump(self, directory):
+        """Writes the profiles into the directory: <method>.pstats and <method>.collapsed files
+
+        :return: list of paths of the written files
+        """
+        paths = []
+        for name in self.methods():
+            base = os.path.join(directory, name.replace(os.sep, '_'))
+            stats = self.stats(name)
+            if stats is not None:
+                with self._lock:
+                    stats.dump_stats(base + '.pstats')
+                paths.append(base + '.pstats')
+            collapsed = self.collapsed(name)
+            if collapsed:
+                with open(base + '.collapsed', 'w') as collapsed_file:
+                    collapsed_file.write(collapsed)
+                paths.append(base + '.collapsed')
+        return paths
+
+    def reset(self):
+        """Drops the profiles collected so far"""
+        with self._lock:
+            self._stats.clear()
+            self._stacks.clear()
@@ -0,0 +1,336 @@
+"""
+Sometimes it pays not to decode (or not to re-encode) a piece of JSON.
+A method that forwards its params to another service does not need them
+decoded, a method that pulls a result out of a cache already holds it
+as JSON text.
+
+This module contains the RawJSON type that wraps such undecoded slices of
+JSON text and code that cuts them out of JSON-RPC messages without decoding.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import re
+from json.decoder import scanstring
+
+
+class RawJSON(object):
+    """
+    A slice of JSON text that is carried around without being decoded.
+
+    Comes in as `params` in raw params mode. Methods may return it as
+    their result - serializers copy it into the response verbatim.
+
+    :Variables:
+        - json: the JSON text (str/unicode)
+    """
+    __slots__ = ('json',)
+
+    def __init__(self, json):
+        self.json = json
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and self.json == other.json
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "RawJSON(%r)" % self.json
+
+
+def takes_raw_params(function):
+    """Marks a JSON-RPC method as one that wants its params undecoded.
+
+    Such method is called with exactly one positional argument - RawJSON
+    instance with the `params` of the request (or None if request has no params).
+    The params are passed on undecoded when the serializer keeps them raw
+    (see `JSONRPC20Serializer.raw_params`) and are re-encoded otherwise.
+
+    Use as a decorator::
+
+        @takes_raw_params
+        def forward(params):
+            return downstream.post(params.json)
+    """
+    function.takes_raw_params = True
+    return function
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+# remainder of a string after the opening quote, up to and including the closing quote
+_STRING_TAIL = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+
+def skip_container(s, idx):
+    """Finds the end of JSON array or object starting at s[idx] without decoding it.
+
+    Only the brackets and the strings are looked at, so malformed content
+    inside of the container is not detected here. It comes up when
+    the slice is decoded.
+
+    :param s: JSON text
+    :param idx: index of the opening "[" or "{"
+    :return: index right after the closing bracket
+    :Raises: ValueError if the container is not terminated
+    """
+    search = _STRUCTURAL.search
+    match_string_tail = _STRING_TAIL.match
+    depth = 0
+    while True:
+        match = search(s, idx)
+        if match is None:
+            raise ValueError("Unterminated JSON array or object starting at %d" % idx)
+        char = s[match.start()]
+        idx = match.end()
+        if char == '"':
+            match = match_string_tail(s, idx)
+            if match is None:
+                raise ValueError("Unterminated string starting at %d" % (idx - 1))
+            idx = match.end()
+        elif char == '[' or char == '{':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return idx
+
+
+def _decode_object(s, idx, raw_keys, raw_decode):
+    """Decodes JSON object starting at s[idx] keeping array and object
+    values of members named in raw_keys as RawJSON.
+
+    :return: (dict, index right after the object)
+    """
+    match_whitespace = _WHITESPACE.match
+    obj = {}
+    idx = match_whitespace(s, idx + 1).end()
+    if s[idx:idx + 1] == '}':
+        return obj, idx + 1
+    while True:
+        if s[idx:idx + 1] != '"':
+            raise ValueError("Expecting property name at %d" % idx)
+        key, idx = scanstring(s, idx + 1)
+        idx = match_whitespace(s, idx).end()
+        if s[idx:idx + 1] != ':':
+            raise ValueError("Expecting : delimiter at %d" % idx)
+        idx = match_whitespace(s, idx + 1).end()
+        if key in raw_keys and s[idx:idx + 1] in ('[', '{'):
+            end = skip_container(s, idx)
+            obj[key] = RawJSON(s[idx:end])
+            idx = end
+        else:
+            obj[key], idx = raw_decode(s, idx)
+        idx = match_whitespace(s, idx).end()
+        char = s[idx:idx + 1]
+        if char == '}':
+            return obj, idx + 1
+        if char != ',':
+            raise ValueError("Expecting , delimiter at %d" % idx)
+        idx = match_whitespace(s, idx + 1).end()
+
+
+def loads_keeping_raw(s, raw_keys, decoder):
+    """Decodes JSON-RPC message like json.loads does, but keeps values of
+    the named members of the request objects undecoded.
+
+    Request objects are the top-level object or the objects directly inside
+    of the top-level (batch) array. Only array and object values are kept raw.
+    Everything else is decoded with the decoder.
+
+    :param s: JSON text
+    :param raw_keys: collection of member names, like ('params',)
+    :param decoder: json.JSONDecoder instance
+    :Raises: ValueError on malformed JSON
+    """
+    raw_decode = decoder.raw_decode
+    match_whitespace = _WHITESPACE.match
+
+    idx = match_whitespace(s, 0).end()
+    char = s[idx:idx + 1]
+    if char == '{':
+        data, idx = _decode_object(s, idx, raw_keys, raw_decode)
+    elif char == '[':
+        data = []
+        idx = match_whitespace(s, idx + 1).end()
+        if s[idx:idx + 1] == ']':
+            idx += 1
+        else:
+            while True:
+                if s[idx:idx + 1] == '{':
+                    element, idx = _decode_object(s, idx, raw_keys, raw_decode)
+                else:
+                    element, idx = raw_decode(s, idx)
+                data.append(element)
+                idx = match_whitespace(s, idx).end()
+                char = s[idx:idx + 1]
+                if char == ']':
+                    idx += 1
+                    break
+                if char != ',':
+                    raise ValueError("Expecting , delimiter at %d" % idx)
+                idx = match_whitespace(s, idx + 1).end()
+    else:
+        data, idx = raw_decode(s, idx)
+
+    idx = match_whitespace(s, idx).end()
+    if idx != len(s):
+        raise ValueError("Extra data at %d" % idx)
+    return data
+
+
+_ELEMENT_STRUCTURAL = re.compile(r'[\[\]{}",]')
+_STRING_STOP = re.compile(r'["\\]')
+
+# states of iter_batch_elements
+_BEGIN, _BEFORE_ELEMENT, _IN_ELEMENT, _AFTER_ELEMENT, _DONE = range(5)
+
+
+def _decode_element(text, raw_decode):
+    value, end = raw_decode(text, 0)
+    if end != len(text):
+        raise ValueError("Extra data at %d" % end)
+    return value
+
+
+def iter_batch_elements(chunks, decoder=None):
+    """Cuts JSON text, arriving as an iterable of chunks, into the JSON texts
+    of the elements of the top-level array. Each element is yielded as soon
+    as its last chunk comes in, so big batches are processed in constant memory.
+
+    A top-level object (not batch) is yielded whole. The elements are not
+    validated, only the brackets and the strings are looked at, malformed
+    content of an element comes up when it is decoded.
+
+    :param chunks: iterable of str (or unicode) pieces of the JSON text, split anywhere
+    :param decoder: json.JSONDecoder instance. When given, elements are
+        yielded decoded. Arrays and objects that lie whole within one chunk
+        are then decoded in place, without being looked at character by character.
+    :return: generator of str (or decoded elements)
+    :Raises: ValueError if the top-level value is not an array or an object,
+        or the text is not properly terminated. Elements before the fault
+        are yielded already.
+    """
+    search = _ELEMENT_STRUCTURAL.search
+    search_string_stop = _STRING_STOP.search
+    match_whitespace = _WHITESPACE.match
+    raw_decode = decoder.raw_decode if decoder is not None else None
+
+    state = _BEGIN
+    batch = False
+    first = True
+    depth = 0
+    in_string = False
+    escaped = False
+    pieces = []
+    offset = 0  # position of the current chunk in the whole text, for error messages
+
+    for chunk in chunks:
+        idx = 0
+        length = len(chunk)
+        start = 0
+
+        while idx < length:
+            if state == _IN_ELEMENT:
+                if in_string:
+                    if escaped:
+                        escaped = False
+                        idx += 1
+                        continue
+                    match = search_string_stop(chunk, idx)
+                    if match is None:
+                        break
+                    idx = match.end()
+                    if chunk[match.start()] == '\\':
+                        if idx < length:
+                            idx += 1
+                        else:
+                            escaped = True
+                    else:
+                        in_string = False
+                    continue
+
+                if depth == 0 and idx == start and raw_decode is not None and chunk[idx] in '[{':
+                    # fast path. Fails when the element goes on in the next chunk (or is malformed)
+                    try:
+                        value, idx = raw_decode(chunk, idx)
+                    except ValueError:
+                        pass
+                    else:
+                        yield value
+                        state = _AFTER_ELEMENT if batch else _DONE
+                        continue
+
+                match = search(chunk, idx)
+                if match is None:
+                    break
+                char = chunk[match.start()]
+                if char == '"':
+                    in_string = True
+                elif char == '[' or char == '{':
+                    depth += 1
+                elif depth == 0:
+                    # end of a scalar element, the "," or "]" belongs to the batch
+                    end = match.start()
+                    pieces.append(chunk[start:end])
+                    element = ''.join(pieces).rstrip()
+                    del pieces[:]
+                    yield element if raw_decode is None else _decode_element(element, raw_decode)
+                    state = _AFTER_ELEMENT
+                    idx = end
+                    continue
+                elif char != ',':
+                    depth -= 1
+                    if depth == 0:
+                        end = match.end()
+                        pieces.append(chunk[start:end])
+                        element = ''.join(pieces)
+                        del pieces[:]
+                        yield element if raw_decode is None else _decode_element(element, raw_decode)
+                        state = _AFTER_ELEMENT if batch else _DONE
+                idx = match.end()
+                continue
+
+            idx = match_whitespace(chunk, idx).end()
+            if idx == length:
+                break
+            char = chunk[idx]
+            if state == _BEGIN:
+                if char == '[':
+                    batch = True
+                    state = _BEFORE_ELEMENT
+                    idx += 1
+                elif char == '{':
+                    state = _IN_ELEMENT
+                    start = idx
+                else:
+                    raise ValueError("Expecting JSON array or object at %d" % (offset + idx))
+            elif state == _BEFORE_ELEMENT:
+                if char == ']' and first:
+                    state = _DONE
+                    idx += 1
+                elif char == ',' or char == ']':
+                    raise ValueError("Expecting value at %d" % (offset + idx))
+                else:
+                    first = False
+                    state = _IN_ELEMENT
+                    start = idx
+            elif state == _AFTER_ELEMENT:
+                if char == ',':
+                    state = _BEFORE_ELEMENT
+                elif char == ']':
+                    state = _DONE
+                else:
+                    raise ValueError("Expecting , delimiter at %d" % (offset + idx))
+                idx += 1
+            else:
+                raise ValueError("Extra data at %d" % (offset + idx))
+
+        if state == _IN_ELEMENT and start < length:
+            pieces.append(chunk[start:])
+        offset += length
+
+    if state != _DONE:
+        raise ValueError("Unexpected end of JSON text at %d" % offset)
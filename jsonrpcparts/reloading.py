@@ -0,0 +1,177 @@
+"""
+Reloading of the JSON-RPC methods of a running server, without restarting it.
+
+Reloader reloads the modules with the methods' code, registers the methods
+anew into a fresh collection and makes it replace the served one at once
+(see JSONPRCCollection.replace). Requests being processed finish with the
+old methods, the following ones get the new, none is dropped::
+
+    def setup(collection):
+        collection.register_class(users.UsersService(), 'users')
+        collection.register_function(billing.charge)
+
+    application = JSONPRCWSGIApplication()
+    setup(application)
+
+    reloader = Reloader(application, [users, billing], setup)
+    reloader.install_signal_handler()   # `kill -USR2 <pid>` reloads
+    reloader.watch()                    # so does changing the source files
+
+Reloading is triggered in the process that gets the signal or runs the
+watcher. The watcher is a thread, and threads do not survive fork - with
+pre-forking servers use the signal. `serve` passes SIGUSR2 its master
+gets on to the workers, which inherit the handler installed when the
+application module was imported. When `serve` wraps a plain collection
+into a JSONPRCWSGIApplication, the Reloader of the collection replaces the
+methods of the wrapping application too (see JSONPRCCollection.served_by).
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import logging
+import os
+import signal
+import sys
+import threading
+
+from .application import JSONPRCCollection
+
+logger = logging.getLogger(__name__)
+
+
+def source_file(module):
+    """:return: path of the source (.py) file of the module, or None if it has none"""
+    path = getattr(module, '__file__', None)
+    if not path:
+        return None
+    base, extension = os.path.splitext(path)
+    if extension in ('.pyc', '.pyo') and os.path.exists(base + '.py'):
+        return base + '.py'
+    return path
+
+
+class Reloader(object):
+    """
+    Reloads modules and replaces the methods of a collection with the ones
+    registered by the reloaded code.
+
+    :Variables:
+        - reloads: number of successful reloads
+        - failures: number of reloads that failed (the served methods stayed as they were)
+        - last_error: exception of the last failed reload, None after a successful one
+    """
+
+    def __init__(self, collection, modules, setup):
+        """
+        :Parameters:
+            - collection: JSONPRCCollection (or application) with the served methods.
+                If another one serves them (collection.served_by), its methods are replaced too.
+            - modules: the modules (or their names) to reload, in the order to
+                reload them in - the ones others import from go first
+            - setup: function registering the methods into the JSONPRCCollection
+                it is given. Called after the modules are reloaded, so it sees
+                their new code.
+        """
+        self.collection = collection
+        self.module_names = [
+            module if isinstance(module, basestring) else module.__name__
+            for module in modules
+        ]
+        self.setup = setup
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stopped = threading.Event()
+        self._mtimes = self._source_mtimes()
+
+    def _source_mtimes(self):
+        """:return: dict of module name -> modification time of its source file"""
+        mtimes = {}
+        for name in self.module_names:
+            path = source_file(sys.modules.get(name))
+            try:
+                mtimes[name] = os.stat(path).st_mtime if path else None
+            except OSError:
+                mtimes[name] = None
+        return mtimes
+
+    def changed(self):
+        """:return: True if a source file of the modules changed since the last reload"""
+        return self._source_mtimes() != self._mtimes
+
+    def reload(self):
+        """Reloads the modules and replaces the methods of the collection
+
+        Errors (in the reloaded code or in setup) are logged. The collection
+        then keeps the methods it had.
+
+        :return: True if the methods were replaced
+        """
+        with self._lock:
+            mtimes = self._source_mtimes()
+            try:
+                for name in self.module_names:
+                    module = sys.modules.get(name)
+                    if module is None:
+                        __import__(name)
+                    else:
+                        reload(module)
+                collection = JSONPRCCollection()
+                self.setup(collection)
+            except Exception as ex:
+                self.failures += 1
+                self.last_error = ex
+                logger.exception("Reloading of JSON-RPC methods failed, serving the ones loaded before.")
+                return False
+            finally:
+                # a broken file is not retried until it changes again
+                self._mtimes = mtimes
+            self.collection.replace(collection)
+            served_by = self.collection.served_by
+            if served_by is not None:
+                served_by.replace(collection)
+            self.reloads += 1
+            self.last_error = None
+        logger.info("Reloaded JSON-RPC methods (%d).", len(collection))
+        return True
+
+    def install_signal_handler(self, signum=signal.SIGUSR2):
+        """Makes the signal reload the methods
+
+        Must be called from the main thread. The reload runs in a thread
+        of its own, not in the middle of whatever the signal interrupted.
+        """
+        def handler(signum, frame):
+            thread = threading.Thread(target=self.reload, name='jsonrpcparts-reload')
+            thread.daemon = True
+            thread.start()
+
+        signal.signal(signum, handler)
+
+    def watch(self, interval=1.0):
+        """Starts a thread that reloads the methods when their source files change
+
+        :param interval: seconds between the checks of modification times of the files
+        """
+        if self._watcher is not None:
+            return
+        self._stopped.clear()
+
+        def poll():
+            while not self._stopped.wait(interval):
+                if self.changed():
+                    self.reload()
+
+        self._watcher = threading.Thread(target=poll, name='jsonrpcparts-reload-watcher')
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def stop(self):
+        """Stops the watching thread"""
+        watcher = self._watcher
+        if watcher is None:
+            return
+        self._stopped.set()
+        watcher.join()
+        self._watcher = None
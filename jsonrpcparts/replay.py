@@ -0,0 +1,246 @@
+"""
+Replays requests recorded with `capture.CaptureRecorder` against a
+server, to see how a new release copes with production load::
+
+    python -m jsonrpcparts.replay capture.jsonl.gz --url http://127.0.0.1:8000/rpc --speed 2
+    python -m jsonrpcparts.replay capture.jsonl.gz --app mypackage.rpc:application --speed 0
+
+Requests are sent with the time between them they were recorded with,
+divided by --speed (0 sends them as fast as possible). The application is
+either called in-process (--app, as for `serve`) or over HTTP (--url).
+Reports throughput, latency percentiles and - for captures with responses
+- the responses that differ from the recorded ones.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from cStringIO import StringIO
+
+from .capture import read_records, record_body
+from .workers import WorkerPool
+
+
+def wsgi_sender(application):
+    """:return: send(content_type, body, accept) -> (status code, response body) calling the WSGI application"""
+
+    def send(content_type, body, accept=None):
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'replay',
+            'SERVER_PORT': '0',
+            'wsgi.input': StringIO(body),
+            'CONTENT_LENGTH': str(len(body)),
+            'CONTENT_TYPE': content_type or 'application/json'
+        }
+        if accept:
+            environ['HTTP_ACCEPT'] = accept
+        status = []
+        response = ''.join(application(environ, lambda code, headers, exc_info=None: status.append(code)))
+        return int(status[0].split(None, 1)[0]), response
+
+    return send
+
+
+def http_sender(url):
+    """:return: send(content_type, body, accept) -> (status code, response body) POSTing to the URL"""
+    import requests
+    local = threading.local()
+
+    def send(content_type, body, accept=None):
+        # a session (kept-alive connection) per thread
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        headers = {'Content-Type': content_type or 'application/json'}
+        if accept:
+            headers['Accept'] = accept
+        response = session.post(url, data=body, headers=headers)
+        return response.status_code, response.content
+
+    return send
+
+
+def _percentile(ordered, percent):
+    if not ordered:
+        return None
+    return ordered[int(round(percent / 100.0 * (len(ordered) - 1)))]
+
+
+def _same_response(content_type, expected, actual):
+    if not expected and not actual:
+        return True
+    if expected is None or actual is None:
+        return False
+    if (content_type or '').split(';')[0].strip().lower() == 'application/json':
+        try:
+            return json.loads(expected) == json.loads(actual)
+        except ValueError:
+            pass
+    return expected == actual
+
+
+class ReplayReport(object):
+    """
+    Outcome of a replay.
+
+    :Variables:
+        - sent: number of requests sent
+        - failed: number of requests that got no response or a non-200 one
+        - elapsed: seconds the replay took
+        - latencies: sorted response times in seconds
+        - compared: number of responses compared with the recorded ones
+        - differences: list of (index of the record, recorded response, new response)
+            of the responses that differ
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self.latencies = []
+        self.compared = 0
+        self.differences = []
+
+    @property
+    def throughput(self):
+        """:return: requests per second"""
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, percent):
+        """:return: response time (seconds) `percent` % of the requests did not exceed, or None"""
+        return _percentile(self.latencies, percent)
+
+    def as_dict(self):
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+            'latency': dict(
+                ('p%g' % percent, self.percentile(percent)) for percent in (50, 90, 99, 100)
+            ),
+            'compared': self.compared,
+            'differences': len(self.differences)
+        }
+
+    def format(self, show_differences=5):
+        """:return: the report as text for people"""
+        lines = ['Replayed %d requests in %.2f s (%.1f requests/s), %d failed' % (
+            self.sent, self.elapsed, self.throughput, self.failed
+        )]
+        if self.latencies:
+            lines.append('Latency ms: ' + '  '.join(
+                '%s %.2f' % (label, self.percentile(percent) * 1000)
+                for label, percent in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))
+            ))
+        if self.compared:
+            lines.append('Responses: %d compared, %d differ' % (self.compared, len(self.differences)))
+            for index, expected, actual in self.differences[:show_differences]:
+                lines.append('  #%d: recorded %s' % (index, (expected or '')[:200]))
+                lines.append('  #%d: got      %s' % (index, (actual or '')[:200]))
+        return '\n'.join(lines)
+
+
+def replay(records, send, speed=1.0, concurrency=8, compare=True, clock=time.time, sleep=time.sleep):
+    """Sends the recorded requests
+
+    :Parameters:
+        - records: iterable of capture records (see capture.read_records)
+        - send: function (content_type, body, accept) -> (status code, response body),
+            see wsgi_sender and http_sender
+        - speed: how many times faster than recorded to send. 0 for as fast as possible.
+        - concurrency: most requests in flight at a time
+        - compare: compare the responses with the recorded ones (where there are any)
+    :return: ReplayReport
+    """
+    report = ReplayReport()
+    lock = threading.Lock()
+    pool = WorkerPool(concurrency, queue_size=concurrency, name='jsonrpcparts-replay')
+
+    def send_one(index, record):
+        body = record_body(record, 'request')
+        content_type = record.get('content_type')
+        started = clock()
+        try:
+            status, response = send(content_type, body, record.get('accept'))
+        except Exception:
+            status, response = None, None
+        latency = clock() - started
+
+        with lock:
+            if status != 200:
+                report.failed += 1
+                return
+            report.latencies.append(latency)
+            expected = record_body(record, 'response')
+            if compare and ('response' in record or 'response_base64' in record):
+                report.compared += 1
+                if not _same_response(content_type, expected, response):
+                    report.differences.append((index, expected, response))
+
+    started = clock()
+    first_time = None
+    try:
+        for index, record in enumerate(records):
+            if speed and record.get('time') is not None:
+                if first_time is None:
+                    first_time = record['time']
+                delay = started + (record['time'] - first_time) / speed - clock()
+                if delay > 0:
+                    sleep(delay)
+            report.sent += 1
+            pool.submit(send_one, index, record)
+    finally:
+        pool.shutdown(wait=True)
+    report.elapsed = clock() - started
+    report.latencies.sort()
+    report.differences.sort(key=lambda difference: difference[0])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m jsonrpcparts.replay',
+        description='Replays JSON-RPC requests recorded with capture.CaptureRecorder.'
+    )
+    parser.add_argument('capture', help='capture file (gzip-compressed or plain JSON lines)')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--app', help='application to call in-process, as "package.module:attribute"')
+    target.add_argument('--url', help='URL of the server to send the requests to')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='times faster than recorded to send, 0 for as fast as possible (default 1)')
+    parser.add_argument('--concurrency', type=int, default=8, help='most requests in flight (default 8)')
+    parser.add_argument('--limit', type=int, default=None, help='replay at most this many requests')
+    parser.add_argument('--no-compare', dest='compare', action='store_false',
+                        help='do not compare responses with the recorded ones')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    options = parser.parse_args(argv)
+
+    if options.app:
+        from .serve import load_application
+        sys.path.insert(0, os.getcwd())
+        send = wsgi_sender(load_application(options.app))
+    else:
+        send = http_sender(options.url)
+
+    records = read_records(options.capture)
+    if options.limit is not None:
+        records = itertools.islice(records, options.limit)
+
+    report = replay(records, send, options.speed, options.concurrency, options.compare)
+    if options.json:
+        print json.dumps(report.as_dict(), sort_keys=True)
+    else:
+        print report.format()
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
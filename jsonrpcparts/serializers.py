@@ -6,12 +6,12 @@ in serializing data (including errors) into JSON-RPC message format.
 This file is part of `jsonrpcparts` project. See project's source for license and copyright.
 """
 
+import collections
+import itertools
 import json
-import random
-import time
-import uuid
 
 from . import errors
+from .rawjson import RawJSON, iter_batch_elements, loads_keeping_raw
 
 def clean_dict_keys(d):
     """Convert all keys of the dict 'd' to (ascii-)strings.
@@ -24,6 +24,221 @@ def clean_dict_keys(d):
     return new_d
 
 
+class ParsedRequest(collections.namedtuple('ParsedRequest', 'method params request_id error')):
+    """
+    Result of parsing of one request object (one element of a batch).
+
+    It is a tuple, so code that unpacks it as
+    `method, params, request_id, error = parsed_request`
+    keeps working, but the parts are also reachable by name.
+    """
+    __slots__ = ()
+
+
+# marks "this member is not present in the response object"
+_MISSING = object()
+
+# (serializer class, encoder class) -> encoder class that writes out response records, see _record_encoder
+_RECORD_ENCODERS = {}
+
+# exact classes the fast paths of request parsing accept. Subclasses take the slow path.
+_STRING_CLASSES = frozenset([str, unicode])
+_PARAMS_CLASSES = frozenset([list, tuple, dict, RawJSON])
+
+
+def _reusable_encode(encoder):
+    """
+    Returns `encode(obj)` function equivalent to `encoder.encode`.
+
+    `JSONEncoder.encode` builds a new C encoder object on every call, which is
+    most of the cost of encoding small values. For stock encoders (`default`
+    may be overridden) one C encoder is built here and reused.
+    """
+    make_encoder = json.encoder.c_make_encoder
+    if (
+        make_encoder is None or
+        type(encoder).encode is not json.JSONEncoder.encode or
+        type(encoder).iterencode is not json.JSONEncoder.iterencode or
+        encoder.indent is not None or encoder.sort_keys or encoder.encoding != 'utf-8'
+    ):
+        return encoder.encode
+
+    if encoder.ensure_ascii:
+        encode_string = json.encoder.encode_basestring_ascii
+    else:
+        encode_string = json.encoder.encode_basestring
+    iterencode = make_encoder(
+        {} if encoder.check_circular else None, encoder.default, encode_string, None,
+        encoder.key_separator, encoder.item_separator, False,
+        encoder.skipkeys, encoder.allow_nan
+    )
+    join = ''.join
+
+    def encode(obj):
+        return join(iterencode(obj, 0))
+
+    return encode
+
+
+def _error_object(error):
+    """Returns JSON-RPC error object (dict) for a RPCFault instance"""
+    if error.error_data is None:
+        return {
+            "code": error.error_code,
+            "message": error.message
+        }
+    else:
+        return {
+            "code": error.error_code,
+            "message": error.message,
+            "data": error.error_data
+        }
+
+
+def _encode_result(result, encode):
+    """RawJSON results are already JSON - these are copied out verbatim"""
+    if isinstance(result, RawJSON):
+        return result.json
+    return encode(result)
+
+
+class BaseResponse(object):
+    """
+    Compact record describing one response message.
+
+    Instances are read-only dict-alikes (`response['id']`, `'error' in response`,
+    `.keys()`, `.get()` work as with the plain dict response objects), but no
+    dict is built for them. Serializers write the record straight into JSON
+    with `encode`, also where records are nested in other data.
+
+    They are not dicts: plain `json.dumps` does not know them, and members
+    can not be set. Use `to_dict()` for a dict of the response.
+
+    :Variables:
+        - result: value returned by the method. RawJSON results are written out
+                  as is (no check is done that these are valid JSON)
+        - error: None or an RPCFault instance
+        - request_id: value of the `id` member
+    """
+    __slots__ = ('result', 'error', 'request_id')
+
+    # names of the response object's members in the order they are written out
+    _keys = ()
+
+    def __init__(self, result=None, error=None, request_id=None):
+        self.result = result
+        self.error = error
+        self.request_id = request_id
+
+    def _lookup(self, key):
+        """Returns value of response object's member or _MISSING"""
+        raise NotImplementedError
+
+    def encode(self, encode):
+        """Serializes the record into JSON object string
+
+        :param encode: callable that turns one value into a JSON string
+        :rtype: str
+        """
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def keys(self):
+        return [key for key in self._keys if self._lookup(key) is not _MISSING]
+
+    def items(self):
+        return [(key, self._lookup(key)) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __setitem__(self, key, value):
+        raise TypeError("Response records are read-only, make a dict of it with to_dict() to change it.")
+
+    def __len__(self):
+        return len(self.keys())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, BaseResponse):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.to_dict())
+
+
+class JSONRPC10Response(BaseResponse):
+    """JSON-RPC V1.0 response: "result", "error" and "id" are always present"""
+    __slots__ = ()
+
+    _keys = ('result', 'error', 'id')
+
+    def _lookup(self, key):
+        if key == 'id':
+            return self.request_id
+        if key == 'result':
+            return self.result if self.error is None else None
+        if key == 'error':
+            return None if self.error is None else _error_object(self.error)
+        return _MISSING
+
+    def encode(self, encode):
+        if self.error is None:
+            return '{"result": %s, "error": null, "id": %s}' % (
+                _encode_result(self.result, encode), encode(self.request_id)
+            )
+        return '{"result": null, "error": %s, "id": %s}' % (
+            encode(_error_object(self.error)), encode(self.request_id)
+        )
+
+
+class JSONRPC20Response(BaseResponse):
+    """JSON-RPC V2.0 response: has either "result" or "error" member"""
+    __slots__ = ()
+
+    _keys = ('jsonrpc', 'result', 'error', 'id')
+
+    def _lookup(self, key):
+        if key == 'id':
+            return self.request_id
+        if key == 'result':
+            return self.result if self.error is None else _MISSING
+        if key == 'error':
+            return _MISSING if self.error is None else _error_object(self.error)
+        if key == 'jsonrpc':
+            return "2.0"
+        return _MISSING
+
+    def encode(self, encode):
+        if self.error is None:
+            return '{"jsonrpc": "2.0", "result": %s, "id": %s}' % (
+                _encode_result(self.result, encode), encode(self.request_id)
+            )
+        return '{"jsonrpc": "2.0", "error": %s, "id": %s}' % (
+            encode(_error_object(self.error)), encode(self.request_id)
+        )
+
+
 class BaseJSONRPCSerializer(object):
     """
     Common base class for various json rpc serializers
@@ -39,11 +254,37 @@ class BaseJSONRPCSerializer(object):
     json_decoder = json.JSONDecoder
     json_encoder = json.JSONEncoder
 
+    # MIME type of the messages produced by `dumps` (and understood by `loads`)
+    content_type = 'application/json'
+
+    @classmethod
+    def dumps(cls, obj):
+        """
+        Encodes message data into the wire format of the serializer.
+        For JSON-RPC serializers that is JSON, but subclasses may pick
+        other (binary) encodings of the same data structure.
+
+        :rtype: str
+        """
+        return cls.json_dumps(obj)
+
+    @classmethod
+    def loads(cls, s):
+        """
+        Decodes message in the wire format of the serializer (see `dumps`)
+
+        :Raises: ValueError if `s` is not a valid message encoding
+        """
+        return cls.json_loads(s)
+
     @classmethod
     def json_dumps(cls, obj, **kwargs):
         """
         A rewrap of json.dumps done for one reason - to inject a custom `cls` kwarg
 
+        Response records (and lists of them) are written out directly,
+        without building intermediate dicts.
+
         :param obj:
         :param kwargs:
         :return:
@@ -51,8 +292,49 @@ class BaseJSONRPCSerializer(object):
         """
         if 'cls' not in kwargs:
             kwargs['cls'] = cls.json_encoder
+
+        if isinstance(obj, BaseResponse):
+            if len(kwargs) == 1:
+                return obj.encode(kwargs['cls']().encode)
+            obj = cls._response_to_dict(obj)
+        elif isinstance(obj, list) and obj and all(isinstance(item, BaseResponse) for item in obj):
+            if len(kwargs) == 1:
+                encode = kwargs['cls']().encode
+                return '[' + ', '.join([item.encode(encode) for item in obj]) + ']'
+            obj = [cls._response_to_dict(item) for item in obj]
+
+        # records may still be nested in the data (mixed with dict responses, say)
+        kwargs['cls'] = cls._record_encoder(kwargs['cls'])
         return json.dumps(obj, **kwargs)
 
+    @classmethod
+    def _record_encoder(cls, encoder):
+        """Returns subclass of the encoder class that encodes response records as dicts"""
+        key = (cls, encoder)
+        record_encoder = _RECORD_ENCODERS.get(key)
+        if record_encoder is None:
+            serializer = cls
+
+            class record_encoder(encoder):
+
+                def default(self, obj):
+                    if isinstance(obj, BaseResponse):
+                        return serializer._response_to_dict(obj)
+                    return encoder.default(self, obj)
+
+            _RECORD_ENCODERS[key] = record_encoder
+        return record_encoder
+
+    @classmethod
+    def _response_to_dict(cls, response):
+        """Turns response record into plain dict, decoding RawJSON result if any.
+        Used only when json_dumps is asked to format the output.
+        """
+        data = response.to_dict()
+        if 'result' in data and isinstance(data['result'], RawJSON):
+            data['result'] = cls.json_loads(data['result'].json)
+        return data
+
     @classmethod
     def json_loads(cls, s, **kwargs):
         """
@@ -156,15 +438,12 @@ class JSONRPC10Serializer(BaseJSONRPCSerializer):
     def assemble_response(result, id=None):
         """serialize a JSON-RPC-Response (without error)
 
-        :Returns:   | {"result": ..., "error": null, "id": ...}
+        :Returns:   | JSONRPC10Response record for {"result": ..., "error": null, "id": ...}
                     | "result", "error" and "id" are always in this order.
+                    | Records are read-only and not dicts, see BaseResponse.
         :Raises:    TypeError if not JSON-serializable
         """
-        return {
-            "result": result,
-            "error": None,
-            "id": id
-        }
+        return JSONRPC10Response(result, None, id)
 
     @staticmethod
     def assemble_error_response(error, id=None):
@@ -175,32 +454,16 @@ class JSONRPC10Serializer(BaseJSONRPCSerializer):
 
         :Parameters:
             - error: a RPCFault instance
-        :Returns:   | {"result": null, "error": {"code": error_code, "message": error_message, "data": error_data}, "id": ...}
+        :Returns:   | JSONRPC10Response record for
+                    | {"result": null, "error": {"code": error_code, "message": error_message, "data": error_data}, "id": ...}
                     | "result", "error" and "id" are always in this order, data is omitted if None.
+                    | Records are read-only and not dicts, see BaseResponse.
         :Raises:    ValueError if error is not a RPCFault instance,
                     TypeError if not JSON-serializable
         """
         if not isinstance(error, errors.RPCFault):
             raise ValueError("""error must be a RPCFault-instance.""")
-        if error.error_data is None:
-            return {
-                "result": None,
-                "error": {
-                    "code": error.error_code,
-                    "message": error.message
-                },
-                "id": id
-            }
-        else:
-            return {
-                "result": None,
-                "error": {
-                    "code":error.error_code,
-                    "message": error.message,
-                    "data": error.error_data
-                },
-                "id": id
-            }
+        return JSONRPC10Response(None, error, id)
 
     @classmethod
     def parse_request(cls, jsonrpc_message):
@@ -214,7 +477,7 @@ class JSONRPC10Serializer(BaseJSONRPCSerializer):
         :Raises:    RPCParseError, RPCInvalidRPC, RPCInvalidMethodParams
         """
         try:
-            data = cls.json_loads(jsonrpc_message)
+            data = cls.loads(jsonrpc_message)
         except ValueError, err:
             raise errors.RPCParseError("No valid JSON. (%s)" % str(err))
 
@@ -250,7 +513,7 @@ class JSONRPC10Serializer(BaseJSONRPCSerializer):
                     is raised.
         """
         try:
-            data = cls.json_loads(jsonrpc_message)
+            data = cls.loads(jsonrpc_message)
         except ValueError, err:
             raise errors.RPCParseError("No valid JSON. (%s)" % str(err))
         if not isinstance(data, dict):
@@ -315,6 +578,13 @@ class JSONRPC10Serializer(BaseJSONRPCSerializer):
 
 class JSONRPC20Serializer(BaseJSONRPCSerializer):
 
+    # When True, parse_request decodes the envelope of the request objects
+    # ("jsonrpc", "method", "id") but keeps the "params" as RawJSON. These are
+    # decoded only when the method is actually called (or are handed to the
+    # method undecoded, see rawjson.takes_raw_params).
+    # Turn on in a subclass for batches with many pass-through (proxy) calls.
+    raw_params = False
+
     @staticmethod
     def assemble_request(method, params=None, notification=False):
         """serialize JSON-RPC-Request
@@ -344,43 +614,97 @@ class JSONRPC20Serializer(BaseJSONRPCSerializer):
             base["params"] = params
 
         if not notification:
+            # imported here, it takes a while and only clients need it
+            import uuid
             base['id'] = str(uuid.uuid4())
 
         return base
 
+    @classmethod
+    def dump_batch(cls, calls, fp, ids=None, notification=False):
+        """
+        Writes a batch of requests into a file-like object, as they are
+        generated, without building request dicts. For batches of many
+        thousands of calls.
+
+        Output decodes to the same batch as `dumps` of a list of assemble_request results would.
+
+        :Parameters:
+            - calls: iterable of (method, params) pairs. params is a list/tuple/dict or None
+            - fp: file-like object (anything with `write`)
+            - ids: iterator of request ids. Defaults to 1, 2, 3...
+            - notification: write notifications (requests without ids)
+        :Returns: dict of request id -> position of the call in `calls`.
+            Empty for notifications.
+        :Raises:    TypeError if method/params is of wrong type or not JSON-serializable,
+                    ValueError if there are no calls
+        """
+        if ids is None:
+            ids = itertools.count(1)
+        next_id = ids.next
+        encode = _reusable_encode(cls.json_encoder())
+        string_types = (str, unicode)
+        params_types = (tuple, list, dict)
+
+        positions = {}
+        parts = []
+        write = fp.write
+        separator = '['
+        index = -1
+        for index, (method, params) in enumerate(calls):
+            if not isinstance(method, string_types):
+                raise TypeError('"method" must be a string (or unicode string).')
+            if params and not isinstance(params, params_types):
+                raise TypeError("params must be a tuple/list/dict or None.")
+
+            parts.append(separator)
+            parts.append('{"jsonrpc": "2.0", "method": ')
+            parts.append(encode(method))
+            if params:
+                parts.append(', "params": ')
+                parts.append(encode(params))
+            if notification:
+                parts.append('}')
+            else:
+                request_id = next_id()
+                positions[request_id] = index
+                parts.append(', "id": ')
+                parts.append(str(request_id) if request_id.__class__ is int else encode(request_id))
+                parts.append('}')
+            separator = ', '
+
+            if len(parts) > 4096:
+                write(''.join(parts))
+                del parts[:]
+
+        if index < 0:
+            raise ValueError("Batch must have at least one call.")
+        parts.append(']')
+        write(''.join(parts))
+        return positions
+
     @staticmethod
     def assemble_response(result, request_id):
-        return {
-            "jsonrpc": "2.0",
-            "result": result,
-            "id": request_id
-        }
+        """
+        :Returns: JSONRPC20Response record for {"jsonrpc": "2.0", "result": ..., "id": ...}
+            Records are read-only and not dicts, see BaseResponse.
+        """
+        return JSONRPC20Response(result, None, request_id)
 
     @staticmethod
     def assemble_error_response(error):
+        """
+        :Returns:   | JSONRPC20Response record for
+                    | {"jsonrpc": "2.0", "error": {"code": ..., "message": ..., "data": ...}, "id": ...}
+                    | "data" is omitted if None
+                    | Records are read-only and not dicts, see BaseResponse.
+        :Raises:    ValueError if error is not a RPCFault instance
+        """
 
         if not isinstance(error, errors.RPCFault):
             raise ValueError("""error must be a RPCFault-instance.""")
 
-        if error.error_data is None:
-            return {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code":error.error_code,
-                    "message":error.message
-                },
-                "id": error.request_id
-            }
-        else:
-            return {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code":error.error_code,
-                    "message": error.message,
-                    "data": error.error_data
-                },
-                "id": error.request_id
-            }
+        return JSONRPC20Response(None, error, error.request_id)
 
     @classmethod
     def _parse_single_request(cls, request_data):
@@ -388,10 +712,28 @@ class JSONRPC20Serializer(BaseJSONRPCSerializer):
 
         :Returns:   | [method_name, params, id]
                     | method (str)
-                    | params (tuple/list or dict)
+                    | params (tuple/list or dict, RawJSON in raw_params mode)
                     | id (str/int/None) (None means this is Notification)
         :Raises:    RPCParseError, RPCInvalidRPC, RPCInvalidMethodParams
         """
+        # Fast path for well-formed requests: one lookup per member, exact type checks.
+        # Anything unusual goes through _check_request_envelope, which finds
+        # and reports the problem.
+        get = request_data.get
+        params = get('params', _MISSING)
+        method = get('method')
+        if (
+            get('jsonrpc') == '2.0' and
+            method.__class__ in _STRING_CLASSES and
+            (params is _MISSING or params.__class__ in _PARAMS_CLASSES)
+        ):
+            return method, (None if params is _MISSING else params), get('id')
+
+        return cls._check_request_envelope(request_data)
+
+    @classmethod
+    def _check_request_envelope(cls, request_data):
+        """Member by member validation of a request object, in the order the errors are reported in"""
 
         request_id = request_data.get('id', None) # Notifications don't have IDs
 
@@ -405,7 +747,7 @@ class JSONRPC20Serializer(BaseJSONRPCSerializer):
             raise errors.RPCInvalidRequest('Invalid jsonrpc version.', request_id)
 
         if "params" in request_data:
-            if not isinstance(request_data["params"], (list, tuple, dict)):
+            if not isinstance(request_data["params"], (list, tuple, dict, RawJSON)):
                 raise errors.RPCInvalidMethodParams(
                     'value of argument "parameter" is of non-supported type %s' % type(request_data["params"]),
                     request_id
@@ -423,7 +765,7 @@ class JSONRPC20Serializer(BaseJSONRPCSerializer):
         converts them into values of request_id and error in the
         returned tuple.
 
-        :Returns: (method_name, params_object, request_id, error)
+        :Returns: ParsedRequest (method_name, params_object, request_id, error)
                 Where:
                 - method_name is a str (or None when error is set)
                 - params_object is one of list/tuple/dict/None
@@ -432,9 +774,9 @@ class JSONRPC20Serializer(BaseJSONRPCSerializer):
         """
         try:
             method, params, request_id = cls._parse_single_request(request_data)
-            return method, params, request_id, None
+            return ParsedRequest(method, params, request_id, None)
         except errors.RPCFault as ex:
-            return None, None, ex.request_id, ex
+            return ParsedRequest(None, None, ex.request_id, ex)
 
     @classmethod
     def parse_request(cls, request_string):
@@ -445,27 +787,84 @@ class JSONRPC20Serializer(BaseJSONRPCSerializer):
 
         :Returns:   | tuple of (results, is_batch_mode_flag)
                     | where:
-                    | - results is a tuple describing the request
+                    | - results is a list of ParsedRequest tuples describing the requests
                     | - Is_batch_mode_flag is a Bool indicating if the
                     |   request came in in batch mode (as array of requests) or not.
 
         :Raises:    RPCParseError, RPCInvalidRequest
         """
         try:
-            batch = cls.json_loads(request_string)
+            if cls.raw_params:
+                batch = cls.json_loads_raw_params(request_string)
+            else:
+                batch = cls.loads(request_string)
         except ValueError as err:
             raise errors.RPCParseError("No valid JSON. (%s)" % str(err))
 
         if isinstance(batch, (list, tuple)) and batch:
             # batch is true batch.
             # list of parsed request objects, is_batch_mode_flag
-            return [cls._parse_single_request_trap_errors(request) for request in batch], True
+            return cls._parse_batch(batch), True
         elif isinstance(batch, dict):
             # `batch` is actually single request object
             return [cls._parse_single_request_trap_errors(batch)], False
 
         raise errors.RPCInvalidRequest("Neither a batch array nor a single request object found in the request.")
 
+    @classmethod
+    def _parse_batch(cls, batch):
+        """
+        Same as `[cls._parse_single_request_trap_errors(request) for request in batch]`,
+        with the fast path of _parse_single_request inlined into one loop.
+
+        :Returns: list of ParsedRequest tuples
+        """
+        if (
+            cls._parse_single_request.__func__ is not JSONRPC20Serializer._parse_single_request.__func__ or
+            cls._parse_single_request_trap_errors.__func__ is not
+                JSONRPC20Serializer._parse_single_request_trap_errors.__func__
+        ):
+            # a subclass customized the parsing of request objects, let it do its thing
+            return [cls._parse_single_request_trap_errors(request) for request in batch]
+
+        new_parsed_request = tuple.__new__
+        parse_slowly = cls._parse_single_request_trap_errors
+        string_classes = _STRING_CLASSES
+        params_classes = _PARAMS_CLASSES
+        missing = _MISSING
+
+        parsed = []
+        append = parsed.append
+        for request in batch:
+            if request.__class__ is dict:
+                get = request.get
+                params = get('params', missing)
+                method = get('method')
+                if (
+                    get('jsonrpc') == '2.0' and
+                    method.__class__ in string_classes and
+                    (params is missing or params.__class__ in params_classes)
+                ):
+                    append(new_parsed_request(ParsedRequest, (
+                        method,
+                        None if params is missing else params,
+                        get('id'),
+                        None
+                    )))
+                    continue
+            append(parse_slowly(request))
+        return parsed
+
+    @classmethod
+    def json_loads_raw_params(cls, s):
+        """
+        Like json_loads, but "params" arrays/objects of request objects
+        are left undecoded, as RawJSON instances.
+
+        :rtype: dict or list
+        """
+        return loads_keeping_raw(s, ('params',), cls.json_decoder())
+
     @classmethod
     def _parse_single_response(cls, response_data):
         """de-serialize a JSON-RPC Response/error
@@ -538,7 +937,7 @@ class JSONRPC20Serializer(BaseJSONRPCSerializer):
         :Raises:    RPCParseError, RPCInvalidRequest
         """
         try:
-            batch = cls.json_loads(response_string)
+            batch = cls.loads(response_string)
         except ValueError as err:
             raise errors.RPCParseError("No valid JSON. (%s)" % str(err))
 
@@ -551,3 +950,30 @@ class JSONRPC20Serializer(BaseJSONRPCSerializer):
             return [cls._parse_single_response_trap_errors(batch)], False
 
         raise errors.RPCParseError("Neither a batch array nor a single response object found in the response.")
+
+    @classmethod
+    def iter_parse_response(cls, chunks):
+        """Incremental version of `parse_response` for responses read from
+        a stream. Yields the tuple for each element of the batch as soon as
+        the element's text has arrived, without waiting for the rest of the response.
+
+        :param chunks: iterable of str pieces of the response, split anywhere
+            (like `iter_content` of a streamed HTTP response)
+        :Returns:   generator of (result, request_id, error) tuples, like the
+                    elements of the list `parse_response` returns
+        :Raises:    RPCParseError, possibly after some tuples were yielded
+        """
+        elements = iter_batch_elements(chunks, cls.json_decoder())
+        parsed = False
+        while True:
+            try:
+                response = next(elements)
+            except StopIteration:
+                break
+            except ValueError as err:
+                raise errors.RPCParseError("No valid JSON. (%s)" % str(err))
+            parsed = True
+            yield cls._parse_single_response_trap_errors(response)
+
+        if not parsed:
+            raise errors.RPCParseError("Neither a batch array nor a single response object found in the response.")
@@ -0,0 +1,516 @@
+"""
+JSON-RPC Parts are building blocks, but most of the time what one builds
+out of them is an HTTP server for a JSON-RPC WSGI application. This module
+contains one: a pre-forking HTTP server.
+
+    python -m jsonrpcparts.serve --bind 0.0.0.0:8000 --workers 8 mypackage.rpc:application
+
+The master process forks the workers and watches over them. Each worker
+is a single-threaded HTTP server. Where SO_REUSEPORT is supported, each worker
+listens on its own socket bound to the same port and the kernel spreads the
+connections evenly between them. Elsewhere the workers share one listening socket.
+
+- Workers that die are restarted, workers that stop sending heartbeats
+  (stuck for longer than --timeout seconds) are killed and restarted.
+- SIGHUP restarts the workers one by one, without closing the port.
+- SIGUSR2 is passed on to the workers. Installed when the application
+  is imported, `reloading.Reloader.install_signal_handler` makes it reload
+  the methods of the workers without restarting them. Workers ignore it
+  otherwise.
+- SIGTERM / SIGINT stop the workers gracefully (in-flight requests are
+  finished, notifications queued to the application's notification_pool
+  done) and then the master.
+- Each worker answers GET on --health-path with its own health data,
+  the master writes state of all workers to --status-file.
+
+The application may be a WSGI application (like JSONPRCWSGIApplication) or a
+plain JSONPRCCollection/JSONPRCApplication, whose methods are then served by
+a JSONPRCWSGIApplication. Reloader of the plain one reloads the methods of
+the wrapping one too.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import argparse
+import errno
+import fcntl
+import importlib
+import json
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+import warnings
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from .application import JSONPRCApplication, JSONPRCCollection
+
+# Python 2 socket module does not name it, but Linux (3.9+) has it
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15 if sys.platform.startswith('linux') else None)
+
+
+def load_application(spec):
+    """Imports the application named as "package.module:attribute"
+
+    JSONPRCCollection instances that are not WSGI applications themselves
+    are wrapped into JSONPRCWSGIApplication. It gets the methods and, of a
+    JSONPRCApplication, the middleware, tracer and notification_pool too.
+    Methods a subclass overrides are not carried over (a warning says so).
+    The collection's `served_by` is set to the wrapping application.
+    """
+    module_name, _, attribute_path = spec.partition(':')
+    if not module_name or not attribute_path:
+        raise ValueError('Application must be given as "module:attribute", got "%s".' % spec)
+
+    application = importlib.import_module(module_name)
+    for attribute in attribute_path.split('.'):
+        application = getattr(application, attribute)
+
+    if isinstance(application, JSONPRCCollection) and not callable(application):
+        from .wsgiapplication import JSONPRCWSGIApplication
+        serializer = getattr(application, 'data_serializer', None)
+        if serializer is None:
+            wsgi_application = JSONPRCWSGIApplication()
+        else:
+            wsgi_application = JSONPRCWSGIApplication(serializer)
+        wsgi_application.replace(application)
+        application.served_by = wsgi_application
+        if isinstance(application, JSONPRCApplication):
+            wsgi_application.copy_settings(application)
+        if type(application) not in (JSONPRCCollection, JSONPRCApplication):
+            warnings.warn(
+                '%s is served by a JSONPRCWSGIApplication, without the methods %s overrides. '
+                'Make it a JSONPRCWSGIApplication subclass to keep them.' % (spec, type(application).__name__)
+            )
+        application = wsgi_application
+
+    return application
+
+
+class _HealthCheck(object):
+    """Answers GET requests for the health path, passes everything else to the application"""
+
+    def __init__(self, application, path, worker_index):
+        self.application = application
+        self.path = path
+        self.worker_index = worker_index
+        self.started = time.time()
+        self.requests = 0
+
+    def __call__(self, environ, start_response):
+        if self.path and environ.get('PATH_INFO') == self.path and environ.get('REQUEST_METHOD') == 'GET':
+            body = json.dumps({
+                'status': 'ok',
+                'pid': os.getpid(),
+                'worker': self.worker_index,
+                'uptime': time.time() - self.started,
+                'requests': self.requests
+            })
+            start_response('200 OK', [
+                ('Content-Type', 'application/json'),
+                ('Content-Length', str(len(body)))
+            ])
+            return [body]
+
+        self.requests += 1
+        return self.application(environ, start_response)
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            WSGIRequestHandler.log_message(self, format, *args)
+
+
+class _WorkerHTTPServer(WSGIServer):
+    """WSGIServer that takes over an already bound and listening socket"""
+
+    verbose = False
+
+    def __init__(self, sock, handler_class):
+        WSGIServer.__init__(self, sock.getsockname()[:2], handler_class, bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        self.server_address = sock.getsockname()[:2]
+        host, self.server_port = self.server_address
+        self.server_name = socket.getfqdn(host)
+        self.setup_environ()
+
+
+class _WorkerInfo(object):
+
+    def __init__(self, pid, index, heartbeat_fd):
+        self.pid = pid
+        self.index = index
+        self.heartbeat_fd = heartbeat_fd
+        self.started = self.last_heartbeat = time.time()
+        # sent a heartbeat, so it is serving
+        self.ready = False
+
+
+class PreforkServer(object):
+    """
+    Pre-forking HTTP server for a WSGI application. See module's docs.
+    """
+
+    # how often (seconds) workers check for stop requests and send heartbeats
+    worker_tick = 0.5
+
+    def __init__(self, application, address=('127.0.0.1', 8000), workers=None, reuse_port=None,
+                 health_path='/_health', timeout=30, graceful_timeout=30, status_file=None, verbose=False):
+        """
+        :Parameters:
+            - application: WSGI application
+            - address: (host, port) to listen on. Port 0 picks a free port.
+            - workers: number of worker processes. Defaults to number of CPUs
+            - reuse_port: have each worker listen on its own SO_REUSEPORT socket.
+                          Defaults to True where SO_REUSEPORT is available.
+            - health_path: path of the worker health endpoint. None disables it
+            - timeout: seconds without heartbeat after which worker is killed and replaced
+            - graceful_timeout: seconds workers get to finish in-flight requests on stop
+            - status_file: path of JSON file master keeps state of the workers in
+            - verbose: log every request to stderr
+        """
+        self.application = application
+        self.address = address
+        self.workers = workers or multiprocessing.cpu_count()
+        if reuse_port is None:
+            reuse_port = SO_REUSEPORT is not None
+        elif reuse_port and SO_REUSEPORT is None:
+            raise ValueError("SO_REUSEPORT is not supported on this platform.")
+        self.reuse_port = reuse_port
+        self.health_path = health_path
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.status_file = status_file
+        self.verbose = verbose
+
+        self.restarts = 0
+        self._socket = None
+        self._workers = {}
+        self._retiring = set()
+        # pids of the workers a rolling restart is yet to replace
+        self._to_replace = []
+        # (pid of the new worker, pid of the one it replaces) while the new one starts
+        self._replacement = None
+        self._signals = []
+        self._stopping = False
+        # what SIGUSR2 does in the workers, see run
+        self._reload_handler = signal.SIG_IGN
+
+    # -- master
+
+    def _bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+        sock.bind(self.address)
+        return sock
+
+    def _queue_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def run(self):
+        """Starts the workers and supervises them until SIGTERM/SIGINT"""
+
+        # With SO_REUSEPORT master's socket is only bound (not listening), so it gets
+        # no connections, but holds on to the port (and learns it when port is 0).
+        self._socket = self._bind()
+        if not self.reuse_port:
+            self._socket.listen(128)
+            self._socket.setblocking(0)
+        self.address = self._socket.getsockname()[:2]
+
+        # the workers get the SIGUSR2 handler the application installed (see `reloading`),
+        # the master passes the signal on to them
+        reload_handler = signal.getsignal(signal.SIGUSR2)
+        if reload_handler not in (signal.SIG_DFL, None):
+            self._reload_handler = reload_handler
+
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR2):
+            signal.signal(signum, self._queue_signal)
+
+        sys.stderr.write("Listening on http://%s:%d with %d workers (SO_REUSEPORT %s)\n" % (
+            self.address[0], self.address[1], self.workers, 'on' if self.reuse_port else 'off'
+        ))
+        sys.stderr.flush()
+
+        try:
+            for index in range(self.workers):
+                self._spawn_worker(index)
+
+            while not self._stopping:
+                self._handle_signals()
+                self._reap_workers()
+                self._read_heartbeats(1.0)
+                self._continue_restart()
+                self._kill_stuck_workers()
+                self._write_status()
+        finally:
+            self._stop_workers()
+            self._socket.close()
+            if self.status_file and os.path.exists(self.status_file):
+                os.remove(self.status_file)
+
+    def _handle_signals(self):
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT):
+                self._stopping = True
+            elif signum == signal.SIGHUP:
+                self._rolling_restart()
+            elif signum == signal.SIGUSR2:
+                for pid in list(self._workers):
+                    self._signal_worker(pid, signal.SIGUSR2)
+
+    def _rolling_restart(self):
+        """Replaces every current worker with a fresh one, one by one
+
+        An old worker is stopped once its replacement is serving (has sent a
+        heartbeat), and only then the next one is replaced. See _continue_restart.
+        """
+        replacing = set(self._to_replace)
+        if self._replacement is not None:
+            replacing.add(self._replacement[1])
+        for pid in sorted(self._workers):
+            if pid not in self._retiring and pid not in replacing:
+                self._to_replace.append(pid)
+        self._continue_restart()
+
+    def _continue_restart(self):
+        if self._replacement is not None:
+            new_pid, old_pid = self._replacement
+            info = self._workers.get(new_pid)
+            if info is not None and not info.ready:
+                return
+            # serving - or it died, and _reap_workers started another one in its place
+            self._replacement = None
+            if old_pid in self._workers:
+                self._retiring.add(old_pid)
+                self._signal_worker(old_pid, signal.SIGTERM)
+
+        while self._to_replace:
+            old_pid = self._to_replace.pop(0)
+            info = self._workers.get(old_pid)
+            if info is None or old_pid in self._retiring:
+                # died meanwhile, and was replaced then
+                continue
+            self._replacement = (self._spawn_worker(info.index), old_pid)
+            return
+
+    def _spawn_worker(self, index):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                os.close(read_fd)
+                for info in self._workers.values():
+                    os.close(info.heartbeat_fd)
+                self._run_worker(index, write_fd)
+                exit_code = 0
+            except Exception:
+                traceback.print_exc()
+            finally:
+                os._exit(exit_code)
+
+        os.close(write_fd)
+        self._workers[pid] = _WorkerInfo(pid, index, read_fd)
+        return pid
+
+    def _signal_worker(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as ex:
+            if ex.errno != errno.ESRCH:
+                raise
+
+    def _reap_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as ex:
+                if ex.errno == errno.ECHILD:
+                    return
+                raise
+            if not pid:
+                return
+
+            info = self._workers.pop(pid, None)
+            if info is None:
+                continue
+            os.close(info.heartbeat_fd)
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+            elif self._replacement is not None and pid == self._replacement[1]:
+                # its replacement is starting already
+                self._replacement = None
+            elif not self._stopping:
+                self.restarts += 1
+                self._spawn_worker(info.index)
+
+    def _read_heartbeats(self, timeout):
+        fds = dict((info.heartbeat_fd, info) for info in self._workers.values())
+        try:
+            readable, _, _ = select.select(fds.keys(), [], [], timeout)
+        except select.error as ex:
+            if ex.args[0] == errno.EINTR:
+                return
+            raise
+        now = time.time()
+        for fd in readable:
+            try:
+                os.read(fd, 4096)
+            except OSError:
+                continue
+            fds[fd].last_heartbeat = now
+            fds[fd].ready = True
+
+    def _kill_stuck_workers(self):
+        deadline = time.time() - self.timeout
+        for info in self._workers.values():
+            if info.last_heartbeat < deadline:
+                sys.stderr.write("Worker %d (pid %d) is stuck, killing it.\n" % (info.index, info.pid))
+                self._signal_worker(info.pid, signal.SIGKILL)
+
+    def _stop_workers(self):
+        for pid in self._workers.keys():
+            self._signal_worker(pid, signal.SIGTERM)
+
+        deadline = time.time() + self.graceful_timeout
+        while self._workers and time.time() < deadline:
+            self._reap_workers()
+            time.sleep(0.05)
+
+        for pid in self._workers.keys():
+            self._signal_worker(pid, signal.SIGKILL)
+        while self._workers:
+            self._reap_workers()
+            time.sleep(0.05)
+
+    def status(self):
+        """
+        :return: dict describing the master and its workers
+        """
+        now = time.time()
+        return {
+            'pid': os.getpid(),
+            'address': '%s:%d' % self.address,
+            'restarts': self.restarts,
+            'workers': sorted([
+                {
+                    'pid': info.pid,
+                    'index': info.index,
+                    'uptime': now - info.started,
+                    'since_heartbeat': now - info.last_heartbeat,
+                    'retiring': info.pid in self._retiring
+                }
+                for info in self._workers.values()
+            ], key=lambda worker: (worker['index'], worker['pid']))
+        }
+
+    def _write_status(self):
+        if not self.status_file:
+            return
+        temp_name = self.status_file + '.tmp'
+        with open(temp_name, 'w') as status_file:
+            json.dump(self.status(), status_file)
+        os.rename(temp_name, self.status_file)
+
+    # -- worker
+
+    def _run_worker(self, index, heartbeat_fd):
+        running = [True]
+
+        def stop(signum, frame):
+            running[0] = False
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR2, self._reload_handler)
+
+        flags = fcntl.fcntl(heartbeat_fd, fcntl.F_GETFL)
+        fcntl.fcntl(heartbeat_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        if self.reuse_port:
+            sock = self._bind()
+            sock.listen(128)
+            sock.setblocking(0)
+            self._socket.close()
+        else:
+            sock = self._socket
+
+        server = _WorkerHTTPServer(sock, _QuietRequestHandler)
+        server.verbose = self.verbose
+        server.set_app(_HealthCheck(self.application, self.health_path, index))
+        server.timeout = self.worker_tick
+
+        while running[0]:
+            try:
+                server.handle_request()
+            except select.error as ex:
+                if ex.args[0] != errno.EINTR:
+                    raise
+            try:
+                os.write(heartbeat_fd, '.')
+            except OSError as ex:
+                if ex.errno != errno.EAGAIN:
+                    raise
+
+        sock.close()
+        # notifications the application runs in the background get done too
+        drain_notifications = getattr(self.application, 'drain_notifications', None)
+        if drain_notifications is not None:
+            drain_notifications(self.graceful_timeout)
+
+
+def _parse_address(value):
+    host, _, port = value.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError('Expected HOST:PORT, got "%s".' % value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m jsonrpcparts.serve',
+        description='Pre-forking HTTP server for JSON-RPC (WSGI) applications.'
+    )
+    parser.add_argument('application', help='application to serve, as "package.module:attribute"')
+    parser.add_argument('--bind', type=_parse_address, default=('127.0.0.1', 8000), metavar='HOST:PORT',
+                        help='address to listen on (default 127.0.0.1:8000)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--no-reuse-port', dest='reuse_port', action='store_const', const=False, default=None,
+                        help='share one listening socket instead of SO_REUSEPORT sockets')
+    parser.add_argument('--health-path', default='/_health', help='path of worker health endpoint (default /_health)')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds before a stuck worker is replaced')
+    parser.add_argument('--graceful-timeout', type=float, default=30, help='seconds workers get to finish on stop')
+    parser.add_argument('--status-file', default=None, help='file to keep JSON state of the workers in')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    options = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    application = load_application(options.application)
+
+    PreforkServer(
+        application,
+        options.bind,
+        workers=options.workers,
+        reuse_port=options.reuse_port,
+        health_path=options.health_path,
+        timeout=options.timeout,
+        graceful_timeout=options.graceful_timeout,
+        status_file=options.status_file,
+        verbose=options.verbose
+    ).run()
+
+
+if __name__ == '__main__':
+    main()
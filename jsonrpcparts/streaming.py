@@ -0,0 +1,267 @@
+"""
+HTTP adds a lot of per-call overhead (connection setup, headers, parsing
+of those) that high-frequency callers do not need. JSON-RPC itself does not
+care how the messages travel.
+
+This module contains code that carries many JSON-RPC messages, one after
+another, over one persistent stream - a TCP socket, a Unix domain socket,
+stdin/stdout of a process. Messages are cut out of the stream by a "framing":
+
+- NewlineFraming - one message per line (NDJSON). Good for JSON text.
+- LengthPrefixedFraming - each message is preceded by its length. Works
+  for any encoding, including binary ones.
+
+Server side hands every message to `JSONPRCApplication.handle_request_string`
+and writes the responses back in order. Client side is `StreamClient`.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import socket
+import SocketServer
+import struct
+import sys
+import threading
+
+from .client import RemoteClient
+from .serializers import JSONRPC20Serializer
+
+
+class FramingError(IOError):
+    """The stream does not carry properly framed messages (or broke off mid-message)"""
+
+
+class NewlineFraming(object):
+    """
+    Messages separated by newlines (NDJSON). Blank lines are skipped.
+
+    Compact JSON never contains raw newlines, encodings that may
+    (binary ones, indented JSON) need LengthPrefixedFraming instead.
+    """
+
+    # longest message (in bytes) we agree to read
+    max_message_size = 16 * 1024 * 1024
+
+    def __init__(self, rfile, wfile):
+        """
+        :Parameters:
+            - rfile: file-like object messages are read from
+            - wfile: file-like object messages are written to
+        """
+        self.rfile = rfile
+        self.wfile = wfile
+
+    def read_message(self):
+        """
+        :return: next message (str) or None when the stream is closed
+        :Raises: FramingError
+        """
+        while True:
+            line = self.rfile.readline(self.max_message_size + 1)
+            if not line:
+                return None
+            if len(line) > self.max_message_size and not line.endswith('\n'):
+                raise FramingError("Message is longer than %d bytes." % self.max_message_size)
+            line = line.rstrip('\r\n')
+            if line:
+                return line
+
+    def write_message(self, message):
+        self.wfile.write(message + '\n')
+        self.wfile.flush()
+
+    def close(self):
+        """Releases resources the framing holds besides the files. Files are not closed."""
+
+
+class LengthPrefixedFraming(NewlineFraming):
+    """
+    Each message is preceded by its length (in bytes) as 4-byte big-endian unsigned integer.
+    """
+
+    _header = struct.Struct('>I')
+    # bits of the header that carry the length. Subclasses may use the rest as flags
+    _size_mask = 0xFFFFFFFF
+
+    def _read_exactly(self, size):
+        data = self.rfile.read(size)
+        while data and len(data) < size:
+            chunk = self.rfile.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def _read_frame(self):
+        """
+        :return: (header flags, message) or (None, None) when the stream is closed
+        """
+        header = self._read_exactly(self._header.size)
+        if not header:
+            return None, None
+        if len(header) < self._header.size:
+            raise FramingError("Stream ended in the middle of the message header.")
+
+        value, = self._header.unpack(header)
+        size = value & self._size_mask
+        if size > self.max_message_size:
+            raise FramingError("Message is longer than %d bytes." % self.max_message_size)
+
+        message = self._read_exactly(size)
+        if len(message) < size:
+            raise FramingError("Stream ended in the middle of the message.")
+        return value & ~self._size_mask, message
+
+    def _write_frame(self, flags, message):
+        self.wfile.write(self._header.pack(flags | len(message)) + message)
+        self.wfile.flush()
+
+    def read_message(self):
+        return self._read_frame()[1]
+
+    def write_message(self, message):
+        self._write_frame(0, message)
+
+
+def handle_stream(application, rfile, wfile, framing=NewlineFraming, **context):
+    """
+    Reads request messages from rfile until it is closed and
+    writes responses to wfile, in order of the requests.
+
+    Messages that are only notifications get no response.
+
+    :param application: JSONPRCApplication instance
+    :param framing: a framing class (NewlineFraming, LengthPrefixedFraming)
+    :param context: passed to handle_request_string with every message
+    :Raises: FramingError when the stream is broken. There is no way to find
+        the next message boundary after that, so the stream has to be dropped.
+    """
+    stream = framing(rfile, wfile)
+    read_message = stream.read_message
+    write_message = stream.write_message
+    handle_request_string = application.handle_request_string
+
+    try:
+        while True:
+            message = read_message()
+            if message is None:
+                return
+            response = handle_request_string(message, **context)
+            if response is not None:
+                write_message(response)
+    finally:
+        stream.close()
+
+
+def serve_stdio(application, framing=NewlineFraming, **context):
+    """Serves JSON-RPC over stdin/stdout of this process, until stdin is closed.
+
+    Nothing else may write to stdout while this runs.
+    """
+    handle_stream(application, sys.stdin, sys.stdout, framing, **context)
+
+
+class _StreamRequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            handle_stream(
+                self.server.rpc_application,
+                self.rfile,
+                self.wfile,
+                self.server.framing
+            )
+        except (FramingError, socket.error):
+            # nothing to respond to. Connection is closed by `finish`
+            pass
+
+
+class TCPStreamServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """Serves each TCP connection in its own thread"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class UnixStreamServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Serves each Unix domain socket connection in its own thread"""
+    daemon_threads = True
+
+
+def make_server(application, address, framing=NewlineFraming):
+    """
+    Creates (bound and listening) server that serves the application over
+    persistent connections. Run it with `serve_forever()`.
+
+    :param application: JSONPRCApplication instance
+    :param address: (host, port) tuple for TCP or a file system path for Unix domain socket
+    :param framing: a framing class (NewlineFraming, LengthPrefixedFraming)
+    """
+    if isinstance(address, basestring):
+        server = UnixStreamServer(address, _StreamRequestHandler)
+    else:
+        server = TCPStreamServer(address, _StreamRequestHandler)
+    server.rpc_application = application
+    server.framing = framing
+    return server
+
+
+class StreamClient(RemoteClient):
+    """
+    Client that sends the requests over a persistent stream and reads
+    the responses from it. Instances can be shared between threads,
+    calls are done one at a time.
+    """
+
+    def __init__(self, rfile, wfile, framing=NewlineFraming, data_serializer=JSONRPC20Serializer):
+        """
+        :Parameters:
+            - rfile: file-like object responses are read from
+            - wfile: file-like object requests are written to
+            - framing: a framing class (NewlineFraming, LengthPrefixedFraming)
+            - data_serializer: a data_structure+serializer-instance
+        """
+        super(StreamClient, self).__init__(data_serializer)
+        self._stream = framing(rfile, wfile)
+        self._lock = threading.Lock()
+        self._socket = None
+
+    @classmethod
+    def from_socket(cls, sock, framing=NewlineFraming, data_serializer=JSONRPC20Serializer):
+        """Creates client talking over a connected socket. `close` closes the socket."""
+        client = cls(sock.makefile('rb', -1), sock.makefile('wb', -1), framing, data_serializer)
+        client._socket = sock
+        return client
+
+    @classmethod
+    def connect(cls, address, framing=NewlineFraming, data_serializer=JSONRPC20Serializer, timeout=None):
+        """Connects to a server made by `make_server`
+
+        :param address: (host, port) tuple for TCP or a file system path for Unix domain socket
+        """
+        if isinstance(address, basestring):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(address)
+        else:
+            sock = socket.create_connection(address, timeout)
+        return cls.from_socket(sock, framing, data_serializer)
+
+    def close(self):
+        self._stream.close()
+        self._stream.rfile.close()
+        self._stream.wfile.close()
+        if self._socket is not None:
+            self._socket.close()
+
+    def _communicate(self, request_json, expect_response):
+        return self._communicate_batch(self._data_serializer.dumps(request_json), expect_response)
+
+    def _communicate_batch(self, message, expect_response, request_ids=()):
+        with self._lock:
+            self._stream.write_message(message)
+            if not expect_response:
+                return None
+            response = self._stream.read_message()
+
+        if response is None:
+            raise FramingError("Connection was closed before the response arrived.")
+        return self._data_serializer.loads(response)
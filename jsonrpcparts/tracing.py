@@ -0,0 +1,251 @@
+"""
+Distributed tracing of JSON-RPC requests: where the time of a request
+goes, across the client, the server and the services they call.
+
+The trace context travels in W3C Trace Context `traceparent` header, so
+the spans join traces of other (OpenTelemetry instrumented) services.
+Spans follow OpenTelemetry conventions for RPC (kinds, `rpc.*` attributes)
+and are handed to an exporter with OpenTelemetry's SpanExporter interface
+(`export(spans)`, `shutdown()`). Write one that forwards them to your
+collector, or use InMemorySpanExporter in tests::
+
+    tracer = Tracer(InMemorySpanExporter())
+
+    application = JSONPRCWSGIApplication()
+    application.set_tracer(tracer)  # spans: request > parse, calls, serialize
+
+    client = WebClient('http://example.com/rpc')
+    client.tracer = tracer          # spans of the calls, traceparent header
+
+Tracing is off by default and costs nothing then.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import contextlib
+import os
+import random
+import re
+import threading
+import time
+
+_TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$')
+_INVALID_TRACE_ID = '0' * 32
+_INVALID_SPAN_ID = '0' * 16
+_SAMPLED = 0x01
+
+
+def parse_traceparent(value):
+    """Parses value of `traceparent` header
+
+    :return: (trace_id, span_id, sampled) or None if the value is missing or invalid
+    """
+    match = _TRACEPARENT.match((value or '').strip())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags, rest = match.groups()
+    if version == 'ff' or (version == '00' and rest):
+        return None
+    if trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & _SAMPLED)
+
+
+def format_traceparent(trace_id, span_id, sampled):
+    """:return: value of `traceparent` header"""
+    return '00-%s-%s-%02x' % (trace_id, span_id, _SAMPLED if sampled else 0)
+
+
+class Span(object):
+    """
+    One timed operation of a trace.
+
+    Use as context manager - the span is the current one (the parent of
+    spans started in the block) until the block ends, and then ends itself.
+    An exception leaving the block marks the span as failed.
+
+    :Variables:
+        - name, kind: what the span is about. kind is one of INTERNAL, SERVER, CLIENT
+        - trace_id, span_id: hex ids of the trace and the span
+        - parent_id: hex id of the parent span, or None for the root of the trace
+        - sampled: whether the span gets exported
+        - start_time, end_time: times (time.time()) of start and end of the span
+        - attributes: dict of OpenTelemetry-style attributes
+        - status: OK, or ERROR (with `status_message`) when the operation failed
+    """
+    __slots__ = ('_tracer', 'name', 'kind', 'trace_id', 'span_id', 'parent_id', 'sampled',
+                 'start_time', 'end_time', 'attributes', 'status', 'status_message', '_previous')
+
+    INTERNAL = 'internal'
+    SERVER = 'server'
+    CLIENT = 'client'
+
+    OK = 'ok'
+    ERROR = 'error'
+
+    def __init__(self, tracer, name, kind, trace_id, span_id, parent_id, sampled, attributes=None):
+        self._tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_time = tracer.clock()
+        self.end_time = None
+        self.attributes = attributes or {}
+        self.status = self.OK
+        self.status_message = None
+        self._previous = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        """Marks the span as failed because of the exception"""
+        self.status = self.ERROR
+        self.status_message = str(error)
+        self.attributes['exception.type'] = error.__class__.__name__
+        error_code = getattr(error, 'error_code', None)
+        if error_code is not None:
+            self.attributes['rpc.jsonrpc.error_code'] = error_code
+
+    def traceparent(self):
+        """:return: `traceparent` header value that makes this span the parent of the receiver's"""
+        return format_traceparent(self.trace_id, self.span_id, self.sampled)
+
+    def end(self):
+        """Ends the span (once), handing it to the exporter if it is sampled"""
+        if self.end_time is None:
+            self.end_time = self._tracer.clock()
+            self._tracer._finish(self)
+
+    @property
+    def duration(self):
+        """:return: seconds the span took, or None while it runs"""
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def __enter__(self):
+        local = self._tracer._local
+        self._previous = getattr(local, 'span', None)
+        local.span = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_value is not None:
+            self.record_error(exc_value)
+        self._tracer._local.span = self._previous
+        self._previous = None
+        self.end()
+
+    def __repr__(self):
+        return '<Span %r %s/%s parent=%s>' % (self.name, self.trace_id, self.span_id, self.parent_id)
+
+
+class Tracer(object):
+    """
+    Starts spans, keeps the current span of each thread and passes the
+    finished ones to the exporter.
+    """
+
+    def __init__(self, exporter, sample_rate=1.0, clock=time.time):
+        """
+        :Parameters:
+            - exporter: gets the finished sampled spans, see InMemorySpanExporter
+            - sample_rate: part (0 to 1) of the traces started here that get
+                sampled. Traces continued from a `traceparent` keep its decision.
+            - clock: function returning current time in seconds
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.clock = clock
+        self._local = threading.local()
+
+    def current_span(self):
+        """:return: the span of the innermost `with span:` block of this thread, or None"""
+        return getattr(self._local, 'span', None)
+
+    def start_span(self, name, kind=Span.INTERNAL, parent=None, traceparent=None, attributes=None):
+        """Starts a span. Use it as context manager, or call its `end` when done.
+
+        :Parameters:
+            - name: name of the operation
+            - kind: Span.INTERNAL, SERVER or CLIENT
+            - parent: parent Span. Defaults to the one parsed out of
+                `traceparent`, then to the current span.
+            - traceparent: value of `traceparent` header of the incoming request
+            - attributes: dict of attributes of the span
+        """
+        # from os.urandom, not `random` - forked workers would share its state, and make same ids
+        span_id = os.urandom(8).encode('hex')
+        if parent is None and traceparent is not None:
+            parsed = parse_traceparent(traceparent)
+            if parsed is not None:
+                trace_id, parent_id, sampled = parsed
+                return Span(self, name, kind, trace_id, span_id, parent_id, sampled, attributes)
+        if parent is None:
+            parent = self.current_span()
+        if parent is None:
+            sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+            return Span(self, name, kind, os.urandom(16).encode('hex'), span_id, None, sampled, attributes)
+        return Span(self, name, kind, parent.trace_id, span_id, parent.span_id, parent.sampled, attributes)
+
+    @contextlib.contextmanager
+    def use_span(self, span):
+        """Makes the span the current one of this thread until the block ends, without ending it.
+        For work done for the span's operation in another thread, so its spans join the trace.
+        """
+        local = self._local
+        previous = getattr(local, 'span', None)
+        local.span = span
+        try:
+            yield span
+        finally:
+            local.span = previous
+
+    def inject(self, headers, span=None):
+        """Puts `traceparent` of the span (default: the current one) into the dict of headers"""
+        span = span or self.current_span()
+        if span is not None:
+            headers['traceparent'] = span.traceparent()
+
+    def trace_call(self, call_next, name, method, args, kwargs, request_id, context):
+        """Call middleware (see JSONPRCApplication.add_call_middleware) making a span of every call"""
+        with self.start_span(name, attributes={
+            'rpc.system': 'jsonrpc',
+            'rpc.method': name,
+            'rpc.jsonrpc.request_id': request_id
+        }):
+            return call_next(name, method, args, kwargs, request_id, context)
+
+    def _finish(self, span):
+        if span.sampled:
+            self.exporter.export([span])
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+
+class InMemorySpanExporter(object):
+    """Keeps the finished spans in a list, for tests"""
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self):
+        """:return: list of the spans exported so far, in the order they ended"""
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            del self._spans[:]
+
+    def shutdown(self):
+        pass
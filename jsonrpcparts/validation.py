@@ -0,0 +1,427 @@
+"""
+JSON-RPC methods often want to know their params are sane before doing
+any work. This module turns a (subset of) JSON Schema describing the params
+into a plain Python function that checks them.
+
+The schema is compiled once - into source code specialized for it, which is
+then exec'd - so checking params of a call costs about as much as the
+handwritten `isinstance` checks would.
+
+Supported keywords:
+
+- type ("null", "boolean", "integer", "number", "string", "array", "object" or a list of those)
+- enum
+- minimum, maximum, exclusiveMinimum, exclusiveMaximum (numbers, as in draft 6)
+- minLength, maxLength, pattern
+- items (one schema for all items), minItems, maxItems
+- properties, required, additionalProperties (False or a schema)
+- title, description, default, $schema (ignored)
+
+Python 2 has no type annotations, so there is a short form instead.
+Python types stand for the schema of the matching JSON type:
+
+    @params_schema(a=int, b={'type': 'string', 'maxLength': 10})
+    def method(a, b=''):
+        ...
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import re
+
+_TYPE_CHECKS = {
+    'null': 'value.__class__ is NoneType',
+    'boolean': 'value.__class__ is bool',
+    'integer': 'value.__class__ in INTEGER',
+    'number': 'value.__class__ in NUMBER',
+    'string': 'value.__class__ in STRING',
+    'array': 'value.__class__ in ARRAY',
+    'object': 'value.__class__ in OBJECT'
+}
+
+_TYPE_NAMES = {
+    type(None): 'null',
+    bool: 'boolean',
+    int: 'integer',
+    long: 'integer',
+    float: 'number',
+    str: 'string',
+    unicode: 'string',
+    list: 'array',
+    tuple: 'array',
+    dict: 'object'
+}
+
+_PYTHON_TYPES = {
+    type(None): 'null',
+    bool: 'boolean',
+    int: 'integer',
+    long: 'integer',
+    float: 'number',
+    str: 'string',
+    unicode: 'string',
+    basestring: 'string',
+    list: 'array',
+    tuple: 'array',
+    dict: 'object'
+}
+
+_IGNORED_KEYWORDS = frozenset(['title', 'description', 'default', '$schema'])
+_KNOWN_KEYWORDS = frozenset([
+    'type', 'enum', 'minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum',
+    'minLength', 'maxLength', 'pattern', 'items', 'minItems', 'maxItems',
+    'properties', 'required', 'additionalProperties'
+]) | _IGNORED_KEYWORDS
+
+_SCALAR_TYPES = frozenset(['null', 'boolean', 'integer', 'number', 'string'])
+_NUMERIC_KEYWORDS = ('minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum')
+_STRING_KEYWORDS = ('minLength', 'maxLength', 'pattern')
+_ARRAY_KEYWORDS = ('items', 'minItems', 'maxItems')
+_OBJECT_KEYWORDS = ('properties', 'required', 'additionalProperties')
+
+
+class ValidationError(ValueError):
+    """
+    Params do not match the schema.
+
+    :Variables:
+        - path: where in the params the problem is. Like "params.items[2].name"
+        - keyword: the schema keyword that failed
+        - data: dict with the above, fit for JSON-RPC error's `data`
+    """
+
+    def __init__(self, path, keyword, message):
+        ValueError.__init__(self, '%s: %s' % (path, message))
+        self.path = path
+        self.keyword = keyword
+        self.data = {'path': path, 'keyword': keyword, 'message': message}
+
+
+def _type_name(value):
+    return _TYPE_NAMES.get(value.__class__, value.__class__.__name__)
+
+
+def _fail(path, keyword, message):
+    raise ValidationError(path, keyword, message)
+
+
+def normalize_schema(schema):
+    """Turns the short form (Python types) into JSON Schema"""
+    if isinstance(schema, type):
+        if schema not in _PYTHON_TYPES:
+            raise ValueError("%s has no JSON Schema equivalent." % schema.__name__)
+        return {'type': _PYTHON_TYPES[schema]}
+    if isinstance(schema, (list, tuple)) and all(isinstance(item, type) for item in schema):
+        return {'type': sorted(set(_PYTHON_TYPES[item] for item in schema))}
+    if not isinstance(schema, dict):
+        raise ValueError("Schema must be a dict or a Python type, got %r." % (schema,))
+
+    schema = dict(schema)
+    if 'items' in schema:
+        schema['items'] = normalize_schema(schema['items'])
+    if 'properties' in schema:
+        schema['properties'] = dict(
+            (name, normalize_schema(subschema))
+            for name, subschema in schema['properties'].items()
+        )
+    if isinstance(schema.get('additionalProperties'), (dict, type)):
+        schema['additionalProperties'] = normalize_schema(schema['additionalProperties'])
+    return schema
+
+
+class _Compiler(object):
+    """Generates source code of a validator for a schema"""
+
+    def __init__(self):
+        self.lines = []
+        self.namespace = {
+            'NoneType': type(None),
+            'INTEGER': frozenset([int, long]),
+            'NUMBER': frozenset([int, long, float]),
+            'STRING': frozenset([str, unicode]),
+            'ARRAY': frozenset([list, tuple]),
+            'OBJECT': frozenset([dict]),
+            'fail': _fail,
+            'type_name': _type_name
+        }
+        self._names = 0
+
+    def name(self, prefix):
+        self._names += 1
+        return '%s%d' % (prefix, self._names)
+
+    def constant(self, value, prefix='c'):
+        name = self.name(prefix)
+        self.namespace[name] = value
+        return name
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def compile(self, schema, variable, path, indent):
+        """
+        Emits checks of `variable` against the schema.
+
+        :param path: Python expression that evaluates to the path of the
+            variable. Only evaluated when reporting an error.
+        """
+        unknown = set(schema) - _KNOWN_KEYWORDS
+        if unknown:
+            raise ValueError("Unsupported schema keywords: %s" % ', '.join(sorted(unknown)))
+
+        start = len(self.lines)
+        types = schema.get('type')
+        if isinstance(types, basestring):
+            types = [types]
+        if types is not None:
+            for type_name in types:
+                if type_name not in _TYPE_CHECKS:
+                    raise ValueError('Unsupported schema type "%s".' % type_name)
+            check = ' or '.join(_TYPE_CHECKS[type_name] for type_name in types).replace('value', variable)
+            self.emit(indent, 'if not (%s):' % check)
+            self.emit(indent + 1, 'fail(%s, "type", "expected %s, got %%s" %% type_name(%s))' % (
+                path, ' or '.join(types), variable
+            ))
+
+        if 'enum' in schema:
+            choices = list(schema['enum'])
+            try:
+                membership = '%s not in %s' % (variable, self.constant(frozenset(choices), 'enum'))
+            except TypeError:
+                # lists and dicts among the choices are not hashable
+                membership = '%s not in %s' % (variable, self.constant(choices, 'enum'))
+            else:
+                if types is None or not set(types) <= _SCALAR_TYPES:
+                    # and neither are lists and dicts among the values
+                    membership = '%s.__class__ in ARRAY or %s.__class__ in OBJECT or %s' % (
+                        variable, variable, membership
+                    )
+            self.emit(indent, 'if %s:' % membership)
+            self.emit(indent + 1, 'fail(%s, "enum", %r)' % (path, 'must be one of %r' % (choices,)))
+
+        self._compile_numeric(schema, types, variable, path, indent)
+        self._compile_string(schema, types, variable, path, indent)
+        self._compile_array(schema, types, variable, path, indent)
+        self._compile_object(schema, types, variable, path, indent)
+
+        if len(self.lines) == start:
+            self.emit(indent, 'pass')
+
+    def _guard(self, schema, types, json_type, keywords, variable, indent):
+        """
+        Keywords of, say, strings apply only to strings. When the schema
+        does not pin the type, checks have to be guarded by a type test.
+
+        :return: indent for the checks, or None when there is nothing to check
+        """
+        if not any(keyword in schema for keyword in keywords):
+            return None
+        if types is not None:
+            if json_type not in types and not (json_type == 'number' and 'integer' in types):
+                return None
+            if len(types) == 1:
+                return indent
+        self.emit(indent, 'if %s:' % _TYPE_CHECKS[json_type].replace('value', variable))
+        return indent + 1
+
+    def _compile_numeric(self, schema, types, variable, path, indent):
+        indent = self._guard(schema, types, 'number', _NUMERIC_KEYWORDS, variable, indent)
+        if indent is None:
+            return
+        for keyword, operator, words in (
+            ('minimum', '<', 'must be >= %r'),
+            ('maximum', '>', 'must be <= %r'),
+            ('exclusiveMinimum', '<=', 'must be > %r'),
+            ('exclusiveMaximum', '>=', 'must be < %r')
+        ):
+            if keyword in schema:
+                limit = schema[keyword]
+                if not isinstance(limit, (int, long, float)) or isinstance(limit, bool):
+                    raise ValueError('"%s" must be a number.' % keyword)
+                self.emit(indent, 'if %s %s %r:' % (variable, operator, limit))
+                self.emit(indent + 1, 'fail(%s, "%s", "%s")' % (path, keyword, words % limit))
+
+    def _compile_string(self, schema, types, variable, path, indent):
+        indent = self._guard(schema, types, 'string', _STRING_KEYWORDS, variable, indent)
+        if indent is None:
+            return
+        if 'minLength' in schema:
+            self.emit(indent, 'if len(%s) < %d:' % (variable, schema['minLength']))
+            self.emit(indent + 1, 'fail(%s, "minLength", "must be at least %d characters long")' % (
+                path, schema['minLength']
+            ))
+        if 'maxLength' in schema:
+            self.emit(indent, 'if len(%s) > %d:' % (variable, schema['maxLength']))
+            self.emit(indent + 1, 'fail(%s, "maxLength", "must be at most %d characters long")' % (
+                path, schema['maxLength']
+            ))
+        if 'pattern' in schema:
+            pattern = self.constant(re.compile(schema['pattern']).search, 'pattern')
+            self.emit(indent, 'if %s(%s) is None:' % (pattern, variable))
+            self.emit(indent + 1, 'fail(%s, "pattern", %s)' % (
+                path, repr('must match %s' % schema['pattern'])
+            ))
+
+    def _compile_array(self, schema, types, variable, path, indent):
+        indent = self._guard(schema, types, 'array', _ARRAY_KEYWORDS, variable, indent)
+        if indent is None:
+            return
+        if 'minItems' in schema:
+            self.emit(indent, 'if len(%s) < %d:' % (variable, schema['minItems']))
+            self.emit(indent + 1, 'fail(%s, "minItems", "must have at least %d items")' % (
+                path, schema['minItems']
+            ))
+        if 'maxItems' in schema:
+            self.emit(indent, 'if len(%s) > %d:' % (variable, schema['maxItems']))
+            self.emit(indent + 1, 'fail(%s, "maxItems", "must have at most %d items")' % (
+                path, schema['maxItems']
+            ))
+        if 'items' in schema:
+            index = self.name('index')
+            item = self.name('item')
+            self.emit(indent, 'for %s, %s in enumerate(%s):' % (index, item, variable))
+            self.compile(schema['items'], item, '%s + "[%%d]" %% %s' % (path, index), indent + 1)
+
+    def _compile_object(self, schema, types, variable, path, indent):
+        indent = self._guard(schema, types, 'object', _OBJECT_KEYWORDS, variable, indent)
+        if indent is None:
+            return
+        properties = schema.get('properties', {})
+        required = schema.get('required', [])
+
+        for name in required:
+            self.emit(indent, 'if %r not in %s:' % (name, variable))
+            self.emit(indent + 1, 'fail(%s, "required", %s)' % (path, repr('"%s" is required' % name)))
+
+        for name in sorted(properties):
+            item = self.name('item')
+            property_path = '%s + %r' % (path, '.' + name)
+            if name in required:
+                self.emit(indent, '%s = %s[%r]' % (item, variable, name))
+                self.compile(properties[name], item, property_path, indent)
+            else:
+                self.emit(indent, 'if %r in %s:' % (name, variable))
+                self.emit(indent + 1, '%s = %s[%r]' % (item, variable, name))
+                self.compile(properties[name], item, property_path, indent + 1)
+
+        additional = schema.get('additionalProperties', True)
+        if additional is False:
+            allowed = self.constant(frozenset(properties), 'allowed')
+            self.emit(indent, 'if not %s.issuperset(%s):' % (allowed, variable))
+            self.emit(indent + 1, 'fail(%s, "additionalProperties", "unexpected %%s" %% ", ".join(sorted(set(%s) - %s)))' % (
+                path, variable, allowed
+            ))
+        elif isinstance(additional, dict):
+            key = self.name('key')
+            item = self.name('item')
+            known = self.constant(frozenset(properties), 'known')
+            self.emit(indent, 'for %s, %s in %s.iteritems():' % (key, item, variable))
+            self.emit(indent + 1, 'if %s not in %s:' % (key, known))
+            self.compile(additional, item, '%s + "." + %s' % (path, key), indent + 2)
+
+
+def compile_schema(schema, path='params'):
+    """
+    Compiles the schema into a validator function.
+
+    :param schema: JSON Schema (dict) or the short form (see normalize_schema)
+    :param path: name of the validated value in error paths
+    :return: function(value) that returns None when value matches the schema
+        and raises ValidationError otherwise
+    :Raises: ValueError when the schema uses something not supported
+    """
+    schema = normalize_schema(schema)
+    compiler = _Compiler()
+    compiler.emit(0, 'def validate(value):')
+    compiler.compile(schema, 'value', repr(path), 1)
+    source = '\n'.join(compiler.lines) + '\n'
+
+    namespace = compiler.namespace
+    exec compile(source, '<schema validator>', 'exec') in namespace
+    validate = namespace['validate']
+    validate.source = source
+    return validate
+
+
+def compile_params_validator(schema, argument_names=None):
+    """
+    Compiles a validator for JSON-RPC `params`.
+
+    Object schemas describe named params. When the method's argument names
+    are known, positional params are checked as if they were passed by name.
+    Array schemas describe positional params.
+
+    :param schema: JSON Schema (dict) or the short form (see normalize_schema)
+    :param argument_names: names of the method's arguments, in order
+    :return: function(params) that raises ValidationError when params do not match
+    """
+    schema = normalize_schema(schema)
+    types = schema.get('type')
+    if isinstance(types, basestring):
+        types = [types]
+
+    validate = compile_schema(schema)
+
+    if types == ['object'] or (types is None and 'properties' in schema):
+        if argument_names is None:
+            def validate_params(params):
+                if params is None:
+                    params = {}
+                elif params.__class__ is not dict:
+                    _fail('params', 'type', 'named params are expected')
+                validate(params)
+        else:
+            argument_names = tuple(argument_names)
+            argument_count = len(argument_names)
+
+            def validate_params(params):
+                if params is None:
+                    params = {}
+                elif params.__class__ is not dict:
+                    if len(params) > argument_count:
+                        _fail('params', 'maxItems', 'takes at most %d params' % argument_count)
+                    params = dict(zip(argument_names, params))
+                validate(params)
+
+    elif types == ['array']:
+        def validate_params(params):
+            if params is None:
+                params = []
+            elif params.__class__ is dict:
+                _fail('params', 'type', 'positional params are expected')
+            validate(params)
+
+    else:
+        raise ValueError('Params schema must be of "object" or "array" type.')
+
+    validate_params.source = validate.source
+    return validate_params
+
+
+def params_schema(schema=None, **properties):
+    """
+    Attaches params schema to a JSON-RPC method. `register_function` picks it up.
+
+    Either pass a whole schema::
+
+        @params_schema({'type': 'array', 'items': {'type': 'integer'}})
+        def add(*numbers):
+
+    or schemas of the named arguments (all of them required)::
+
+        @params_schema(a=int, b=int)
+        def add(a, b):
+    """
+    if schema is None:
+        schema = {
+            'type': 'object',
+            'properties': properties,
+            'required': sorted(properties),
+            'additionalProperties': False
+        }
+    elif properties:
+        raise ValueError("Pass either a schema or argument schemas, not both.")
+
+    def decorator(function):
+        function.params_schema = schema
+        return function
+    return decorator
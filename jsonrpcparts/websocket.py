@@ -0,0 +1,680 @@
+"""
+JSON-RPC v.2.0 matches responses to requests by `id`, so nothing requires
+the responses to come back in the order of the requests, or a client to
+wait for one response before sending the next request. Over a WebSocket
+one connection can keep many calls in flight, get each response as soon
+as it is ready, and also receive notifications pushed by the server.
+
+This module contains WebSocket (RFC 6455) server and client for JSON-RPC.
+Server hands each incoming message to a pool of worker threads and sends
+responses back as they are produced. Client (`WebSocketClient`) reads
+responses in a background thread and routes them to the waiting callers
+by `id`. Error responses without `id` (the server could not parse the
+request, or could not serialize the response) can not be routed by it -
+they fail the calls (and batches) waiting at the time, as no one can tell
+whose they are.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import Queue
+import socket
+import SocketServer
+import struct
+import threading
+import urlparse
+
+from .client import RemoteClient
+from .serializers import JSONRPC20Serializer
+from .streaming import FramingError, TCPStreamServer
+from .workers import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class HandshakeError(IOError):
+    """Opening handshake failed, the connection is not a WebSocket"""
+
+
+class ResponseTimeout(Exception):
+    """Response did not arrive within the allotted time"""
+
+
+def _accept_key(key):
+    return base64.b64encode(hashlib.sha1(key + _GUID).digest())
+
+
+def _mask(data, mask):
+    """XORs data with repeated 4-byte mask (RFC 6455 masking).
+
+    Done on long integers rather than byte-by-byte to keep it out of Python loops.
+    """
+    size = len(data)
+    if not size:
+        return data
+    key = (mask * (size // 4 + 1))[:size]
+    masked = int(binascii.hexlify(data), 16) ^ int(binascii.hexlify(key), 16)
+    return binascii.unhexlify('%0*x' % (size * 2, masked))
+
+
+def _read_http_head(rfile):
+    """Reads first line and headers of HTTP message
+
+    :return: (first line, dict of headers with lower-case names)
+    """
+    first_line = rfile.readline(65537)
+    if not first_line:
+        raise HandshakeError("Connection closed during the handshake.")
+    headers = {}
+    while True:
+        line = rfile.readline(65537)
+        if not line:
+            raise HandshakeError("Connection closed during the handshake.")
+        line = line.rstrip('\r\n')
+        if not line:
+            return first_line.rstrip('\r\n'), headers
+        if len(headers) >= 100:
+            raise HandshakeError("Too many headers.")
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+def accept_handshake(rfile, wfile, path=None):
+    """Reads opening handshake of the client and answers it (server side).
+
+    :param path: when not None, only requests for this path are accepted
+    :return: (requested path, dict of request headers with lower-case names)
+    :Raises: HandshakeError (after responding with "400 Bad Request")
+    """
+    request_line, headers = _read_http_head(rfile)
+    parts = request_line.split()
+
+    problem = None
+    if len(parts) != 3 or parts[0] != 'GET':
+        problem = "Expected GET request."
+    elif path is not None and parts[1].split('?')[0] != path:
+        problem = "Unknown path."
+    elif headers.get('upgrade', '').lower() != 'websocket' or \
+            'upgrade' not in headers.get('connection', '').lower():
+        problem = "Expected WebSocket upgrade request."
+    elif not headers.get('sec-websocket-key'):
+        problem = "Sec-WebSocket-Key header is missing."
+    elif headers.get('sec-websocket-version') != '13':
+        problem = "Only WebSocket version 13 is supported."
+
+    if problem:
+        wfile.write(
+            'HTTP/1.1 400 Bad Request\r\n'
+            'Content-Type: text/plain\r\n'
+            'Content-Length: %d\r\n'
+            'Sec-WebSocket-Version: 13\r\n'
+            'Connection: close\r\n\r\n%s' % (len(problem), problem)
+        )
+        wfile.flush()
+        raise HandshakeError(problem)
+
+    wfile.write(
+        'HTTP/1.1 101 Switching Protocols\r\n'
+        'Upgrade: websocket\r\n'
+        'Connection: Upgrade\r\n'
+        'Sec-WebSocket-Accept: %s\r\n\r\n' % _accept_key(headers['sec-websocket-key'])
+    )
+    wfile.flush()
+    return parts[1], headers
+
+
+def request_handshake(rfile, wfile, host, path):
+    """Does opening handshake of the client side.
+
+    :Raises: HandshakeError if the server does not switch to WebSocket
+    """
+    key = base64.b64encode(os.urandom(16))
+    wfile.write(
+        'GET %s HTTP/1.1\r\n'
+        'Host: %s\r\n'
+        'Upgrade: websocket\r\n'
+        'Connection: Upgrade\r\n'
+        'Sec-WebSocket-Key: %s\r\n'
+        'Sec-WebSocket-Version: 13\r\n\r\n' % (path, host, key)
+    )
+    wfile.flush()
+
+    status_line, headers = _read_http_head(rfile)
+    parts = status_line.split(None, 2)
+    if len(parts) < 2 or parts[1] != '101':
+        raise HandshakeError("Server refused WebSocket upgrade: %s" % status_line)
+    if headers.get('sec-websocket-accept') != _accept_key(key):
+        raise HandshakeError("Server sent wrong Sec-WebSocket-Accept.")
+
+
+class WebSocketFraming(object):
+    """
+    Messages carried in WebSocket frames. Has the interface of the framings
+    of `streaming` module, but unlike those can be written to from several
+    threads at once.
+
+    Fragmented messages are reassembled, pings are answered, close frame
+    ends the stream. No extensions are supported.
+    """
+
+    # longest message (in bytes) we agree to read
+    max_message_size = 16 * 1024 * 1024
+
+    _short_size = struct.Struct('>H')
+    _long_size = struct.Struct('>Q')
+
+    def __init__(self, rfile, wfile, mask=False, binary=False):
+        """
+        :Parameters:
+            - rfile: file-like object frames are read from
+            - wfile: file-like object frames are written to
+            - mask: mask outgoing frames. Required (only) on the client side
+            - binary: send binary frames rather than text ones
+        """
+        self.rfile = rfile
+        self.wfile = wfile
+        self.mask = mask
+        self.opcode = OPCODE_BINARY if binary else OPCODE_TEXT
+        self.closed = False
+        self._write_lock = threading.Lock()
+
+    def _read_exactly(self, size):
+        data = self.rfile.read(size)
+        while len(data) < size:
+            chunk = self.rfile.read(size - len(data))
+            if not chunk:
+                raise FramingError("Stream ended in the middle of the frame.")
+            data += chunk
+        return data
+
+    def _read_frame(self):
+        """
+        :return: (fin, opcode, payload) or None when the stream is closed
+        """
+        header = self.rfile.read(2)
+        if not header:
+            return None
+        if len(header) < 2:
+            header += self._read_exactly(2 - len(header))
+
+        first, second = ord(header[0]), ord(header[1])
+        if first & 0x70:
+            raise FramingError("Reserved frame bits are set.")
+
+        size = second & 0x7F
+        if size == 126:
+            size, = self._short_size.unpack(self._read_exactly(2))
+        elif size == 127:
+            size, = self._long_size.unpack(self._read_exactly(8))
+        if size > self.max_message_size:
+            raise FramingError("Message is longer than %d bytes." % self.max_message_size)
+
+        mask = self._read_exactly(4) if second & 0x80 else None
+        payload = self._read_exactly(size) if size else ''
+        if mask:
+            payload = _mask(payload, mask)
+        return first & 0x80, first & 0x0F, payload
+
+    def read_message(self):
+        """
+        :return: next message (str) or None when the stream is closed
+        :Raises: FramingError
+        """
+        fragments = []
+        size = 0
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                if fragments:
+                    raise FramingError("Stream ended in the middle of the message.")
+                return None
+
+            fin, opcode, payload = frame
+            if opcode == OPCODE_PING:
+                self._write_frame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode == OPCODE_CLOSE:
+                self.close()
+                return None
+            if (opcode == OPCODE_CONTINUATION) != bool(fragments):
+                raise FramingError("Unexpected continuation frame." if fragments else "Unexpected data frame.")
+
+            fragments.append(payload)
+            size += len(payload)
+            if size > self.max_message_size:
+                raise FramingError("Message is longer than %d bytes." % self.max_message_size)
+            if fin:
+                return ''.join(fragments)
+
+    def _write_frame(self, opcode, payload):
+        size = len(payload)
+        mask_bit = 0x80 if self.mask else 0
+        if size < 126:
+            header = chr(0x80 | opcode) + chr(mask_bit | size)
+        elif size < 65536:
+            header = chr(0x80 | opcode) + chr(mask_bit | 126) + self._short_size.pack(size)
+        else:
+            header = chr(0x80 | opcode) + chr(mask_bit | 127) + self._long_size.pack(size)
+        if self.mask:
+            key = os.urandom(4)
+            header += key
+            payload = _mask(payload, key)
+
+        with self._write_lock:
+            self.wfile.write(header + payload)
+            self.wfile.flush()
+
+    def write_message(self, message):
+        if isinstance(message, unicode):
+            message = message.encode('utf-8')
+        self._write_frame(self.opcode, message)
+
+    def close(self, code=1000):
+        """Sends close frame, unless one was sent already"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._write_frame(OPCODE_CLOSE, self._short_size.pack(code))
+        except (socket.error, ValueError):
+            # the other side is gone already
+            pass
+
+
+class WebSocketConnection(object):
+    """
+    Server side of one WebSocket connection.
+
+    Each message is handled by the worker pool and its response is sent back
+    as soon as it is ready. Handlers get the connection as `websocket` in
+    **context (see `JSONPRCApplication.process_method`), so methods can
+    push notifications to the client with `notify`.
+    """
+
+    def __init__(self, application, framing, worker_pool):
+        self.application = application
+        self.framing = framing
+        self.worker_pool = worker_pool
+
+    def send(self, message):
+        self.framing.write_message(message)
+
+    def notify(self, method, *args, **kw):
+        """Pushes a notification (request without `id`) to the client"""
+        if args and kw:
+            raise ValueError("JSON-RPC method calls allow only either named or positional arguments.")
+        ds = self.application.data_serializer
+        self.send(ds.dumps(ds.assemble_request(method, args or kw or None, notification=True)))
+
+    def serve(self):
+        """Reads messages and queues them for handling until the client goes away"""
+        submit = self.worker_pool.submit
+        while True:
+            message = self.framing.read_message()
+            if message is None:
+                return
+            submit(self._handle_message, message)
+
+    def _handle_message(self, message):
+        response = self.application.handle_request_string(message, websocket=self)
+        if response is not None:
+            try:
+                self.send(response)
+            except (socket.error, ValueError):
+                # client went away, no one to tell
+                pass
+
+
+class _WebSocketRequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        server = self.server
+        try:
+            accept_handshake(self.rfile, self.wfile, server.path)
+        except (HandshakeError, socket.error):
+            return
+
+        framing = WebSocketFraming(
+            self.rfile,
+            self.wfile,
+            binary=server.rpc_application.data_serializer.content_type != 'application/json'
+        )
+        connection = WebSocketConnection(server.rpc_application, framing, server.worker_pool)
+        server.connections.add(connection)
+        try:
+            connection.serve()
+        except (FramingError, socket.error):
+            pass
+        finally:
+            server.connections.discard(connection)
+            framing.close()
+
+
+class WebSocketServer(TCPStreamServer):
+    """
+    Threading TCP server that serves JSON-RPC application over WebSocket.
+
+    :Variables:
+        - connections: set of WebSocketConnection instances currently open.
+                       Use these to push notifications to clients.
+    """
+
+    def __init__(self, address, application, path=None, workers=16):
+        """
+        :Parameters:
+            - address: (host, port) to listen on
+            - application: JSONPRCApplication instance
+            - path: when not None, only upgrade requests for this path are accepted
+            - workers: number of threads handling the messages of all connections
+        """
+        TCPStreamServer.__init__(self, address, _WebSocketRequestHandler)
+        self.rpc_application = application
+        self.path = path
+        self.worker_pool = WorkerPool(workers, workers * 16, 'jsonrpcparts-websocket')
+        self.connections = set()
+
+    def server_close(self):
+        TCPStreamServer.server_close(self)
+        self.worker_pool.shutdown(wait=False)
+
+
+def make_websocket_server(application, address, path=None, workers=16):
+    """
+    Creates (bound and listening) WebSocket server for the application.
+    Run it with `serve_forever()`.
+    """
+    return WebSocketServer(address, application, path, workers)
+
+
+class PendingCall(object):
+    """A call sent over WebSocketClient that may still be waiting for its response"""
+
+    def __init__(self, client, request_id):
+        self.request_id = request_id
+        self._client = client
+        self._event = threading.Event()
+        self._response = None
+        self._error = None
+
+    def _set_response(self, response):
+        self._response = response
+        self._event.set()
+
+    def _set_error(self, error):
+        self._error = error
+        self._event.set()
+
+    # error response without `id` is the response to the call
+    _set_failure = _set_response
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """Waits for the response
+
+        :return: response data structure
+        :Raises: ResponseTimeout, FramingError when connection broke before the response came
+        """
+        if not self._event.wait(timeout):
+            raise ResponseTimeout("No response to request %r in %s seconds." % (self.request_id, timeout))
+        if self._error is not None:
+            raise self._error
+        return self._response
+
+    def result(self, timeout=None):
+        """Waits for the response
+
+        :return: the result of the call
+        :Raises: RPCFault (and derivatives) when the call failed, see also `wait`
+        """
+        return self._client._process_response(self.wait(timeout))
+
+
+class _PendingBatch(object):
+    """Responses to the calls of a batch sent over WebSocketClient, as they come"""
+
+    def __init__(self, size):
+        self.size = size
+        # error response without `id` the server answered (some of) the batch with
+        self.failure = None
+        self._responses = Queue.Queue()
+
+    def _set_response(self, response):
+        self._responses.put(response)
+
+    def _set_failure(self, response):
+        self.failure = response
+        self._responses.put(None)
+
+    def _set_error(self, error):
+        self._responses.put(error)
+
+    def responses(self, timeout=None):
+        """Waits for the responses
+
+        :return: generator of response data structures, in the order they come.
+            Ends early when the batch failed, see `failure`.
+        :Raises: ResponseTimeout, FramingError when connection broke before all the responses came
+        """
+        for _ in xrange(self.size):
+            try:
+                response = self._responses.get(timeout=timeout)
+            except Queue.Empty:
+                raise ResponseTimeout("No response to a call of the batch in %s seconds." % timeout)
+            if response is None:
+                return
+            if isinstance(response, Exception):
+                raise response
+            yield response
+
+
+class WebSocketClient(RemoteClient):
+    """
+    JSON-RPC client that keeps one WebSocket connection to the server.
+
+    `call` blocks until its own response comes, but any number of threads
+    may call at once. `call_async` does not wait - it returns PendingCall.
+
+    Notifications pushed by the server are passed to `on_notification`
+    callable (method, params), if it is set. It runs on the reader thread.
+    """
+
+    def __init__(self, url, data_serializer=JSONRPC20Serializer, timeout=None):
+        """
+        :Parameters:
+            - url: ws://host:port/path
+            - data_serializer: a data_structure+serializer-instance
+            - timeout: seconds to wait for connection and for each response. None - wait forever
+        """
+        super(WebSocketClient, self).__init__(data_serializer)
+
+        parsed = urlparse.urlparse(url)
+        if parsed.scheme != 'ws':
+            raise ValueError("Only ws:// URLs are supported.")
+        host, port = parsed.hostname, parsed.port or 80
+        path = (parsed.path or '/') + ('?' + parsed.query if parsed.query else '')
+
+        self._timeout = timeout
+        self._socket = socket.create_connection((host, port), timeout)
+        rfile = self._socket.makefile('rb', -1)
+        wfile = self._socket.makefile('wb', -1)
+        request_handshake(rfile, wfile, '%s:%s' % (host, port), path)
+        self._socket.settimeout(None)
+
+        self._framing = WebSocketFraming(
+            rfile,
+            wfile,
+            mask=True,
+            binary=data_serializer.content_type != 'application/json'
+        )
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._closed = False
+        self.on_notification = None
+
+        self._reader = threading.Thread(target=self._read_responses, name='jsonrpcparts-websocket-reader')
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read_responses(self):
+        ds = self._data_serializer
+        error = FramingError("Connection was closed before the response arrived.")
+        try:
+            while True:
+                message = self._framing.read_message()
+                if message is None:
+                    break
+                try:
+                    data = ds.loads(message)
+                except ValueError:
+                    logger.warning("Dropping undecodable message from the server.")
+                    continue
+                # the call (or batch) other responses of the message are for
+                owner = None
+                failure = None
+                for item in (data if isinstance(data, list) else [data]):
+                    if not isinstance(item, dict):
+                        continue
+                    if 'method' in item:
+                        self._handle_notification(item)
+                        continue
+                    request_id = item.get('id')
+                    if request_id is None:
+                        if 'error' in item and failure is None:
+                            failure = item
+                        continue
+                    with self._pending_lock:
+                        pending = self._pending.pop(request_id, None)
+                    if pending is not None:
+                        pending._set_response(item)
+                        owner = pending
+                if failure is not None:
+                    self._fail_pending(failure, owner)
+        except (FramingError, socket.error, ValueError) as ex:
+            error = FramingError("Connection broke before the response arrived: %s" % ex)
+        finally:
+            with self._pending_lock:
+                self._closed = True
+                pending_calls = self._pending.values()
+                self._pending = {}
+            for pending in pending_calls:
+                pending._set_error(error)
+
+    def _fail_pending(self, response, owner=None):
+        """Hands error response without `id` to the calls waiting for responses
+
+        Usually there is only one call (or batch) in flight the response can
+        be for. With more, it is not known which one failed, and they all get
+        it rather than wait for a response that does not come.
+
+        :param owner: the batch other responses of the same message were for.
+            Then the response is for the rest of its calls.
+        """
+        failed = []
+        with self._pending_lock:
+            for request_id, pending in self._pending.items():
+                if owner is None or pending is owner:
+                    del self._pending[request_id]
+                    if pending not in failed:
+                        failed.append(pending)
+        for pending in failed:
+            pending._set_failure(response)
+
+    def _handle_notification(self, notification):
+        callback = self.on_notification
+        if callback is None:
+            return
+        try:
+            callback(notification['method'], notification.get('params'))
+        except Exception:
+            logger.exception("on_notification callback failed.")
+
+    def _send_call(self, request_json):
+        pending = PendingCall(self, request_json['id'])
+        with self._pending_lock:
+            if self._closed:
+                raise FramingError("Connection is closed.")
+            self._pending[pending.request_id] = pending
+        try:
+            self._framing.write_message(self._data_serializer.dumps(request_json))
+        except Exception:
+            with self._pending_lock:
+                self._pending.pop(pending.request_id, None)
+            raise
+        return pending
+
+    def _communicate(self, request_json, expect_response):
+        if not expect_response:
+            self._framing.write_message(self._data_serializer.dumps(request_json))
+            return None
+        return self._send_call(request_json).wait(self._timeout)
+
+    def _send_batch(self, batch_data, request_ids):
+        pending = _PendingBatch(len(request_ids))
+        with self._pending_lock:
+            if self._closed:
+                raise FramingError("Connection is closed.")
+            for request_id in request_ids:
+                self._pending[request_id] = pending
+        try:
+            self._framing.write_message(batch_data)
+        except Exception:
+            with self._pending_lock:
+                for request_id in request_ids:
+                    self._pending.pop(request_id, None)
+            raise
+        return pending
+
+    def _communicate_batch(self, batch_data, expect_response, request_ids=()):
+        if not expect_response:
+            self._framing.write_message(batch_data)
+            return None
+        pending = self._send_batch(batch_data, list(request_ids))
+        responses = list(pending.responses(self._timeout))
+        if pending.failure is not None:
+            # single error response, as for a batch the server could not make sense of
+            return pending.failure
+        return responses
+
+    def _iter_batch_responses(self, batch_data, request_ids=()):
+        parse = self._data_serializer._parse_single_response_trap_errors
+        pending = self._send_batch(batch_data, list(request_ids))
+        for response in pending.responses(self._timeout):
+            yield parse(response)
+        if pending.failure is not None:
+            yield parse(pending.failure)
+
+    def call_async(self, method, *args, **kw):
+        """Sends the call and returns without waiting for the response
+
+        :rtype: PendingCall
+        """
+        return self._send_call(super(RemoteClient, self).call(method, *args, **kw))
+
+    def close(self):
+        """Closes the connection. Calls still waiting for responses fail."""
+        self._framing.close()
+        self._reader.join(self._timeout or 5)
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._framing.rfile.close()
+        self._framing.wfile.close()
+        self._socket.close()
@@ -0,0 +1,185 @@
+"""
+Some transports run JSON-RPC calls concurrently, away from the thread that
+reads the requests. This module contains a small fixed-size thread pool
+fed from a bounded queue that they share.
+
+This file is part of `jsonrpcparts` project. See project's source for license and copyright.
+"""
+import logging
+import os
+import Queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool(object):
+    """
+    Fixed number of daemon threads executing submitted callables.
+
+    Work waits in a queue of bounded size. What becomes of work submitted
+    to a full queue is up to `overflow`: BLOCK waits for room in the queue,
+    DROP drops the work and INLINE runs it in the submitting thread.
+    Exceptions raised by the callables are logged and otherwise ignored.
+
+    :Variables:
+        - submitted: number of work items submitted
+        - completed: number of work items done, by the threads or inline
+        - failed: number of the done ones that raised an exception
+        - dropped: number of work items dropped because the queue was full
+        - inlined: number of work items run in the submitting thread
+    """
+
+    BLOCK = 'block'
+    DROP = 'drop'
+    INLINE = 'inline'
+
+    # seconds at a time submit waits for room in a full queue (with BLOCK)
+    # before it checks whether the pool is shut down
+    block_interval = 0.05
+
+    def __init__(self, workers=8, queue_size=0, name='jsonrpcparts-worker', overflow=BLOCK):
+        """
+        :Parameters:
+            - workers: number of threads
+            - queue_size: how much work may wait for a free thread. 0 means unbounded
+            - name: prefix of the thread names
+            - overflow: BLOCK, DROP or INLINE - what to do with work submitted to a full queue
+        """
+        if overflow not in (self.BLOCK, self.DROP, self.INLINE):
+            raise ValueError('Unknown overflow policy "%s".' % overflow)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.name = name
+        self.overflow = overflow
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.inlined = 0
+        # guards the counters
+        self._lock = threading.Lock()
+        # held while work is queued, and by shutdown once it set `_closed`,
+        # so no work gets queued after the sentinels that stop the threads
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._pid = None
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # threads do not survive fork, every process needs threads (and a queue) of its own
+            self._pid = os.getpid()
+            self._queue = Queue.Queue(self.queue_size)
+            # the Nones queued so far by shutdown, one per thread stops them all
+            self._sentinels = 0
+            self._threads = []
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name='%s-%d' % (self.name, number))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    @property
+    def pending(self):
+        """Number of work items waiting for a free thread"""
+        return self._queue.qsize()
+
+    def submit(self, function, *args, **kw):
+        """Queues function(*args, **kw) for execution.
+
+        Work submitted after shutdown runs in the submitting thread.
+
+        :return: False if the work was dropped, True otherwise
+        """
+        if self._pid != os.getpid():
+            self._start()
+        with self._lock:
+            self.submitted += 1
+
+        if self.overflow == self.BLOCK:
+            # waits in short turns, so shutdown does not wait for the lock as long as the queue is full
+            while not self._closed:
+                with self._submit_lock:
+                    if self._closed:
+                        break
+                    try:
+                        self._queue.put((function, args, kw), timeout=self.block_interval)
+                        return True
+                    except Queue.Full:
+                        pass
+
+        with self._submit_lock:
+            if not self._closed:
+                try:
+                    self._queue.put_nowait((function, args, kw))
+                    return True
+                except Queue.Full:
+                    if self.overflow == self.DROP:
+                        with self._lock:
+                            self.dropped += 1
+                        return False
+
+        # the pool is shut down, or the queue is full and overflow is INLINE
+        self._run_inline(function, args, kw)
+        return True
+
+    def _run_inline(self, function, args, kw):
+        with self._lock:
+            self.inlined += 1
+        self._run(function, args, kw)
+
+    def _run(self, function, args, kw):
+        failed = False
+        try:
+            function(*args, **kw)
+        except Exception:
+            failed = True
+            logger.exception("Work item %r failed.", function)
+        with self._lock:
+            self.completed += 1
+            if failed:
+                self.failed += 1
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._run(*item)
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stops the threads once the work queued so far is done.
+
+        :Parameters:
+            - wait: when True, returns only after the threads are done
+            - timeout: seconds to wait at most, None for no limit
+        :return: True if the queued work is done (always True without wait)
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        # submitters waiting for room in the queue give up the lock once they see it
+        self._closed = True
+        with self._submit_lock:
+            self._closed = True
+            if self._pid != os.getpid():
+                # no threads were started in this process
+                return True
+            # the rest of the sentinels, when an earlier shutdown ran out of time
+            while self._sentinels < len(self._threads):
+                try:
+                    # waits for room in a full queue
+                    self._queue.put(None, timeout=None if deadline is None else max(deadline - time.time(), 0))
+                except Queue.Full:
+                    return False
+                self._sentinels += 1
+        if not wait:
+            return True
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(deadline - time.time(), 0))
+        return not any(thread.is_alive() for thread in self._threads)
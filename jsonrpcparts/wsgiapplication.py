@@ -4,14 +4,159 @@ that supports discovery and use of the registered methods.
 
 This file is part of `jsonrpcparts` project. See project's source for license and copyright.
 """
-from . import JSONPRCApplication
+import hashlib
+
+from . import JSONPRCApplication, JSONRPC20Serializer
+from . import compression
+from .context import RequestContextPool
+
+
+def _parse_accept(accept):
+    """Turns value of Accept header into a list of media types,
+    most preferred first. Types with q=0 are dropped.
+    """
+    weighted = []
+    for position, entry in enumerate(accept.split(',')):
+        parts = entry.split(';')
+        media_type = parts[0].strip().lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for parameter in parts[1:]:
+            name, _, value = parameter.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            weighted.append((-quality, position, media_type))
+    weighted.sort()
+    return [media_type for _, _, media_type in weighted]
+
 
 class JSONPRCWSGIApplication(JSONPRCApplication):
 
+    # Responses at least this long (bytes) are compressed when the client
+    # accepts one of compression.available_encodings(). None turns it off.
+    compression_threshold = 1024
+    # None means compression.DEFAULT_LEVELS
+    compression_level = None
+    # longest request body (bytes) we agree to decompress a Content-Encoding'd request into
+    max_decompressed_size = 64 * 1024 * 1024
+    # When True, responses carry ETag (a hash of the response) and requests
+    # with matching If-None-Match get "304 Not Modified" without a body.
+    # Saves bandwidth (not work) for clients that revalidate cached results.
+    etags = False
+    # Makes the RequestContext (see `context`) each request is processed with.
+    # Give it a RequestContext subclass to have more room for middleware's data.
+    request_context_pool = RequestContextPool()
+    # accesslog.AccessLog writing a record of every request, see AccessLog.install
+    access_log = None
+    # capture.CaptureRecorder recording (a sample of) the requests, for `replay`
+    recorder = None
+
+    def __init__(self, data_serializer=JSONRPC20Serializer, *args, **kw):
+        """
+        :Parameters:
+            - data_serializer: a data_structure+serializer-instance
+                The default one. More serializers (for other Content-Types)
+                can be added with register_serializer.
+        """
+        super(JSONPRCWSGIApplication, self).__init__(data_serializer, *args, **kw)
+        self._serializers = {data_serializer.content_type: data_serializer}
+
+    def register_serializer(self, serializer):
+        """Makes the application accept requests in (and respond with)
+        serializer's encoding, recognized by its `content_type`.
+
+        All serializers of one application must speak same version of the protocol.
+
+        :Parameters:
+            - serializer: a data_structure+serializer-instance
+        """
+        self._serializers[serializer.content_type] = serializer
+
+    def get_serializers(self, environ):
+        """
+        Picks serializers for the request based on Content-Type and Accept headers.
+
+        The response is encoded with the first (by preference) type in Accept header
+        the application knows, or with the request's serializer.
+
+        :return: (request_serializer, response_serializer) or (None, None)
+            if request's Content-Type is not supported.
+        """
+        content_type = environ.get('CONTENT_TYPE', '').split(';')[0].strip().lower()
+        request_serializer = self._serializers.get(content_type)
+        if request_serializer is None:
+            return None, None
+
+        accept = environ.get('HTTP_ACCEPT')
+        if accept:
+            for media_type in _parse_accept(accept):
+                if media_type in self._serializers:
+                    return request_serializer, self._serializers[media_type]
+                if media_type in ('*/*', 'application/*'):
+                    break
+
+        return request_serializer, request_serializer
+
+    def _plain_text_response(self, start_response, status, body):
+        headers = [
+            ('Content-Type', 'text/plain'),
+            ('Content-Length', str(len(body)))
+        ]
+        start_response(status, headers)
+        return [body]
+
     def handle_wsgi_request(self, environ, start_response):
 
-        assert 'CONTENT_TYPE' in environ
-        assert environ['CONTENT_TYPE'] == 'application/json'
+        pool = self.request_context_pool
+        request_context = pool.acquire(environ)
+        try:
+            access_log = self.access_log
+            if access_log is not None:
+                start_response = access_log.start_http(request_context, start_response)
+
+            tracer = self.tracer
+            if tracer is None:
+                body = self._handle_wsgi_request(environ, start_response, request_context)
+            else:
+                # the trace of the client continues here
+                with tracer.start_span(
+                    'jsonrpc.request',
+                    kind='server',
+                    traceparent=environ.get('HTTP_TRACEPARENT'),
+                    attributes={'rpc.system': 'jsonrpc', 'http.target': environ.get('PATH_INFO')}
+                ) as span:
+                    request_context.span = span
+                    body = self._handle_wsgi_request(environ, start_response, request_context)
+
+            if access_log is not None:
+                access_log.log_http(request_context, body)
+            return body
+        finally:
+            pool.release(request_context)
+
+    def _handle_wsgi_request(self, environ, start_response, request_context):
+
+        request_serializer, response_serializer = self.get_serializers(environ)
+        if request_serializer is None:
+            return self._plain_text_response(
+                start_response,
+                '415 Unsupported Media Type',
+                'Supported Content-Types: %s' % ', '.join(sorted(self._serializers))
+            )
+
+        try:
+            request_encoding = compression.normalize_encoding(environ.get('HTTP_CONTENT_ENCODING', ''))
+        except ValueError:
+            return self._plain_text_response(
+                start_response,
+                '415 Unsupported Media Type',
+                'Supported Content-Encodings: %s' % ', '.join(compression.available_encodings())
+            )
 
         content_length = None
         if 'CONTENT_LENGTH' in environ:
@@ -46,13 +191,55 @@ class JSONPRCWSGIApplication(JSONPRCApplication):
             chunk, content_length = get_next_chunk(content_length)
 
         request_string = ''.join(chunks)
-        response_string = self.handle_request_string(request_string)
+        if request_encoding:
+            try:
+                request_string = compression.decompress(
+                    request_string,
+                    request_encoding,
+                    self.max_decompressed_size
+                )
+            except ValueError as ex:
+                return self._plain_text_response(start_response, '400 Bad Request', str(ex))
+
+        response_string = self.handle_request_string(
+            request_string,
+            data_serializer=request_serializer,
+            response_serializer=response_serializer,
+            request_context=request_context
+        )
+
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(environ.get('CONTENT_TYPE'), request_string, response_string, environ.get('HTTP_ACCEPT'))
 
         if response_string:
             headers = [
-                ('Content-Type', 'application/json'),
-                ('Content-Length', str(len(response_string)))
+                ('Content-Type', response_serializer.content_type)
             ]
+            if self.etags:
+                etag = '"%s"' % hashlib.sha1(response_string).hexdigest()
+                headers.append(('ETag', etag))
+                if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+                if if_none_match and (
+                    if_none_match.strip() == '*' or
+                    etag in [value.strip() for value in if_none_match.split(',')]
+                ):
+                    start_response('304 Not Modified', headers)
+                    return []
+            if self.compression_threshold is not None:
+                headers.append(('Vary', 'Accept-Encoding'))
+                if len(response_string) >= self.compression_threshold:
+                    response_encoding = compression.choose_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+                    if response_encoding:
+                        compressed = compression.compress(
+                            response_string,
+                            response_encoding,
+                            self.compression_level
+                        )
+                        if len(compressed) < len(response_string):
+                            response_string = compressed
+                            headers.append(('Content-Encoding', response_encoding))
+            headers.append(('Content-Length', str(len(response_string))))
             start_response('200 OK', headers)
             return [response_string]
         else:
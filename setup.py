@@ -44,7 +44,12 @@ if __name__ == "__main__":
         license='MIT',
         packages=find_packages(),
         include_package_data=True,
-        install_requires=['requests']
+        install_requires=['requests'],
+        extras_require={
+            'msgpack': ['msgpack'],
+            'cbor': ['cbor2'],
+            'zstd': ['zstandard']
+        }
     )
 
 # Next:
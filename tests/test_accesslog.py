@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+
+from unittest import TestCase
+
+from jsonrpcparts import JSONPRCApplication, JSONRPC20Serializer, errors
+from jsonrpcparts.accesslog import AccessLog, BackgroundLineWriter
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+
+
+class BackgroundLineWriterTestSuite(TestCase):
+
+    def test_writes_json_lines(self):
+
+        output = StringIO.StringIO()
+        writer = BackgroundLineWriter(output, batch_size=2, flush_interval=0.01)
+        for number in range(5):
+            self.assertTrue(writer.write({'n': number, 'name': u'я'}))
+        writer.close()
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual([json.loads(line)['n'] for line in lines], range(5))
+        self.assertEqual((writer.written, writer.dropped), (5, 0))
+
+        # closed writers drop
+        self.assertFalse(writer.write({'n': 5}))
+        self.assertEqual(writer.dropped, 1)
+
+    def test_drops_when_full(self):
+
+        output = StringIO.StringIO()
+        # the writer thread sleeps until close
+        writer = BackgroundLineWriter(output, max_queue=3, batch_size=100, flush_interval=60)
+        results = [writer.write(number) for number in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(writer.dropped, 2)
+
+        writer.close()
+        self.assertEqual(output.getvalue(), '0\n1\n2\n')
+
+    def test_encoding_errors(self):
+
+        output = StringIO.StringIO()
+        writer = BackgroundLineWriter(output, encode=lambda record: 'x' * record, flush_interval=60)
+        writer.write(1)
+        writer.write('not a number')
+        writer.write(2)
+        writer.close()
+
+        self.assertEqual(output.getvalue(), 'x\nxx\n')
+        self.assertEqual(writer.errors, 1)
+
+    def test_appends_to_file(self):
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'access.log')
+            with open(path, 'w') as log_file:
+                log_file.write('earlier\n')
+            writer = BackgroundLineWriter(path)
+            writer.write({'n': 1})
+            writer.close()
+            with open(path) as log_file:
+                self.assertEqual(log_file.read(), 'earlier\n{"n":1}\n')
+        finally:
+            shutil.rmtree(directory)
+
+
+class ListWriter(list):
+
+    def write(self, record):
+        self.append(record)
+        return True
+
+
+class AccessLogTestSuite(TestCase):
+
+    def setUp(self):
+        super(AccessLogTestSuite, self).setUp()
+
+        def add(a, b):
+            return a + b
+
+        def fail():
+            raise errors.RPCPermissionDenied()
+
+        self.records = ListWriter()
+        self.access_log = AccessLog(self.records)
+        self.app = JSONPRCWSGIApplication()
+        self.app.register_function(add)
+        self.app.register_function(fail)
+        self.access_log.install(self.app)
+
+    def post(self, body, content_type='application/json'):
+        environ = {
+            'wsgi.input': StringIO.StringIO(body),
+            'CONTENT_LENGTH': str(len(body)),
+            'CONTENT_TYPE': content_type,
+            'REMOTE_ADDR': '10.0.0.7',
+            'PATH_INFO': '/rpc'
+        }
+        return ''.join(self.app(environ, lambda status, headers: None))
+
+    def test_batch(self):
+
+        body = JSONRPC20Serializer.json_dumps([
+            {'jsonrpc': '2.0', 'method': 'add', 'params': [1, 2], 'id': 1},
+            {'jsonrpc': '2.0', 'method': 'fail', 'id': 2},
+            {'jsonrpc': '2.0', 'method': 'missing', 'id': 3},
+            {'jsonrpc': '2.0', 'method': 'add', 'params': [1, 1]},
+            {'jsonrpc': '2.0', 'id': 5}
+        ])
+        response = self.post(body)
+
+        records = self.records
+        self.assertEqual([(record['method'], record['id'], record['error']) for record in records], [
+            ('add', 1, None),
+            ('fail', 2, errors.PERMISSION_DENIED),
+            ('missing', 3, errors.METHOD_NOT_FOUND),
+            ('add', None, None),
+            (None, 5, errors.INVALID_REQUEST)
+        ])
+        self.assertEqual([record['duration_ms'] is not None for record in records], [True, True, False, True, False])
+        for index, record in enumerate(records):
+            self.assertEqual(record['index'], index)
+            self.assertEqual(record['batch_size'], 5)
+            self.assertEqual(record['status'], 200)
+            self.assertEqual(record['request_bytes'], len(body))
+            self.assertEqual(record['response_bytes'], len(response))
+            self.assertEqual((record['remote_addr'], record['path']), ('10.0.0.7', '/rpc'))
+            self.assertGreaterEqual(record['request_ms'], record['duration_ms'])
+
+    def test_unprocessed_request(self):
+
+        self.post('add(1, 2)', 'text/plain')
+
+        self.assertEqual(len(self.records), 1)
+        record = self.records[0]
+        self.assertEqual((record['method'], record['status']), (None, 415))
+
+    def test_without_http(self):
+
+        app = JSONPRCApplication()
+        app.register_function(len)
+        self.access_log.install(app)
+
+        app.handle_request_string('{"jsonrpc": "2.0", "method": "len", "params": [[1, 2]], "id": 1}')
+
+        self.assertEqual(len(self.records), 1)
+        record = self.records[0]
+        self.assertEqual((record['method'], record['id'], record['error'], record['batch_size']), ('len', 1, None, 1))
+        self.assertIsNotNone(record['duration_ms'])
+        self.assertNotIn('status', record)
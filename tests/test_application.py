@@ -1,11 +1,17 @@
 import datetime
 import json
+import threading
 import time
 import uuid
 
 from unittest import TestCase, skip
 
 from jsonrpcparts import JSONPRCApplication, JSONRPC20Serializer, errors
+from jsonrpcparts.context import RequestContext, takes_request_context
+from jsonrpcparts.rawjson import RawJSON, takes_raw_params
+from jsonrpcparts.tracing import InMemorySpanExporter, Tracer
+from jsonrpcparts.validation import params_schema
+from jsonrpcparts.workers import WorkerPool
 
 class JSONPRCApplicationTestSuite(TestCase):
 
@@ -179,6 +185,404 @@ class JSONRPCApplicationNonStandardProcessMethodOverride(TestCase):
         )
 
 
+class JSONPRCApplicationRawParamsTestSuite(TestCase):
+
+    class RawParamsSerializer(JSONRPC20Serializer):
+        raw_params = True
+
+    def setUp(self):
+        super(JSONPRCApplicationRawParamsTestSuite, self).setUp()
+
+        def adder(*args):
+            return sum(args)
+
+        @takes_raw_params
+        def forward(params):
+            assert params is None or isinstance(params, RawJSON)
+            return params and params.json
+
+        self.adder = adder
+        self.forward = forward
+
+    def _call(self, app, serializer, *requests):
+        return serializer.json_loads(app.handle_request_string(
+            serializer.json_dumps(list(requests))
+        ))
+
+    def test_params_are_decoded_at_dispatch(self):
+
+        serializer = self.RawParamsSerializer
+        app = JSONPRCApplication(serializer)
+        app.register_function(self.adder)
+        app.register_function(self.forward)
+
+        request1 = serializer.assemble_request('adder', (2, 3))
+        request2 = serializer.assemble_request('forward', {'a': [1, 2]})
+        request3 = serializer.assemble_request('forward')
+        request4 = serializer.assemble_request('missing', [1])
+
+        responses = self._call(app, serializer, request1, request2, request3, request4)
+
+        self.assertEqual(responses[0]['result'], 5)
+        self.assertEqual(json.loads(responses[1]['result']), {'a': [1, 2]})
+        self.assertEqual(responses[2]['result'], None)
+        self.assertEqual(responses[3]['error']['code'], errors.METHOD_NOT_FOUND)
+
+    def test_broken_params_are_reported_per_element(self):
+
+        serializer = self.RawParamsSerializer
+        app = JSONPRCApplication(serializer)
+        app.register_function(self.adder)
+
+        request_string = (
+            '[{"jsonrpc": "2.0", "method": "adder", "params": [1, 2,], "id": 1},'
+            ' {"jsonrpc": "2.0", "method": "adder", "params": [1, 2], "id": 2}]'
+        )
+        responses = serializer.json_loads(app.handle_request_string(request_string))
+
+        self.assertEqual(responses[0]['error']['code'], errors.PARSE_ERROR)
+        self.assertEqual(responses[0]['id'], 1)
+        self.assertEqual(responses[1]['result'], 3)
+
+    def test_raw_json_result(self):
+
+        serializer = self.RawParamsSerializer
+        app = JSONPRCApplication(serializer)
+        app.register_function(lambda params: RawJSON(params.json), 'echo')
+        app['echo'].takes_raw_params = True
+
+        request = serializer.assemble_request('echo', {'a': [1, 2]})
+        response_string = app.handle_request_string(serializer.json_dumps(request))
+
+        assert '"result": {"a": [1, 2]}' in response_string
+        self.assertEqual(serializer.json_loads(response_string)['id'], request['id'])
+
+    def test_raw_params_method_with_non_raw_serializer(self):
+
+        serializer = JSONRPC20Serializer
+        app = JSONPRCApplication(serializer)
+        app.register_function(self.forward)
+
+        request = serializer.assemble_request('forward', [1, 'a'])
+        responses = self._call(app, serializer, request)
+
+        self.assertEqual(json.loads(responses[0]['result']), [1, 'a'])
+
+
+class JSONPRCApplicationParamsValidationTestSuite(TestCase):
+
+    def setUp(self):
+        super(JSONPRCApplicationParamsValidationTestSuite, self).setUp()
+
+        self.calls = []
+
+        def move(x, y=0):
+            self.calls.append((x, y))
+            return x + y
+
+        self.app = JSONPRCApplication(JSONRPC20Serializer)
+        self.app.register_function(move, params_schema={
+            'type': 'object',
+            'properties': {
+                'x': {'type': 'integer', 'minimum': 0},
+                'y': int
+            },
+            'required': ['x'],
+            'additionalProperties': False
+        })
+
+    def _call(self, *requests):
+        return JSONRPC20Serializer.json_loads(self.app.handle_request_string(
+            JSONRPC20Serializer.json_dumps(list(requests))
+        ))
+
+    def test_invalid_params_do_not_reach_the_method(self):
+
+        responses = self._call(
+            JSONRPC20Serializer.assemble_request('move', {'x': 1, 'y': 2}),
+            JSONRPC20Serializer.assemble_request('move', [3]),
+            JSONRPC20Serializer.assemble_request('move', {'x': -1}),
+            JSONRPC20Serializer.assemble_request('move', [1, 'far']),
+            JSONRPC20Serializer.assemble_request('move', {'x': 1, 'z': 1})
+        )
+
+        self.assertEqual(responses[0]['result'], 3)
+        self.assertEqual(responses[1]['result'], 3)
+        self.assertEqual(self.calls, [(1, 2), (3, 0)])
+
+        error = responses[2]['error']
+        self.assertEqual(error['code'], errors.INVALID_METHOD_PARAMS)
+        self.assertEqual(error['data'], {'path': 'params.x', 'keyword': 'minimum', 'message': 'must be >= 0'})
+        self.assertEqual(error['message'], 'params.x: must be >= 0')
+
+        self.assertEqual(responses[3]['error']['data']['path'], 'params.y')
+        self.assertEqual(responses[4]['error']['data']['keyword'], 'additionalProperties')
+
+    def test_schema_from_decorator(self):
+
+        class Calculator(object):
+
+            @params_schema({'type': 'array', 'items': {'type': 'number'}})
+            def add(self, *numbers):
+                return sum(numbers)
+
+        self.app.register_class(Calculator(), 'calc')
+
+        responses = self._call(
+            JSONRPC20Serializer.assemble_request('calc.add', [1, 2.5]),
+            JSONRPC20Serializer.assemble_request('calc.add', [1, '2'])
+        )
+
+        self.assertEqual(responses[0]['result'], 3.5)
+        self.assertEqual(responses[1]['error']['data']['path'], 'params[1]')
+
+    def test_namespaces(self):
+
+        class Calculator(object):
+
+            @params_schema({'type': 'array', 'items': {'type': 'number'}})
+            def add(self, *numbers):
+                return sum(numbers)
+
+            base = 10
+
+        self.app.register_namespace('calc', Calculator())
+
+        responses = self._call(
+            JSONRPC20Serializer.assemble_request('calc.add', [1, 2.5]),
+            JSONRPC20Serializer.assemble_request('calc.add', [1, '2']),
+            JSONRPC20Serializer.assemble_request('calc.base'),
+            JSONRPC20Serializer.assemble_request('calc.add', [3])
+        )
+
+        self.assertEqual(responses[0]['result'], 3.5)
+        self.assertEqual(responses[1]['error']['data']['path'], 'params[1]')
+        self.assertEqual(responses[2]['error']['code'], errors.METHOD_NOT_FOUND)
+        self.assertEqual(responses[3]['result'], 3)
+
+    def test_reregistering_drops_the_schema(self):
+
+        self.app.register_function(lambda x: x, 'move')
+
+        responses = self._call(JSONRPC20Serializer.assemble_request('move', ['anything']))
+
+        self.assertEqual(responses[0]['result'], 'anything')
+
+    def test_raw_params_methods_can_not_be_validated(self):
+
+        with self.assertRaises(ValueError):
+            self.app.register_function(takes_raw_params(lambda params: None), 'raw', params_schema={'type': 'array'})
+        self.assertNotIn('raw', self.app)
+
+
+class JSONPRCApplicationMiddlewareTestSuite(TestCase):
+
+    def setUp(self):
+        super(JSONPRCApplicationMiddlewareTestSuite, self).setUp()
+
+        def adder(*args):
+            return sum(args)
+
+        self.app = JSONPRCApplication(JSONRPC20Serializer)
+        self.app.register_function(adder)
+        self.log = []
+
+    def _call(self, *requests, **context):
+        return JSONRPC20Serializer.json_loads(self.app.handle_request_string(
+            JSONRPC20Serializer.json_dumps(list(requests)),
+            **context
+        ))
+
+    def test_call_middleware_order(self):
+
+        def outer(call_next, name, method, args, kwargs, request_id, context):
+            self.log.append(('outer', name, context.get('user')))
+            return call_next(name, method, args, kwargs, request_id, context) * 10
+
+        def inner(call_next, name, method, args, kwargs, request_id, context):
+            self.log.append(('inner', name, list(args)))
+            return call_next(name, method, args + [1], kwargs, request_id, context)
+
+        self.app.add_call_middleware(outer)
+        self.app.add_call_middleware(inner)
+
+        responses = self._call(
+            JSONRPC20Serializer.assemble_request('adder', [1, 2]),
+            JSONRPC20Serializer.assemble_request('missing'),
+            user='alice'
+        )
+
+        self.assertEqual(responses[0]['result'], 40)
+        self.assertEqual(responses[1]['error']['code'], errors.METHOD_NOT_FOUND)
+        # missing methods are not called, not even through middleware
+        self.assertEqual(self.log, [('outer', 'adder', 'alice'), ('inner', 'adder', [1, 2])])
+
+    def test_call_middleware_errors(self):
+
+        def deny(call_next, name, method, args, kwargs, request_id, context):
+            if args and args[0] < 0:
+                raise errors.RPCPermissionDenied('Negative numbers are not welcome', request_id)
+            return call_next(name, method, args, kwargs, request_id, context)
+
+        def broken(call_next, name, method, args, kwargs, request_id, context):
+            if args and args[0] == 0:
+                raise ValueError('zero')
+            return call_next(name, method, args, kwargs, request_id, context)
+
+        self.app.add_call_middleware(deny)
+        self.app.add_call_middleware(broken)
+
+        responses = self._call(
+            JSONRPC20Serializer.assemble_request('adder', [-1]),
+            JSONRPC20Serializer.assemble_request('adder', [0]),
+            JSONRPC20Serializer.assemble_request('adder', [2, 2])
+        )
+
+        self.assertEqual(responses[0]['error']['code'], errors.PERMISSION_DENIED)
+        self.assertEqual(responses[1]['error']['code'], errors.INTERNAL_ERROR)
+        self.assertEqual(responses[2]['result'], 4)
+
+    def test_message_middleware(self):
+
+        def limit(process_next, requests, context):
+            self.log.append(len(requests))
+            if len(requests) > 2:
+                return [
+                    self.app.data_serializer.assemble_error_response(
+                        errors.RPCInvalidRequest('Batch too large', request_id)
+                    )
+                    for method, params, request_id, error in requests
+                ]
+            return process_next(requests, context)
+
+        def tag(process_next, requests, context):
+            responses = process_next(requests, context)
+            self.log.append((context.get('tag'), len(responses)))
+            return responses
+
+        self.app.add_message_middleware(limit)
+        self.app.add_message_middleware(tag)
+
+        responses = self._call(
+            JSONRPC20Serializer.assemble_request('adder', [1, 2]),
+            tag='tagged'
+        )
+        self.assertEqual(responses[0]['result'], 3)
+
+        responses = self._call(*[JSONRPC20Serializer.assemble_request('adder', [1])] * 3)
+        self.assertEqual([response['error']['code'] for response in responses], [errors.INVALID_REQUEST] * 3)
+        # the limit answered without passing the batch on
+        self.assertEqual(self.log, [1, ('tagged', 1), 3])
+
+    def test_chain_is_compiled(self):
+
+        self.assertIsNone(self.app._process_call)
+
+        def passing(call_next, *call):
+            return call_next(*call)
+
+        self.app.add_call_middleware(passing)
+        chain = self.app._process_call
+        self.assertIs(chain.func, passing)
+        self.assertEqual(self._call(JSONRPC20Serializer.assemble_request('adder', [1, 2]))[0]['result'], 3)
+        self.assertIs(self.app._process_call, chain)
+
+
+class JSONPRCApplicationDeferredNotificationsTestSuite(TestCase):
+
+    def setUp(self):
+        super(JSONPRCApplicationDeferredNotificationsTestSuite, self).setUp()
+        self.release = threading.Event()
+        self.log = []
+
+        def adder(a, b):
+            return a + b
+
+        @takes_request_context
+        def notify(value, request_context):
+            self.release.wait(5)
+            self.log.append((value, request_context.auth, threading.current_thread().name))
+
+        def fail():
+            raise ValueError('nobody hears it')
+
+        self.app = JSONPRCApplication(JSONRPC20Serializer)
+        self.app.register_function(adder)
+        self.app.register_function(notify)
+        self.app.register_function(fail)
+        self.app.notification_pool = WorkerPool(2, 10, 'test-notifications')
+
+    def tearDown(self):
+        self.release.set()
+        self.app.drain_notifications()
+        super(JSONPRCApplicationDeferredNotificationsTestSuite, self).tearDown()
+
+    def test_response_does_not_wait(self):
+
+        request_context = RequestContext()
+        request_context.auth = 'alice'
+        response = self.app.handle_request_string(JSONRPC20Serializer.json_dumps([
+            {'jsonrpc': '2.0', 'method': 'notify', 'params': [1]},
+            {'jsonrpc': '2.0', 'method': 'adder', 'params': [1, 2], 'id': 1},
+            {'jsonrpc': '2.0', 'method': 'fail'}
+        ]), request_context=request_context)
+
+        self.assertEqual(JSONRPC20Serializer.json_loads(response)[0]['result'], 3)
+        self.assertEqual(self.log, [])
+        # the notification keeps a copy of the context, the request's one may be reused
+        request_context.reset()
+
+        self.release.set()
+        self.assertTrue(self.app.drain_notifications(timeout=5))
+        value, auth, thread_name = self.log[0]
+        self.assertEqual((value, auth), (1, 'alice'))
+        self.assertTrue(thread_name.startswith('test-notifications'))
+        pool = self.app.notification_pool
+        self.assertEqual((pool.submitted, pool.completed, pool.failed), (2, 2, 1))
+
+    def test_goes_through_call_middleware(self):
+
+        def record(call_next, name, method, args, kwargs, request_id, context):
+            self.log.append((name, request_id))
+            return call_next(name, method, args, kwargs, request_id, context)
+
+        self.app.add_call_middleware(record)
+        self.release.set()
+        self.assertIsNone(self.app.handle_request_string(
+            '{"jsonrpc": "2.0", "method": "adder", "params": [1, 2]}'
+        ))
+        self.app.drain_notifications()
+        self.assertEqual(self.log, [('adder', None)])
+
+    def test_spans_join_the_request_trace(self):
+
+        exporter = InMemorySpanExporter()
+        tracer = Tracer(exporter)
+        self.app.set_tracer(tracer)
+        request_context = RequestContext()
+        with tracer.start_span('request') as request_span:
+            request_context.span = request_span
+            self.app.handle_request_string(
+                '{"jsonrpc": "2.0", "method": "adder", "params": [1, 2]}', request_context=request_context
+            )
+        self.assertTrue(self.app.drain_notifications(timeout=5))
+
+        call_span, = [span for span in exporter.get_finished_spans() if span.name == 'adder']
+        self.assertEqual(
+            (call_span.trace_id, call_span.parent_id),
+            (request_span.trace_id, request_span.span_id)
+        )
+        self.assertIsNone(tracer.current_span())
+
+    def test_inline_without_pool(self):
+
+        self.app.notification_pool = None
+        self.release.set()
+        self.app.handle_request_string('{"jsonrpc": "2.0", "method": "notify", "params": [1]}', request_context=RequestContext())
+        self.assertEqual(self.log[0][2], threading.current_thread().name)
+        self.assertTrue(self.app.drain_notifications())
+
+
 class JSONPRCApplicationNonStandardJSONEncoderTestSuite(TestCase):
 
     def test_handle_request_string_non_standard_json_encoder(self):
@@ -0,0 +1,195 @@
+import socket
+import threading
+import time
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+
+from unittest import TestCase
+
+from jsonrpcparts.balancing import BalancingWebClient, CircuitBreaker, LatencyWindow, NoEndpointAvailableError
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def start_server(name, delay=0):
+    """Runs a stand-in replica answering `whoami` after `delay` seconds"""
+    calls = []
+
+    def whoami():
+        calls.append(name)
+        time.sleep(delay)
+        return name
+
+    app = JSONPRCWSGIApplication()
+    app.register_function(whoami)
+    server = make_server('127.0.0.1', 0, app, ThreadingWSGIServer, QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:%d/' % server.server_address[1], calls
+
+
+def unused_url():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return 'http://127.0.0.1:%d/' % port
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTestSuite(TestCase):
+
+    def test_states(self):
+
+        clock = Clock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.available())
+        self.assertFalse(breaker.acquire())
+
+        clock.now += 10
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.acquire())
+        # one trial at a time
+        self.assertFalse(breaker.acquire())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        clock.now += 10
+        self.assertTrue(breaker.acquire())
+        breaker.success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.acquire())
+
+    def test_latency_window(self):
+
+        window = LatencyWindow(size=100)
+        self.assertIsNone(window.percentile(95))
+        for value in range(200):
+            window.add(value)
+        self.assertEqual(window.percentile(0), 100)
+        self.assertEqual(window.percentile(100), 199)
+        self.assertEqual(window.percentile(50), 150)
+
+
+class BalancingWebClientTestSuite(TestCase):
+
+    def setUp(self):
+        super(BalancingWebClientTestSuite, self).setUp()
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        super(BalancingWebClientTestSuite, self).tearDown()
+
+    def start(self, name, delay=0):
+        server, url, calls = start_server(name, delay)
+        self.servers.append(server)
+        return url, calls
+
+    def test_least_outstanding(self):
+
+        urls = [self.start(name)[0] for name in 'abc']
+        client = BalancingWebClient(urls)
+        a, b, c = client.endpoints
+        a.outstanding, b.outstanding, c.outstanding = 2, 0, 1
+        self.assertEqual(client.call('whoami'), 'b')
+        self.assertEqual((a.outstanding, b.outstanding, c.outstanding), (2, 0, 1))
+        self.assertEqual(b.requests, 1)
+        self.assertIsNotNone(b.latency)
+
+        b.outstanding = 3
+        self.assertEqual(client.call('whoami'), 'c')
+
+    def test_power_of_two_choices(self):
+
+        urls = [self.start(name)[0] for name in 'abcd']
+        client = BalancingWebClient(urls, strategy=BalancingWebClient.POWER_OF_TWO)
+        # the busiest endpoint never wins a pair
+        client.endpoints[0].outstanding = 100
+        names = set(client.call('whoami') for _ in range(40))
+        self.assertNotIn('a', names)
+        self.assertTrue(len(names) > 1)
+
+        with self.assertRaises(ValueError):
+            BalancingWebClient(urls, strategy='round-robin')
+
+    def test_circuit_breaker(self):
+
+        url, calls = self.start('alive')
+        client = BalancingWebClient([unused_url(), url], failure_threshold=1, reset_timeout=60)
+        dead, alive = client.endpoints
+        alive.outstanding = 1
+
+        with self.assertRaises(requests.ConnectionError):
+            client.call('whoami')
+        self.assertEqual(dead.breaker.state, CircuitBreaker.OPEN)
+
+        alive.outstanding = 0
+        self.assertEqual([client.call('whoami') for _ in range(3)], ['alive'] * 3)
+        self.assertEqual(dead.requests, 1)
+
+        alive.breaker.failure()
+        with self.assertRaises(NoEndpointAvailableError):
+            client.call('whoami')
+
+    def test_idempotent_calls_fail_over(self):
+
+        url, calls = self.start('alive')
+        client = BalancingWebClient([unused_url(), url], idempotent_methods=['whoami'])
+        dead, alive = client.endpoints
+        alive.outstanding = 1
+
+        self.assertEqual(client.call('whoami'), 'alive')
+        self.assertEqual(client.failovers, 1)
+        self.assertEqual(alive.outstanding, 1)
+
+    def test_hedging(self):
+
+        slow_url, slow_calls = self.start('slow', delay=0.5)
+        fast_url, fast_calls = self.start('fast')
+        client = BalancingWebClient([slow_url, fast_url], idempotent_methods=['whoami'], hedge_delay=0.05)
+        slow, fast = client.endpoints
+        fast.outstanding = 1
+
+        started = time.time()
+        self.assertEqual(client.call('whoami'), 'fast')
+        self.assertTrue(time.time() - started < 0.4)
+        self.assertEqual((client.hedges, client.hedge_wins), (1, 1))
+        self.assertEqual((slow_calls, fast_calls), (['slow'], ['fast']))
+
+    def test_hedging_waits_for_latency_samples(self):
+
+        url, calls = self.start('a')
+        client = BalancingWebClient([url, self.start('b')[0]], idempotent_methods=['whoami'])
+        self.assertIsNone(client._hedge_after())
+        for _ in range(client.hedge_min_samples):
+            client.call('whoami')
+        self.assertIsNotNone(client._hedge_after())
+        self.assertEqual(client.hedges, 0)
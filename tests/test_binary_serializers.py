@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import json
+from io import BytesIO
+
+from unittest import TestCase, skipIf
+
+from jsonrpcparts import JSONPRCApplication, errors
+from jsonrpcparts.binaryserializers import MsgPackRPC20Serializer, CBORRPC20Serializer, msgpack, cbor2
+from jsonrpcparts.rawjson import RawJSON
+
+class BinarySerializerTestMixin(object):
+
+    serializer = None
+
+    def setUp(self):
+        super(BinarySerializerTestMixin, self).setUp()
+
+        def adder(*args):
+            return sum(args)
+
+        def cached(key):
+            return RawJSON('{"key": "%s"}' % key)
+
+        self.app = JSONPRCApplication(self.serializer)
+        self.app.register_function(adder)
+        self.app.register_function(cached)
+
+    def test_batch_round_trip(self):
+
+        serializer = self.serializer
+
+        request1 = serializer.assemble_request('adder', (2, 3))
+        request2 = serializer.assemble_request('cached', {'key': u'я'})
+        request3 = serializer.assemble_request('missing')
+        notification = serializer.assemble_request('adder', (1, 1), notification=True)
+
+        response_string = self.app.handle_request_string(
+            serializer.dumps([request1, request2, request3, notification])
+        )
+        responses, is_batch_mode = serializer.parse_response(response_string)
+
+        assert is_batch_mode
+        self.assertEqual(len(responses), 3)
+
+        result, request_id, error = responses[0]
+        assert not error
+        self.assertEqual((result, request_id), (5, request1['id']))
+
+        result, request_id, error = responses[1]
+        assert not error
+        self.assertEqual(result, {'key': u'я'})
+
+        result, request_id, error = responses[2]
+        assert isinstance(error, errors.RPCMethodNotFound)
+        self.assertEqual(request_id, request3['id'])
+
+    def test_strings_are_text_on_the_wire(self):
+
+        response = self.app.handle_request_string(self.serializer.dumps(
+            {'jsonrpc': '2.0', 'method': 'cached', 'params': ['k'], 'id': 'abc'}
+        ))
+        self.assertIn(self.text('jsonrpc'), response)
+        self.assertIn(self.text('result'), response)
+        self.assertIn(self.text('abc'), response)
+        self.assertNotIn(self.binary('jsonrpc'), response)
+
+        # bytes that are not UTF-8 text stay binary
+        self.assertIn(self.binary('\xff'), self.serializer.dumps(['\xff']))
+
+    def test_dump_batch(self):
+
+        serializer = self.serializer
+        output = BytesIO()
+
+        positions = serializer.dump_batch([('adder', [1, 2]), ('missing', None)], output)
+
+        responses = serializer.loads(self.app.handle_request_string(output.getvalue()))
+        self.assertEqual(positions, {1: 0, 2: 1})
+        self.assertEqual(responses[0]['result'], 3)
+        self.assertEqual(responses[1]['id'], 2)
+        self.assertEqual(responses[1]['error']['code'], errors.METHOD_NOT_FOUND)
+
+    def test_iter_parse_response(self):
+
+        output = BytesIO()
+        self.serializer.dump_batch([('adder', [1, 2]), ('missing', None)], output)
+        response = self.app.handle_request_string(output.getvalue())
+
+        parsed = list(self.serializer.iter_parse_response([response[:3], response[3:]]))
+        self.assertEqual(parsed[0], (3, 1, None))
+        self.assertIsInstance(parsed[1][2], errors.RPCMethodNotFound)
+
+    def test_parse_errors(self):
+
+        serializer = self.serializer
+
+        with self.assertRaises(errors.RPCParseError):
+            serializer.parse_request('\xff\xc1')
+
+        with self.assertRaises(errors.RPCInvalidRequest):
+            serializer.parse_request(serializer.dumps([]))
+
+        requests, is_batch_mode = serializer.parse_request(serializer.dumps([{}]))
+        method, params, request_id, error = requests[0]
+        assert isinstance(error, errors.RPCInvalidRequest)
+
+        response = serializer.loads(self.app.handle_request_string('\xc1'))
+        self.assertEqual(response['error']['code'], errors.PARSE_ERROR)
+
+
+@skipIf(msgpack is None, "msgpack is not installed")
+class MsgPackRPC20SerializerTestSuite(BinarySerializerTestMixin, TestCase):
+
+    serializer = MsgPackRPC20Serializer
+
+    @staticmethod
+    def text(value):
+        # fixstr
+        return chr(0xa0 | len(value)) + value
+
+    @staticmethod
+    def binary(value):
+        # bin 8
+        return '\xc4' + chr(len(value)) + value
+
+
+@skipIf(cbor2 is None, "cbor2 is not installed")
+class CBORRPC20SerializerTestSuite(BinarySerializerTestMixin, TestCase):
+
+    serializer = CBORRPC20Serializer
+
+    @staticmethod
+    def text(value):
+        # major type 3, text string
+        return chr(0x60 | len(value)) + value
+
+    @staticmethod
+    def binary(value):
+        # major type 2, byte string
+        return chr(0x40 | len(value)) + value
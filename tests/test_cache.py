@@ -0,0 +1,235 @@
+import json
+from StringIO import StringIO
+
+import mock
+import requests
+
+from unittest import TestCase
+
+from jsonrpcparts import errors
+from jsonrpcparts.cache import CachingWebClient, ResponseCache, canonical_params, parse_cache_control
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ResponseCacheTestSuite(TestCase):
+
+    def setUp(self):
+        super(ResponseCacheTestSuite, self).setUp()
+        self.clock = Clock()
+        self.cache = ResponseCache(ttls={'get': 10}, max_entries=3, clock=self.clock)
+
+    def test_keys(self):
+
+        self.assertEqual(self.cache.key('get', {'b': 1, 'a': (1, 2)}), self.cache.key('get', {'a': [1, 2], 'b': 1}))
+        self.assertNotEqual(self.cache.key('get', [1]), self.cache.key('get', [2]))
+        self.assertIsNone(self.cache.key('update', [1]))
+        self.assertIsNone(self.cache.key('get', [object()]))
+        self.assertEqual(canonical_params(None), '')
+
+    def test_ttl_and_stats(self):
+
+        key = self.cache.key('get', [1])
+        self.assertEqual(self.cache.lookup(key), (None, False))
+
+        self.cache.store(key, {'a': 1}, 10)
+        entry, fresh = self.cache.lookup(key)
+        self.assertTrue(fresh)
+        self.assertEqual(entry.result, {'a': 1})
+
+        self.clock.now += 10
+        self.assertEqual(self.cache.lookup(key), (None, False))
+        self.assertEqual(len(self.cache), 0)
+
+        self.assertEqual(
+            self.cache.stats(),
+            {'hits': 1, 'misses': 1, 'stale': 1, 'revalidated': 0, 'stores': 1, 'evictions': 0, 'entries': 0, 'bytes': 0}
+        )
+
+    def test_stale_entries_with_etag_are_kept(self):
+
+        key = self.cache.key('get', [1])
+        self.cache.store(key, 1, 0)
+        self.assertEqual(len(self.cache), 0)
+
+        self.cache.store(key, 1, 10, '"tag"', 'id-1')
+        self.clock.now += 20
+        entry, fresh = self.cache.lookup(key)
+        self.assertFalse(fresh)
+        self.assertEqual((entry.etag, entry.request_id), ('"tag"', 'id-1'))
+
+        self.cache.revalidated(key, 10)
+        self.assertTrue(self.cache.lookup(key)[1])
+
+    def test_lru_eviction(self):
+
+        keys = [self.cache.key('get', [index]) for index in range(4)]
+        for key in keys[:3]:
+            self.cache.store(key, 1, 10)
+        # used recently, so it survives
+        self.cache.lookup(keys[0])
+        self.cache.store(keys[3], 1, 10)
+
+        self.assertIsNone(self.cache.lookup(keys[1])[0])
+        for key in (keys[0], keys[2], keys[3]):
+            self.assertTrue(self.cache.lookup(key)[1])
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_size_limit(self):
+
+        cache = ResponseCache(default_ttl=10, max_bytes=100, clock=self.clock)
+        cache.store(cache.key('get', [1]), 'x' * 200, 10)
+        self.assertEqual(len(cache), 0)
+
+        for index in range(10):
+            cache.store(cache.key('get', [index]), 'x' * 30, 10)
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.stats()['bytes'] <= 100)
+
+    def test_invalidate(self):
+
+        cache = ResponseCache(default_ttl=10, clock=self.clock)
+        for method in ('a', 'b'):
+            for index in range(2):
+                cache.store(cache.key(method, [index]), index, 10)
+
+        cache.invalidate('a', [0])
+        self.assertEqual(len(cache), 3)
+        cache.invalidate('b')
+        self.assertEqual(len(cache), 1)
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+    def test_parse_cache_control(self):
+
+        self.assertEqual(parse_cache_control(None), (None, True))
+        self.assertEqual(parse_cache_control('public, max-age=60'), (60, True))
+        self.assertEqual(parse_cache_control('no-cache'), (0, True))
+        self.assertEqual(parse_cache_control('No-Store, max-age=bad'), (None, False))
+
+
+class ResponseMock(requests.Response):
+
+    def __init__(self, status, headers, body):
+        super(ResponseMock, self).__init__()
+        self.status_code = int(status.split()[0])
+        self.headers.update(headers)
+        self.raw = StringIO(body)
+
+
+class CachingWebClientTestSuite(TestCase):
+
+    def setUp(self):
+        super(CachingWebClientTestSuite, self).setUp()
+
+        self.calls = []
+
+        def get(key):
+            self.calls.append(key)
+            return self.data[key]
+
+        self.data = {'a': 1, 'b': 2}
+        self.app = JSONPRCWSGIApplication()
+        self.app.register_function(get)
+        self.app.register_function(lambda: 'pong', 'ping')
+        self.app.etags = True
+        self.response_headers = []
+
+        self.clock = Clock()
+        self.cache = ResponseCache(ttls={'get': 10}, clock=self.clock)
+        self.client = CachingWebClient('http://example.com/rpc', cache=self.cache)
+
+    def _post(self, url, data, headers, stream=False):
+        environ = {
+            'CONTENT_TYPE': headers['Content-Type'],
+            'wsgi.input': StringIO(data),
+        }
+        if 'If-None-Match' in headers:
+            environ['HTTP_IF_NONE_MATCH'] = headers['If-None-Match']
+        response = []
+
+        def start_response(status, headers):
+            response.extend([status, dict(headers + self.response_headers)])
+
+        body = ''.join(self.app(environ, start_response))
+        return ResponseMock(response[0], response[1], body)
+
+    def test_call(self):
+
+        with mock.patch('requests.post', side_effect=self._post) as mocked_post:
+            self.assertEqual(self.client.call('get', 'a'), 1)
+            self.assertEqual(self.client.call('get', key='a'), 1)
+            self.assertEqual(self.client.call('get', 'a'), 1)
+            self.assertEqual(mocked_post.call_count, 2)
+
+            # not cached methods and errors
+            self.assertEqual(self.client.call('ping'), 'pong')
+            self.assertEqual(self.client.call('ping'), 'pong')
+            for _ in range(2):
+                with self.assertRaises(errors.RPCError):
+                    self.client.call('get', 'missing')
+            self.assertEqual(mocked_post.call_count, 6)
+
+        self.assertEqual(self.calls, ['a', 'a', 'missing', 'missing'])
+
+    def test_revalidation(self):
+
+        with mock.patch('requests.post', side_effect=self._post) as mocked_post:
+            self.client.call('get', 'a')
+            self.clock.now += 20
+
+            self.assertEqual(self.client.call('get', 'a'), 1)
+            args, kw = mocked_post.call_args
+            self.assertIn('If-None-Match', kw['headers'])
+            self.assertEqual(self.cache.stats()['revalidated'], 1)
+
+            # fresh again
+            self.client.call('get', 'a')
+            self.assertEqual(mocked_post.call_count, 2)
+
+            self.data['a'] = 10
+            self.clock.now += 20
+            self.assertEqual(self.client.call('get', 'a'), 10)
+            self.assertEqual(self.client.call('get', 'a'), 10)
+            self.assertEqual(mocked_post.call_count, 3)
+
+    def test_server_cache_control(self):
+
+        with mock.patch('requests.post', side_effect=self._post) as mocked_post:
+            self.response_headers = [('Cache-Control', 'no-store')]
+            self.client.call('get', 'a')
+            self.client.call('get', 'a')
+            self.assertEqual(mocked_post.call_count, 2)
+
+            self.response_headers = [('Cache-Control', 'max-age=2')]
+            self.client.call('get', 'b')
+            self.clock.now += 3
+            self.assertFalse(self.cache.lookup(self.cache.key('get', ['b']))[1])
+
+    def test_call_bulk_sends_only_misses(self):
+
+        with mock.patch('requests.post', side_effect=self._post) as mocked_post:
+            self.client.call('get', 'a')
+
+            results = self.client.call_bulk([
+                ('get', ['a']), ('get', ['b']), ('ping', None), ('get', ['b']), ('get', ['missing'])
+            ])
+            self.assertEqual(results[:4], [1, 2, 'pong', 2])
+            self.assertIsInstance(results[4], errors.RPCError)
+
+            args, kw = mocked_post.call_args
+            self.assertEqual(
+                [(request['method'], request.get('params')) for request in json.loads(kw['data'])],
+                [('get', ['b']), ('get', ['missing']), ('ping', None)]
+            )
+
+            self.assertEqual(self.client.call_bulk([('get', ['a']), ('get', ['b'])]), [1, 2])
+            self.assertEqual(mocked_post.call_count, 2)
@@ -0,0 +1,109 @@
+import os
+import shutil
+import StringIO
+import tempfile
+
+from unittest import TestCase
+
+from jsonrpcparts import JSONRPC20Serializer
+from jsonrpcparts.capture import CaptureRecorder, GzipAppendFile, read_records, record_body
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+
+
+class CaptureTestSuite(TestCase):
+
+    def setUp(self):
+        super(CaptureTestSuite, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.jsonl.gz')
+
+        def add(a, b):
+            return a + b
+
+        self.app = JSONPRCWSGIApplication()
+        self.app.register_function(add)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(CaptureTestSuite, self).tearDown()
+
+    def post(self, body, content_type='application/json'):
+        environ = {
+            'wsgi.input': StringIO.StringIO(body),
+            'CONTENT_LENGTH': str(len(body)),
+            'CONTENT_TYPE': content_type,
+            'HTTP_ACCEPT': 'application/json'
+        }
+        return ''.join(self.app(environ, lambda status, headers: None))
+
+    def test_records_requests_and_responses(self):
+
+        self.app.recorder = CaptureRecorder(self.path, record_responses=True, clock=iter([10.0, 10.5]).next)
+        body = JSONRPC20Serializer.json_dumps(JSONRPC20Serializer.assemble_request('add', [1, 2]))
+        response = self.post(body)
+        self.post('{"jsonrpc": "2.0", "method": "add", "params": [1, 1]}')
+        self.app.recorder.close()
+
+        records = list(read_records(self.path))
+        self.assertEqual([record['time'] for record in records], [10.0, 10.5])
+        self.assertEqual(record_body(records[0], 'request'), body)
+        self.assertEqual(record_body(records[0], 'response'), response)
+        self.assertEqual(records[0]['content_type'], 'application/json')
+        self.assertEqual(records[0]['accept'], 'application/json')
+        # notifications have no response
+        self.assertIsNone(record_body(records[1], 'response'))
+
+    def test_sampling(self):
+
+        recorder = CaptureRecorder(StringIO.StringIO(), sample_rate=0)
+        self.assertFalse(recorder.record('application/json', '{}'))
+        recorder.close()
+        self.assertEqual(recorder.writer.written, 0)
+
+    def test_binary_bodies(self):
+
+        output = StringIO.StringIO()
+        recorder = CaptureRecorder(output, record_responses=True)
+        recorder.record('application/msgpack', '\x93\xff\x00', '\xc0')
+        recorder.close()
+
+        path = os.path.join(self.directory, 'capture.jsonl')
+        with open(path, 'w') as capture_file:
+            capture_file.write(output.getvalue())
+        record, = read_records(path)
+        self.assertIn('request_base64', record)
+        self.assertEqual(record_body(record, 'request'), '\x93\xff\x00')
+        self.assertEqual(record_body(record, 'response'), '\xc0')
+        self.assertNotIn('accept', record)
+
+    def test_reads_up_to_damaged_end(self):
+
+        capture_file = GzipAppendFile(self.path)
+        capture_file.write('{"n": 1}\n')
+        capture_file.write('{"n": 2}\n')
+        capture_file.close()
+        with open(self.path, 'rb') as complete:
+            data = complete.read()
+
+        # members end inside chunks and on their edges alike
+        for chunk_size in (1, 7, len(data) / 2, 65536):
+            for cut in (1, 5, 20):
+                with open(self.path, 'wb') as damaged:
+                    damaged.write(data[:-cut])
+                self.assertEqual([record['n'] for record in read_records(self.path, chunk_size)], [1])
+
+            with open(self.path, 'wb') as damaged:
+                damaged.write(data + '{"n": 3')
+            self.assertEqual([record['n'] for record in read_records(self.path, chunk_size)], [1, 2])
+
+    def test_reads_as_records_are_taken(self):
+
+        capture_file = GzipAppendFile(self.path)
+        for number in range(100):
+            capture_file.write('{"n": %d}\n' % number)
+        capture_file.close()
+
+        records = read_records(self.path, chunk_size=64)
+        self.assertEqual(next(records)['n'], 0)
+        self.assertLess(records.gi_frame.f_locals['capture_file'].tell(), os.path.getsize(self.path))
+        self.assertEqual([record['n'] for record in records], range(1, 100))
@@ -6,7 +6,7 @@ from StringIO import StringIO
 
 from unittest import TestCase
 
-from jsonrpcparts import Client, JSONRPC20Serializer, WebClient
+from jsonrpcparts import Client, JSONRPC20Serializer, WebClient, compression, errors
 from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
 
 class ResponseMock(requests.Response):
@@ -84,7 +84,7 @@ class JSONPRCWebClientTestSuite(TestCase):
                     "jsonrpc": "2.0",
                     'params':['a', 'b']
                 }),
-                headers={'Content-Type': 'application/json'},
+                headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
             )
 
     def test_requests_is_called_correctly_for_call(self):
@@ -108,7 +108,7 @@ class JSONPRCWebClientTestSuite(TestCase):
 
             self.assertEqual(
                 kw['headers'],
-                {'Content-Type': 'application/json'}
+                {'Content-Type': 'application/json', 'Accept': 'application/json'}
             )
 
             data = json.loads(kw['data'])
@@ -126,3 +126,114 @@ class JSONPRCWebClientTestSuite(TestCase):
                 result,
                 'result'
             )
+
+
+    def test_compresses_requests(self):
+
+        client = WebClient(self.url, content_encoding='gzip')
+        body = JSONRPC20Serializer.json_dumps({'jsonrpc': '2.0', 'result': 'x' * 2000, 'id': 1})
+        if compression.zstandard is not None:
+            # server is asked for zstd, so client has to decode it
+            response = ResponseMock(200, compression.compress(body, 'zstd'), 'application/json')
+            response.headers['Content-Encoding'] = 'zstd'
+        else:
+            response = ResponseMock(200, body, 'application/json')
+
+        with mock.patch('requests.post', return_value=response) as mocked_post:
+            self.assertEqual(client.call('method_name', 'y' * 2000), 'x' * 2000)
+
+            args, kw = mocked_post.call_args
+            self.assertEqual(kw['headers']['Content-Encoding'], 'gzip')
+            self.assertEqual(
+                kw['headers']['Accept-Encoding'],
+                ', '.join(compression.available_encodings())
+            )
+            data = json.loads(compression.decompress(kw['data'], 'gzip'))
+            self.assertEqual(data['params'], ['y' * 2000])
+
+        with mock.patch('requests.post', return_value=ResponseMock(200)) as mocked_post:
+            client.notify('method_name', 'short')
+
+            args, kw = mocked_post.call_args
+            self.assertNotIn('Content-Encoding', kw['headers'])
+            self.assertEqual(json.loads(kw['data'])['params'], ['short'])
+
+
+class JSONPRCWebClientBulkTestSuite(TestCase):
+
+    def setUp(self):
+        super(JSONPRCWebClientBulkTestSuite, self).setUp()
+
+        self.server_app = JSONPRCWSGIApplication()
+        self.server_app.register_function(lambda a, b: a + b, 'add')
+        self.client = WebClient('http://example.com/rpc')
+
+    def _post(self, url, data, headers, stream=False):
+        return ResponseMock(200, self.server_app.handle_request_string(data) or '', 'application/json')
+
+    def test_call_bulk(self):
+
+        with mock.patch('requests.post', side_effect=self._post) as mocked_post:
+            results = self.client.call_bulk(('add', [index, 1]) for index in range(100))
+            self.assertEqual(results, range(1, 101))
+
+            results = self.client.call_bulk([('add', {'a': 1, 'b': 2}), ('missing', None), ('add', [1])])
+            self.assertEqual(results[0], 3)
+            self.assertIsInstance(results[1], errors.RPCMethodNotFound)
+            self.assertIsInstance(results[2], errors.RPCInternalError)
+
+            # ids keep counting across batches
+            args, kw = mocked_post.call_args
+            self.assertEqual([request['id'] for request in json.loads(kw['data'])], [101, 102, 103])
+
+    def test_notify_bulk(self):
+
+        notified = []
+        self.server_app.register_function(notified.append, 'remember')
+
+        with mock.patch('requests.post', side_effect=self._post):
+            self.assertEqual(self.client.notify_bulk(('remember', [index]) for index in range(3)), None)
+
+        self.assertEqual(notified, [0, 1, 2])
+
+    def test_iter_call_bulk(self):
+
+        with mock.patch('requests.post', side_effect=self._post) as mocked_post:
+            results = self.client.iter_call_bulk([('add', [1, 2]), ('missing', None), ('add', [1])])
+            # nothing is sent until the results are asked for
+            self.assertFalse(mocked_post.called)
+
+            results = dict(results)
+            self.assertEqual(results[0], 3)
+            self.assertIsInstance(results[1], errors.RPCMethodNotFound)
+            self.assertIsInstance(results[2], errors.RPCInternalError)
+            args, kw = mocked_post.call_args
+            self.assertTrue(kw['stream'])
+
+        self.client.stream_chunk_size = 10
+        with mock.patch('requests.post', side_effect=self._post):
+            results = list(self.client.iter_call_bulk(('add', [index, 1]) for index in range(100)))
+            self.assertEqual(sorted(results), [(index, index + 1) for index in range(100)])
+
+    def test_iter_call_bulk_whole_batch_error(self):
+
+        response = ResponseMock(200, json.dumps({
+            'jsonrpc': '2.0', 'error': {'code': -32600, 'message': 'Invalid Request'}, 'id': None
+        }), 'application/json')
+        with mock.patch('requests.post', return_value=response):
+            with self.assertRaises(errors.RPCInvalidRequest):
+                list(self.client.iter_call_bulk([('add', [1, 2])]))
+
+    def test_iter_call_bulk_zstd_response(self):
+
+        if 'zstd' not in compression.available_encodings():
+            self.skipTest('zstandard is not installed')
+
+        def post(url, data, headers, stream=False):
+            body = compression.compress(self.server_app.handle_request_string(data), 'zstd')
+            response = ResponseMock(200, body, 'application/json')
+            response.headers['Content-Encoding'] = 'zstd'
+            return response
+
+        with mock.patch('requests.post', side_effect=post):
+            self.assertEqual(list(self.client.iter_call_bulk([('add', [1, 2])])), [(0, 3)])
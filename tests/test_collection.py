@@ -1,4 +1,5 @@
 import json
+import threading
 import time
 
 from unittest import TestCase
@@ -98,3 +99,196 @@ class JSONPRCCollectionTestSuite(TestCase):
                 'alternate_prefix.handler_one', 'alternate_prefix.handler_two'
             }
         )
+
+    def test_register_class_skips_non_callables(self):
+
+        class A(object):
+            counter = 5
+            name = 'a'
+
+            def handler(self):
+                pass
+
+        collection = JSONPRCCollection()
+        collection.register_class(A(), 'a')
+        self.assertEqual(set(collection.keys()), {'a.handler'})
+
+
+class JSONPRCCollectionNamespaceTestSuite(TestCase):
+
+    class Users(object):
+        limit = 10
+
+        def get(self, user_id):
+            return user_id
+
+        def _private(self):
+            pass
+
+        class Nested(object):
+            pass
+
+    def test_methods_are_resolved_on_first_use(self):
+
+        collection = JSONPRCCollection()
+        users = self.Users()
+        collection.register_namespace('users', users)
+        self.assertEqual(len(collection), 0)
+
+        self.assertEqual(collection.resolve_method('users.get'), users.get)
+        # remembered by the dispatch table, not added to the collection
+        self.assertEqual(collection._dispatch_table().resolved.keys(), ['users.get'])
+        self.assertEqual(len(collection), 0)
+
+        for name in ('users.limit', 'users._private', 'users.Nested', 'users.missing', 'users', 'users.', 'others.get',
+                     'users.get.im_func'):
+            self.assertIsNone(collection.resolve_method(name), name)
+        self.assertEqual(collection._dispatch_table().resolved.keys(), ['users.get'])
+
+        with self.assertRaises(ValueError):
+            collection.register_namespace('', users)
+
+    def test_longest_prefix_wins(self):
+
+        api, users = self.Users(), self.Users()
+        collection = JSONPRCCollection()
+        collection.register_namespace('api', api)
+        collection.register_namespace('api.v2.users', users)
+
+        self.assertEqual(collection.resolve_method('api.get'), api.get)
+        self.assertEqual(collection.resolve_method('api.v2.users.get'), users.get)
+        self.assertIsNone(collection.resolve_method('api.v2.get'))
+
+    def test_mounted_collections(self):
+
+        def ping():
+            return 'pong'
+
+        inner = JSONPRCCollection()
+        inner.register_function(ping)
+        inner.register_namespace('users', self.Users())
+
+        collection = JSONPRCCollection()
+        collection.register_namespace('inner', inner)
+
+        self.assertEqual(collection.resolve_method('inner.ping'), ping)
+        self.assertIsNotNone(collection.resolve_method('inner.users.get'))
+        self.assertIsNone(collection.resolve_method('inner.missing'))
+
+    def test_reregistering_namespace_drops_resolved_methods(self):
+
+        first, second = self.Users(), self.Users()
+        collection = JSONPRCCollection()
+        collection.register_function(len, 'users.count')
+        collection.register_namespace('users', first)
+        self.assertEqual(collection.resolve_method('users.get'), first.get)
+
+        collection.register_namespace('users', second)
+        self.assertEqual(collection.resolve_method('users.get'), second.get)
+        # registered directly, stays
+        self.assertEqual(collection['users.count'], len)
+
+
+class JSONPRCCollectionDispatchTableTestSuite(TestCase):
+
+    def test_changes_build_new_table(self):
+
+        collection = JSONPRCCollection()
+        collection.register_function(len)
+        table = collection._dispatch_table()
+        self.assertIs(collection._dispatch_table(), table)
+
+        # every way of changing the collection is seen
+        changes = [
+            lambda: collection.register_function(sum),
+            lambda: collection.__setitem__('max', max),
+            lambda: collection.update(min=min),
+            lambda: collection.setdefault('abs', abs),
+            lambda: collection.pop('abs'),
+            lambda: collection.__delitem__('min'),
+            lambda: collection.register_namespace('ns', object()),
+            lambda: collection.popitem(),
+            lambda: collection.clear(),
+        ]
+        for change in changes:
+            change()
+            new_table = collection._dispatch_table()
+            self.assertIsNot(new_table, table)
+            self.assertEqual(new_table.methods, dict(collection))
+            table = new_table
+
+    def test_old_table_is_not_changed(self):
+
+        collection = JSONPRCCollection()
+        collection.register_function(len, params_schema={'type': 'array'})
+        table = collection._dispatch_table()
+
+        collection.register_function(sum, 'len')
+        collection.register_function(max)
+
+        self.assertEqual(table.lookup('len')[0], len)
+        self.assertIsNotNone(table.lookup('len')[1])
+        self.assertEqual(table.lookup('max'), (None, None))
+        self.assertEqual(collection._dispatch_table().lookup('len'), (sum, None))
+
+    def test_replace(self):
+
+        collection = JSONPRCCollection()
+        collection.register_function(len, params_schema={'type': 'array'})
+        collection.register_namespace('old', object())
+        table = collection._dispatch_table()
+
+        new = JSONPRCCollection()
+        new.register_function(sum, params_schema={'type': 'array'})
+        new.register_namespace('users', JSONPRCCollectionNamespaceTestSuite.Users())
+        collection.replace(new)
+
+        self.assertEqual(collection.keys(), ['sum'])
+        self.assertEqual(collection._validators.keys(), ['sum'])
+        self.assertEqual(collection._namespaces.keys(), ['users'])
+        self.assertIsNotNone(collection.resolve_method('users.get'))
+        self.assertIsNone(collection.resolve_method('len'))
+        # requests already being processed keep the old methods
+        self.assertEqual(table.lookup('len')[0], len)
+
+        # the collections stay independent
+        new.register_function(max)
+        self.assertNotIn('max', collection)
+        self.assertIsNone(collection.resolve_method('max'))
+
+    def test_readers_see_whole_changes(self):
+
+        def first():
+            return 1
+
+        def second():
+            return 2
+
+        collection = JSONPRCCollection()
+        collection.register_function(first, 'a')
+        collection.register_function(first, 'b')
+        stop = []
+        mixed = []
+
+        def read():
+            while not stop:
+                table = collection._dispatch_table()
+                if table.lookup('a')[0] is not table.lookup('b')[0]:
+                    mixed.append(table)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            for _ in range(500):
+                new = JSONPRCCollection()
+                new.register_function(second, 'a')
+                new.register_function(second, 'b')
+                collection.replace(new)
+                collection.replace(JSONPRCCollection(a=first, b=first))
+        finally:
+            stop.append(True)
+            for reader in readers:
+                reader.join()
+
+        self.assertEqual(mixed, [])
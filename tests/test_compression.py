@@ -0,0 +1,70 @@
+import zlib
+
+from unittest import TestCase, skipIf
+
+from jsonrpcparts import compression
+
+
+class CompressionTestSuite(TestCase):
+
+    data = '{"jsonrpc": "2.0", "result": "%s", "id": 1}' % ('abc' * 1000)
+
+    def test_round_trips(self):
+        for encoding in compression.available_encodings():
+            compressed = compression.compress(self.data, encoding)
+            self.assertTrue(len(compressed) < len(self.data))
+            self.assertEqual(compression.decompress(compressed, encoding), self.data)
+            self.assertEqual(
+                compression.decompress(''.join(compression.iter_compress([self.data[:100], self.data[100:]], encoding)), encoding),
+                self.data
+            )
+
+    def test_iter_decompress(self):
+        for encoding in compression.available_encodings():
+            compressed = compression.compress(self.data, encoding)
+            chunks = [compressed[index:index + 7] for index in range(0, len(compressed), 7)]
+            self.assertEqual(''.join(compression.iter_decompress(chunks, encoding)), self.data)
+            with self.assertRaises(ValueError):
+                list(compression.iter_decompress(['definitely not compressed'], encoding))
+
+    def test_raw_deflate_is_accepted(self):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        compressed = compressor.compress(self.data) + compressor.flush()
+        self.assertEqual(compression.decompress(compressed, 'deflate'), self.data)
+
+    def test_decompress_limits_size(self):
+        for encoding in compression.available_encodings():
+            compressed = compression.compress(self.data, encoding)
+            with self.assertRaises(ValueError):
+                compression.decompress(compressed, encoding, max_size=100)
+            self.assertEqual(compression.decompress(compressed, encoding, max_size=len(self.data)), self.data)
+
+    def test_corrupt_data(self):
+        for encoding in compression.available_encodings():
+            with self.assertRaises(ValueError):
+                compression.decompress('definitely not compressed', encoding)
+
+    def test_normalize_encoding(self):
+        self.assertEqual(compression.normalize_encoding(' GZIP'), 'gzip')
+        self.assertEqual(compression.normalize_encoding('x-gzip'), 'gzip')
+        self.assertEqual(compression.normalize_encoding('identity'), None)
+        self.assertEqual(compression.normalize_encoding(''), None)
+        with self.assertRaises(ValueError):
+            compression.normalize_encoding('br')
+
+    def test_choose_encoding(self):
+        choose = compression.choose_encoding
+        encodings = ['zstd', 'gzip', 'deflate']
+
+        self.assertEqual(choose(None, encodings), None)
+        self.assertEqual(choose('gzip, deflate', encodings), 'gzip')
+        self.assertEqual(choose('deflate, gzip;q=0.5', encodings), 'deflate')
+        self.assertEqual(choose('*', encodings), 'zstd')
+        self.assertEqual(choose('*, zstd;q=0', encodings), 'gzip')
+        self.assertEqual(choose('br, identity', encodings), None)
+        self.assertEqual(choose('zstd', ['gzip', 'deflate']), None)
+
+    @skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd_is_preferred(self):
+        self.assertEqual(compression.available_encodings()[0], 'zstd')
+        self.assertEqual(compression.choose_encoding('gzip, zstd'), 'zstd')
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from unittest import TestCase
+
+from jsonrpcparts import JSONPRCApplication, JSONRPC20Serializer
+from jsonrpcparts.context import RequestContext, RequestContextPool, takes_request_context
+
+
+class RequestContextTestSuite(TestCase):
+
+    def test_deadline(self):
+
+        context = RequestContext({'PATH_INFO': '/'})
+        self.assertIsNone(context.remaining())
+        self.assertFalse(context.expired())
+
+        context.deadline = time.time() + 60
+        self.assertTrue(55 < context.remaining() <= 60)
+        self.assertFalse(context.expired())
+
+        context.deadline = time.time() - 1
+        self.assertTrue(context.expired())
+
+    def test_reset(self):
+
+        context = RequestContext({'PATH_INFO': '/'})
+        context.auth = 'alice'
+        context.data = {'key': 'value'}
+        context.reset()
+
+        for name in ('environ', 'deadline', 'auth', 'span', 'metrics', 'data'):
+            self.assertIsNone(getattr(context, name), name)
+        with self.assertRaises(AttributeError):
+            context.anything = 1
+
+    def test_copy(self):
+
+        class AuthContext(RequestContext):
+            __slots__ = ('user',)
+
+        context = AuthContext({'PATH_INFO': '/'})
+        context.user = 'alice'
+        context.data = {'key': 'value'}
+        copy = context.copy()
+        context.reset()
+
+        self.assertIsInstance(copy, AuthContext)
+        self.assertEqual((copy.environ, copy.user, copy.data), ({'PATH_INFO': '/'}, 'alice', {'key': 'value'}))
+        copy.data['key'] = 'other'
+        self.assertIsNone(context.data)
+
+    def test_application_passes_context_by_reference(self):
+
+        @takes_request_context
+        def marked(value, request_context):
+            return request_context.data['seen']
+
+        def plain(value):
+            return value
+
+        app = JSONPRCApplication()
+        app.register_function(marked)
+        app.register_function(plain)
+        context = RequestContext()
+        context.data = {'seen': 'context'}
+
+        request = JSONRPC20Serializer.json_dumps([
+            JSONRPC20Serializer.assemble_request('marked', [1]),
+            JSONRPC20Serializer.assemble_request('plain', [2])
+        ])
+        responses = JSONRPC20Serializer.json_loads(app.handle_request_string(request, request_context=context))
+        self.assertEqual([response['result'] for response in responses], ['context', 2])
+
+        # without a context, the method gets none
+        response = JSONRPC20Serializer.json_loads(app.handle_request_string(
+            JSONRPC20Serializer.json_dumps(JSONRPC20Serializer.assemble_request('marked', [1]))
+        ))
+        self.assertIn('error', response)
+
+
+class RequestContextPoolTestSuite(TestCase):
+
+    def test_reuse(self):
+
+        pool = RequestContextPool(max_size=1)
+        first = pool.acquire({'n': 1})
+        second = pool.acquire({'n': 2})
+        self.assertIsNot(first, second)
+        self.assertEqual(first.environ, {'n': 1})
+
+        pool.release(first)
+        pool.release(second)
+        # references are dropped on release
+        self.assertIsNone(first.environ)
+
+        third = pool.acquire({'n': 3})
+        self.assertIs(third, first)
+        self.assertEqual(third.environ, {'n': 3})
+        # only max_size of them are kept
+        self.assertIsNot(pool.acquire(), second)
+
+    def test_threads_have_own_contexts(self):
+
+        class Context(RequestContext):
+            __slots__ = ('user',)
+
+        pool = RequestContextPool(Context)
+        mine = pool.acquire()
+        self.assertIsInstance(mine, Context)
+        pool.release(mine)
+
+        theirs = []
+        thread = threading.Thread(target=lambda: theirs.append(pool.acquire()))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(theirs[0], mine)
+        self.assertIs(pool.acquire(), mine)
@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+
+from unittest import TestCase
+
+import jsonrpcparts
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(jsonrpcparts.__file__)))
+
+
+def run_python(code):
+    """Runs code in a fresh interpreter, returns what it prints (JSON) decoded"""
+    environment = dict(os.environ, PYTHONPATH=PACKAGE_ROOT)
+    return json.loads(subprocess.check_output([sys.executable, '-c', code], env=environment))
+
+
+LOADED_MODULES = """
+import json, sys
+before = set(sys.modules)
+import %s
+print json.dumps({
+    'modules': sorted(name for name in set(sys.modules) - before if sys.modules[name] is not None)
+})
+"""
+
+# slow to import, and needed only by clients (or not at all)
+HEAVY_MODULES = ('requests', 'uuid', 'ctypes', 'inspect', 'random')
+
+
+class PackageImportTestSuite(TestCase):
+
+    def test_server_side_import_does_not_load_client_dependencies(self):
+
+        loaded = run_python(LOADED_MODULES % 'jsonrpcparts')['modules']
+
+        self.assertIn('jsonrpcparts.application', loaded)
+        for name in ('jsonrpcparts.client',) + HEAVY_MODULES:
+            self.assertNotIn(name, loaded)
+
+    def test_lazy_names(self):
+
+        loaded = run_python("""
+import json, sys
+import jsonrpcparts
+from jsonrpcparts import WebClient, compression
+client = WebClient('http://localhost/')
+print json.dumps({
+    'client': 'jsonrpcparts.client' in sys.modules,
+    'requests': 'requests' in sys.modules,
+    'same': WebClient is jsonrpcparts.client.WebClient is jsonrpcparts.WebClient,
+    'dir': 'Client' in dir(jsonrpcparts)
+})
+""")
+        # requests is imported on the first HTTP request, not with the client
+        self.assertEqual(loaded, {'client': True, 'requests': False, 'same': True, 'dir': True})
+
+        with self.assertRaises(AttributeError):
+            jsonrpcparts.NoSuchName
+
+    def test_star_import(self):
+
+        names = run_python("""
+import json
+from jsonrpcparts import *
+print json.dumps(sorted(name for name in globals() if not name.startswith('_')))
+""")
+        self.assertEqual(names, [
+            'Client', 'JSONPRCApplication', 'JSONPRCCollection', 'JSONRPC10Serializer', 'JSONRPC20Serializer',
+            'WebClient', 'errors', 'json'
+        ])
+
+    def test_wsgi_application_import_does_not_load_heavy_modules(self):
+
+        # the package used to import `requests`, which took most of its import time
+        loaded = run_python(LOADED_MODULES % 'jsonrpcparts.wsgiapplication')['modules']
+
+        self.assertIn('jsonrpcparts.wsgiapplication', loaded)
+        for name in HEAVY_MODULES:
+            self.assertNotIn(name, loaded)
@@ -0,0 +1,122 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from unittest import TestCase
+
+from jsonrpcparts import JSONPRCApplication, errors
+from jsonrpcparts.localtransport import (
+    LocalClient, LocalFraming, SharedRing, make_local_server
+)
+from jsonrpcparts.streaming import handle_stream
+
+
+class SharedRingTestSuite(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        writer = SharedRing.create(SharedRing.data_offset + 10, self.directory)
+        self.writer = writer
+        self.reader = SharedRing(writer.path)
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+        shutil.rmtree(self.directory)
+
+    def test_wraps_around(self):
+        self.assertEqual(self.writer.write('abcdef'), 0)
+        self.assertEqual(self.reader.read(0, 6), 'abcdef')
+
+        # 4 bytes left before the end of the data area, the rest wraps to its start
+        self.assertEqual(self.writer.write('0123456789'), 6)
+        self.assertEqual(self.reader.read(6, 10), '0123456789')
+        self.assertEqual(self.writer.consumed, 16)
+
+    def test_refuses_messages_that_do_not_fit(self):
+        self.assertEqual(self.writer.write('abcdef'), 0)
+        self.assertEqual(self.writer.write('ghijk'), None)
+        self.assertEqual(self.writer.write('0123456789a'), None)
+
+        self.reader.read(0, 6)
+        self.assertEqual(self.writer.write('ghijk'), 6)
+
+
+class LocalTransportTestSuite(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'rpc.sock')
+
+        self.app = JSONPRCApplication()
+        self.app.register_function(lambda data: data[::-1], 'reverse')
+        self.app.register_function(lambda *args: sum(args), 'adder')
+
+        self.server = make_local_server(self.app, self.path)
+        thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_calls_over_socket_only(self):
+        client = LocalClient.connect(self.path, timeout=5)
+        self.assertFalse(client.uses_shared_memory)
+
+        self.assertEqual(client.call('adder', 1, 2), 3)
+        self.assertEqual(client.call('reverse', 'x' * 100000 + 'y'), 'y' + 'x' * 100000)
+        with self.assertRaises(errors.RPCMethodNotFound):
+            client.call('missing')
+        client.close()
+
+    def test_large_messages_go_through_shared_memory(self):
+        client = LocalClient.connect(self.path, timeout=5, shm_size=256 * 1024, shm_directory=self.directory)
+        self.assertTrue(client.uses_shared_memory)
+        # ring files are unlinked once both sides mapped them
+        self.assertEqual(os.listdir(self.directory), ['rpc.sock'])
+
+        data = 'abc' * 30000
+        ring = client._stream.send_ring
+        for _ in range(5):
+            # every call moves the offsets, so they wrap around the ring
+            self.assertEqual(client.call('reverse', data), data[::-1])
+        self.assertTrue(ring.produced > ring.capacity)
+
+        self.assertEqual(client.call('adder', 1, 2), 3)
+
+        # too large for the ring, falls back to inline frame
+        data = 'z' * 300000
+        self.assertEqual(client.call('reverse', data), data)
+        client.close()
+
+    def test_server_refuses_foreign_files(self):
+        server_socket, client_socket = socket.socketpair()
+
+        def serve():
+            try:
+                handle_stream(self.app, server_socket.makefile('rb', -1), server_socket.makefile('wb', -1), LocalFraming)
+            finally:
+                server_socket.close()
+
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+
+        client = LocalClient.from_socket(client_socket, LocalFraming)
+        victim = os.path.join(self.directory, 'important.txt')
+        with open(victim, 'w') as victim_file:
+            victim_file.write('x' * 1000)
+
+        framing = client._stream
+        framing._write_frame(0x40000000, '{"rings": ["%s", "%s"]}' % (victim, victim))
+        flags, reply = framing._read_frame()
+        self.assertIn('"attached": false', reply)
+
+        self.assertEqual(client.call('adder', 2, 2), 4)
+        client.close()
+        thread.join(5)
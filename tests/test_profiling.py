@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import time
+
+from unittest import TestCase
+
+from jsonrpcparts import JSONPRCApplication, JSONRPC20Serializer
+from jsonrpcparts.profiling import CallProfiler
+
+
+def fast(a):
+    return a
+
+
+def slow_inner():
+    time.sleep(0.1)
+
+
+def slow():
+    slow_inner()
+    return 'done'
+
+
+class CallProfilerTestSuite(TestCase):
+
+    def setUp(self):
+        super(CallProfilerTestSuite, self).setUp()
+        self.app = JSONPRCApplication()
+        self.app.register_function(fast)
+        self.app.register_function(slow)
+        self.profiler = None
+
+    def tearDown(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+        super(CallProfilerTestSuite, self).tearDown()
+
+    def use(self, **options):
+        self.profiler = CallProfiler(**options)
+        self.app.add_call_middleware(self.profiler)
+        return self.profiler
+
+    def call(self, method, *params):
+        return JSONRPC20Serializer.json_loads(self.app.handle_request_string(
+            JSONRPC20Serializer.json_dumps(JSONRPC20Serializer.assemble_request(method, list(params)))
+        ))['result']
+
+    def test_cprofile_sampling(self):
+
+        profiler = self.use(sample_rate=1.0)
+        self.assertEqual(self.call('fast', 1), 1)
+        self.assertEqual(self.call('fast', 2), 2)
+
+        self.assertEqual(profiler.profiled, 2)
+        self.assertEqual(profiler.methods(), ['fast'])
+        stats = profiler.stats('fast')
+        called = [function for (filename, line, function) in stats.stats]
+        self.assertIn('fast', called)
+        self.assertEqual(stats.total_calls >= 2, True)
+        self.assertIsNone(profiler.stats('slow'))
+        # no sampler without slow calls to watch for
+        self.assertIsNone(profiler._sampler)
+
+    def test_nothing_picked(self):
+
+        profiler = self.use(sample_rate=0)
+        self.call('fast', 1)
+        self.assertEqual((profiler.profiled, profiler.methods()), (0, []))
+
+    def test_slow_calls_get_sampled(self):
+
+        profiler = self.use(sample_rate=0, slow_threshold=0.02, sampler_interval=0.005)
+        self.assertEqual(self.call('slow'), 'done')
+        self.call('fast', 1)
+
+        self.assertEqual(profiler.slow, 1)
+        self.assertEqual(profiler.methods(), ['slow'])
+        self.assertGreater(profiler.samples, 0)
+        lines = profiler.collapsed('slow').splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        frames = stack.split(';')
+        self.assertEqual(frames[0], 'slow')
+        self.assertTrue(frames[-1].startswith('slow_inner_(test_profiling.py:'), frames)
+        self.assertGreater(int(count), 0)
+        self.assertEqual(profiler._running, {})
+
+    def test_sampler_mode(self):
+
+        profiler = self.use(sample_rate=1.0, mode=CallProfiler.SAMPLER, sampler_interval=0.005)
+        self.call('slow')
+        self.assertIsNone(profiler.stats('slow'))
+        self.assertIn('slow_inner', profiler.collapsed('slow'))
+
+        with self.assertRaises(ValueError):
+            CallProfiler(mode='magic')
+
+    def test_max_stacks(self):
+
+        profiler = self.use(sample_rate=1.0, mode=CallProfiler.SAMPLER, sampler_interval=0.005, max_stacks=0)
+        self.call('slow')
+        self.assertEqual(profiler.collapsed('slow'), '')
+        self.assertEqual(profiler.dropped, profiler.samples)
+
+    def test_dump(self):
+
+        profiler = self.use(sample_rate=1.0)
+        self.call('fast', 1)
+        profiler.mode = CallProfiler.SAMPLER
+        self.call('slow')
+
+        directory = tempfile.mkdtemp()
+        try:
+            paths = profiler.dump(directory)
+            self.assertEqual(sorted(os.path.basename(path) for path in paths), [
+                'fast.pstats', 'slow.collapsed'
+            ])
+            with open(os.path.join(directory, 'slow.collapsed')) as collapsed:
+                self.assertEqual(collapsed.read(), profiler.collapsed('slow'))
+        finally:
+            shutil.rmtree(directory)
+
+        profiler.reset()
+        self.assertEqual(profiler.methods(), [])
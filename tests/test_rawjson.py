@@ -0,0 +1,106 @@
+import json
+
+from unittest import TestCase
+
+from jsonrpcparts.rawjson import RawJSON, iter_batch_elements, loads_keeping_raw, skip_container
+
+class RawJSONScanTestSuite(TestCase):
+
+    def test_skip_container(self):
+
+        text = '{"a": [1, "]}", {"b": "\\"}"}], "c": {}} tail'
+        end = skip_container(text, 0)
+        self.assertEqual(text[end:], ' tail')
+        self.assertEqual(json.loads(text[:end]), {'a': [1, ']}', {'b': '"}'}], 'c': {}})
+
+        with self.assertRaises(ValueError):
+            skip_container('[1, [2, 3]', 0)
+
+        with self.assertRaises(ValueError):
+            skip_container('["abc]', 0)
+
+    def test_loads_keeping_raw_single_object(self):
+
+        text = ' { "jsonrpc" : "2.0", "method": "m", "params" : [1, {"x": "[{"}] , "id": 7 } '
+        data = loads_keeping_raw(text, ('params',), json.JSONDecoder())
+
+        self.assertEqual(
+            {'jsonrpc': '2.0', 'method': 'm', 'id': 7, 'params': RawJSON('[1, {"x": "[{"}]')},
+            data
+        )
+
+    def test_loads_keeping_raw_batch(self):
+
+        batch = [
+            {'jsonrpc': '2.0', 'method': 'm', 'params': {'a': [1, 2]}, 'id': 1},
+            {'jsonrpc': '2.0', 'method': 'm', 'params': 'scalars are not kept raw', 'id': 2},
+            {'jsonrpc': '2.0', 'method': 'm'},
+            5,
+        ]
+        data = loads_keeping_raw(json.dumps(batch), ('params',), json.JSONDecoder())
+
+        assert isinstance(data[0]['params'], RawJSON)
+        self.assertEqual(json.loads(data[0]['params'].json), batch[0]['params'])
+        self.assertEqual(data[1], batch[1])
+        self.assertEqual(data[2], batch[2])
+        self.assertEqual(data[3], 5)
+
+        self.assertEqual(loads_keeping_raw('[]', ('params',), json.JSONDecoder()), [])
+
+    def test_loads_keeping_raw_complains_like_json_loads(self):
+
+        for text in ['', '{', '[{}', '{"a" 1}', '{"a": 1} x', '[{"params": [1}']:
+            with self.assertRaises(ValueError):
+                loads_keeping_raw(text, ('params',), json.JSONDecoder())
+
+
+class IterBatchElementsTestSuite(TestCase):
+
+    @staticmethod
+    def split(text, size):
+        return [text[index:index + size] for index in range(0, len(text), size)]
+
+    def test_batch_in_any_chunking(self):
+
+        batch = [
+            {'a': [1, ']}', {'b': '"}\\'}], 'c': {}},
+            [],
+            u'x, "y"]',
+            12.5,
+            None,
+            {'d': u'\u0444'}
+        ]
+        text = ' [ ' + ', '.join(json.dumps(element) for element in batch) + ' ] '
+        for size in (1, 2, 3, 7, len(text)):
+            elements = list(iter_batch_elements(self.split(text, size)))
+            self.assertEqual([json.loads(element) for element in elements], batch)
+            self.assertEqual(list(iter_batch_elements(self.split(text, size), json.JSONDecoder())), batch)
+
+    def test_elements_are_yielded_as_they_complete(self):
+
+        chunks = iter(['[{"id": 1}, {"i', 'd": 2}', ']'])
+        elements = iter_batch_elements(chunks)
+        self.assertEqual(next(elements), '{"id": 1}')
+        self.assertEqual(next(elements), '{"id": 2}')
+        # the closing bracket was not read yet
+        self.assertEqual(next(chunks), ']')
+
+    def test_single_object_and_empty_batch(self):
+
+        self.assertEqual(list(iter_batch_elements(['{"a": ', '[1]} \n'])), ['{"a": [1]}'])
+        self.assertEqual(list(iter_batch_elements(['[', ' ]'])), [])
+
+    def test_malformed_text(self):
+
+        for chunks in (
+            [], ['  '], ['5'], ['"abc"'], ['[1, 2'], ['[{"a": 1}'], ['{"a": "1}'],
+            ['[1,]'], ['[1], 2'], ['{}{}'], ['[,1]']
+        ):
+            with self.assertRaises(ValueError):
+                list(iter_batch_elements(chunks))
+
+        # content of the elements is checked by the decoder
+        for chunks in (['[1 2]'], ['[{"a" 1}]'], ['[{"a": 1', '}}]']):
+            with self.assertRaises(ValueError):
+                list(iter_batch_elements(chunks, json.JSONDecoder()))
+        self.assertEqual(list(iter_batch_elements(['[tr', 'ue, 1', '2]'], json.JSONDecoder())), [True, 12])
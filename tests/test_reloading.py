@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+from unittest import TestCase
+
+from jsonrpcparts import JSONPRCApplication
+from jsonrpcparts.reloading import Reloader, source_file
+
+
+class ReloaderTestSuite(TestCase):
+
+    module_name = 'jsonrpcparts_reloading_test_handlers'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, self.module_name + '.py')
+        self.version = 0
+        self.write_module("def version():\n    return 0\n")
+        sys.path.insert(0, self.directory)
+        self.module = __import__(self.module_name)
+
+        def setup(collection):
+            collection.register_function(sys.modules[self.module_name].version)
+
+        self.application = JSONPRCApplication()
+        setup(self.application)
+        self.reloader = Reloader(self.application, [self.module], setup)
+
+    def tearDown(self):
+        self.reloader.stop()
+        sys.path.remove(self.directory)
+        sys.modules.pop(self.module_name, None)
+        shutil.rmtree(self.directory)
+
+    def write_module(self, source):
+        with open(self.path, 'w') as module_file:
+            module_file.write(source)
+        # .pyc is only recompiled when the source is newer (by a whole second)
+        self.version += 1
+        mtime = time.time() + 10 * self.version
+        os.utime(self.path, (mtime, mtime))
+
+    def call_version(self):
+        return json.loads(self.application.handle_request_string(
+            '{"jsonrpc": "2.0", "method": "version", "id": 1}'
+        ))['result']
+
+    def test_source_file(self):
+        self.assertEqual(source_file(self.module), self.path)
+        self.assertIsNone(source_file(sys))
+
+    def test_reload(self):
+
+        self.assertEqual(self.call_version(), 0)
+        self.assertFalse(self.reloader.changed())
+
+        self.write_module("def version():\n    return 1\n")
+        self.assertTrue(self.reloader.changed())
+        self.assertTrue(self.reloader.reload())
+
+        self.assertEqual(self.call_version(), 1)
+        self.assertFalse(self.reloader.changed())
+        self.assertEqual((self.reloader.reloads, self.reloader.failures), (1, 0))
+
+    def test_reloads_the_serving_collection(self):
+
+        served_by = self.application.served_by = JSONPRCApplication()
+        served_by.replace(self.application)
+
+        self.write_module("def version():\n    return 1\n")
+        self.assertTrue(self.reloader.reload())
+        self.assertEqual(served_by['version'](), 1)
+
+    def test_failed_reload_keeps_methods(self):
+
+        self.write_module("def version(:\n")
+        self.assertFalse(self.reloader.reload())
+
+        self.assertIsInstance(self.reloader.last_error, SyntaxError)
+        self.assertEqual(self.reloader.failures, 1)
+        self.assertEqual(self.call_version(), 0)
+        # not retried until the file changes again
+        self.assertFalse(self.reloader.changed())
+
+        def broken_setup(collection):
+            raise RuntimeError("broken")
+
+        self.write_module("def version():\n    return 2\n")
+        self.reloader.setup = broken_setup
+        self.assertFalse(self.reloader.reload())
+        self.assertEqual(self.call_version(), 0)
+
+    def test_watch(self):
+
+        self.reloader.watch(interval=0.05)
+        self.write_module("def version():\n    return 3\n")
+
+        deadline = time.time() + 5
+        while self.reloader.reloads == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.call_version(), 3)
+
+        self.reloader.stop()
+        self.assertIsNone(self.reloader._watcher)
+
+    def test_signal(self):
+
+        previous = signal.getsignal(signal.SIGUSR2)
+        try:
+            self.reloader.install_signal_handler()
+            self.write_module("def version():\n    return 4\n")
+            os.kill(os.getpid(), signal.SIGUSR2)
+
+            deadline = time.time() + 5
+            while self.reloader.reloads == 0 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            signal.signal(signal.SIGUSR2, previous)
+        self.assertEqual(self.call_version(), 4)
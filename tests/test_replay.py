@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+
+from unittest import TestCase
+
+from jsonrpcparts import JSONRPC20Serializer
+from jsonrpcparts.capture import CaptureRecorder
+from jsonrpcparts.replay import ReplayReport, main, replay, wsgi_sender
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+
+APPLICATION_MODULE = """
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+
+application = JSONPRCWSGIApplication()
+application.register_function(lambda a, b: a * b, 'add')
+"""
+
+
+def request(method, params, request_id):
+    return JSONRPC20Serializer.json_dumps(
+        {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': request_id}
+    )
+
+
+class ReplayTestSuite(TestCase):
+
+    def setUp(self):
+        super(ReplayTestSuite, self).setUp()
+
+        def add(a, b):
+            return a + b
+
+        self.app = JSONPRCWSGIApplication()
+        self.app.register_function(add)
+        self.send = wsgi_sender(self.app)
+
+    def records(self):
+        return [
+            {'time': 100.0, 'content_type': 'application/json', 'request': request('add', [1, 2], 1),
+             'response': '{"jsonrpc": "2.0", "result": 3, "id": 1}'},
+            {'time': 101.0, 'content_type': 'application/json', 'request': request('add', [2, 2], 2),
+             'response': '{"jsonrpc": "2.0", "result": 5, "id": 2}'},
+            {'time': 103.0, 'content_type': 'application/json', 'request': request('add', [1, 1], None)},
+        ]
+
+    def test_replays_at_scaled_speed(self):
+
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        report = replay(self.records(), self.send, speed=2, concurrency=1, clock=lambda: now[0], sleep=sleep)
+
+        self.assertEqual(sleeps, [0.5, 1.0])
+        self.assertEqual((report.sent, report.failed, report.compared), (3, 0, 2))
+        self.assertEqual(len(report.latencies), 3)
+        self.assertEqual(report.elapsed, 1.5)
+        self.assertEqual(report.throughput, 2.0)
+        # the second recorded response was wrong
+        self.assertEqual([difference[0] for difference in report.differences], [1])
+        self.assertIn('1 differ', report.format())
+
+    def test_failures(self):
+
+        def send(content_type, body, accept=None):
+            if '"id": 1' in body:
+                raise IOError('connection refused')
+            return 500, ''
+
+        report = replay(self.records(), send, speed=0)
+        self.assertEqual((report.sent, report.failed, report.compared), (3, 3, 0))
+        self.assertIsNone(report.percentile(50))
+
+    def test_report(self):
+
+        report = ReplayReport()
+        report.sent = 5
+        report.elapsed = 2.0
+        report.latencies = [0.001, 0.002, 0.003, 0.004, 0.010]
+        self.assertEqual(report.percentile(50), 0.003)
+        self.assertEqual(report.percentile(100), 0.010)
+        self.assertEqual(report.as_dict()['latency']['p99'], 0.010)
+        self.assertEqual(report.as_dict()['throughput'], 2.5)
+        self.assertIn('max 10.00', report.format())
+
+
+class ReplayMainTestSuite(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'replay_fixture.py'), 'w') as module:
+            module.write(APPLICATION_MODULE)
+        sys.path.insert(0, self.directory)
+        self.stdout = sys.stdout
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        sys.path.remove(self.directory)
+        sys.modules.pop('replay_fixture', None)
+        shutil.rmtree(self.directory)
+
+    def test_main(self):
+
+        path = os.path.join(self.directory, 'capture.jsonl.gz')
+        recorder = CaptureRecorder(path, record_responses=True)
+        for number in (2, 3, 4):
+            recorder.record(
+                'application/json', request('add', [number, 2], number),
+                '{"jsonrpc": "2.0", "result": %d, "id": %d}' % (number + 2, number)
+            )
+        recorder.close()
+
+        sys.stdout = output = StringIO.StringIO()
+        status = main([path, '--app', 'replay_fixture:application', '--speed', '0', '--limit', '2', '--json'])
+
+        self.assertEqual(status, 0)
+        report = json.loads(output.getvalue())
+        self.assertEqual((report['sent'], report['failed'], report['compared']), (2, 0, 2))
+        # 2 + 2 == 2 * 2, 3 + 2 != 3 * 2
+        self.assertEqual(report['differences'], 1)
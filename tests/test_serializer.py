@@ -1,9 +1,13 @@
 import json
 import time
 
+from StringIO import StringIO
+
 from unittest import TestCase
 
 from jsonrpcparts import JSONRPC20Serializer, JSONRPC10Serializer, errors
+from jsonrpcparts.rawjson import RawJSON
+from jsonrpcparts.serializers import ParsedRequest, JSONRPC10Response, JSONRPC20Response
 
 class JSONRPC20SerializerSerializeTestCases(TestCase):
 
@@ -139,6 +143,197 @@ class JSONRPC20SerializerSerializeTestCases(TestCase):
             errors.METHOD_NOT_FOUND
         )
 
+    def test_response_record_serializes_like_dict(self):
+
+        response = JSONRPC20Serializer.assemble_response({'a': [1, 2]}, 'abc')
+        assert isinstance(response, JSONRPC20Response)
+
+        self.assertEqual(
+            {'jsonrpc': '2.0', 'result': {'a': [1, 2]}, 'id': 'abc'},
+            json.loads(JSONRPC20Serializer.json_dumps(response))
+        )
+
+        error_response = JSONRPC20Serializer.assemble_error_response(
+            errors.RPCInvalidMethodParams('bad value', 12345)
+        )
+        self.assertEqual(
+            {
+                'jsonrpc': '2.0',
+                'error': {
+                    'code': errors.INVALID_METHOD_PARAMS,
+                    'message': errors.ERROR_MESSAGE[errors.INVALID_METHOD_PARAMS],
+                    'data': 'bad value'
+                },
+                'id': 12345
+            },
+            json.loads(JSONRPC20Serializer.json_dumps(error_response))
+        )
+
+        # batch of records and formatting options go through the same data
+        self.assertEqual(
+            [response.to_dict(), error_response.to_dict()],
+            json.loads(JSONRPC20Serializer.json_dumps([response, error_response]))
+        )
+        self.assertEqual(
+            json.loads(JSONRPC20Serializer.json_dumps(response, indent=2)),
+            response
+        )
+
+    def test_nested_response_records(self):
+
+        class SetEncoder(json.JSONEncoder):
+
+            def default(self, obj):
+                if isinstance(obj, set):
+                    return sorted(obj)
+                return json.JSONEncoder.default(self, obj)
+
+        class SetSerializer(JSONRPC20Serializer):
+            json_encoder = SetEncoder
+
+        record = JSONRPC20Serializer.assemble_response(RawJSON('[1]'), 1)
+        plain = {'jsonrpc': '2.0', 'result': 2, 'id': 2}
+
+        self.assertEqual(
+            json.loads(SetSerializer.json_dumps([record, plain, {'more': record, 'set': set([2, 1])}])),
+            [
+                {'jsonrpc': '2.0', 'result': [1], 'id': 1},
+                plain,
+                {'more': {'jsonrpc': '2.0', 'result': [1], 'id': 1}, 'set': [1, 2]}
+            ]
+        )
+        with self.assertRaises(TypeError):
+            SetSerializer.json_dumps([record, object()])
+
+        with self.assertRaises(TypeError):
+            record['result'] = 3
+
+    def test_raw_json_result_is_copied_verbatim(self):
+
+        raw = RawJSON('{"cached": [1, 2, 3]}')
+
+        response = JSONRPC20Serializer.assemble_response(raw, 1)
+        self.assertEqual(
+            '{"jsonrpc": "2.0", "result": {"cached": [1, 2, 3]}, "id": 1}',
+            JSONRPC20Serializer.json_dumps(response)
+        )
+
+        response = JSONRPC10Serializer.assemble_response(raw, 1)
+        self.assertEqual(
+            '{"result": {"cached": [1, 2, 3]}, "error": null, "id": 1}',
+            JSONRPC10Serializer.json_dumps(response)
+        )
+
+        # formatted output can't splice raw text in, so it's decoded
+        self.assertEqual(
+            {'result': {'cached': [1, 2, 3]}, 'error': None, 'id': 1},
+            json.loads(JSONRPC10Serializer.json_dumps(response, sort_keys=True))
+        )
+
+    def test_v10_response_record(self):
+
+        response = JSONRPC10Serializer.assemble_response('value', 1)
+        assert isinstance(response, JSONRPC10Response)
+        self.assertEqual(
+            {'result': 'value', 'error': None, 'id': 1},
+            json.loads(JSONRPC10Serializer.json_dumps(response))
+        )
+
+        response = JSONRPC10Serializer.assemble_error_response(errors.RPCMethodNotFound(), 1)
+        self.assertEqual(
+            {
+                'result': None,
+                'error': {
+                    'code': errors.METHOD_NOT_FOUND,
+                    'message': errors.ERROR_MESSAGE[errors.METHOD_NOT_FOUND]
+                },
+                'id': 1
+            },
+            json.loads(JSONRPC10Serializer.json_dumps(response))
+        )
+
+class JSONRPC20SerializerDumpBatchTestCases(TestCase):
+
+    class WriteLog(object):
+
+        def __init__(self):
+            self.writes = []
+
+        def write(self, data):
+            self.writes.append(data)
+
+    def test_output_matches_assembled_requests(self):
+
+        calls = [('a', [1, u'\u0444']), (u'b', {'x': None}), ('c', None), ('d', [])]
+        output = StringIO()
+
+        positions = JSONRPC20Serializer.dump_batch(iter(calls), output)
+
+        self.assertEqual(positions, {1: 0, 2: 1, 3: 2, 4: 3})
+        expected = []
+        for request_id, (method, params) in enumerate(calls, 1):
+            request = JSONRPC20Serializer.assemble_request(method, params)
+            request['id'] = request_id
+            expected.append(request)
+        self.assertEqual(json.loads(output.getvalue()), expected)
+
+    def test_notifications_and_custom_ids(self):
+
+        output = StringIO()
+        positions = JSONRPC20Serializer.dump_batch([('a', [1]), ('b', [2])], output, notification=True)
+        self.assertEqual(positions, {})
+        self.assertEqual(
+            json.loads(output.getvalue()),
+            [{'jsonrpc': '2.0', 'method': 'a', 'params': [1]}, {'jsonrpc': '2.0', 'method': 'b', 'params': [2]}]
+        )
+
+        output = StringIO()
+        positions = JSONRPC20Serializer.dump_batch([('a', [1]), ('b', [2])], output, ids=iter(['x', 'y']))
+        self.assertEqual(positions, {'x': 0, 'y': 1})
+        self.assertEqual([request['id'] for request in json.loads(output.getvalue())], ['x', 'y'])
+
+    def test_large_batches_are_written_in_chunks(self):
+
+        log = self.WriteLog()
+        positions = JSONRPC20Serializer.dump_batch((('method', [index]) for index in xrange(5000)), log)
+
+        self.assertTrue(len(log.writes) > 1)
+        batch = json.loads(''.join(log.writes))
+        self.assertEqual(len(batch), 5000)
+        self.assertEqual(positions[batch[1234]['id']], 1234)
+        self.assertEqual(batch[1234]['params'], [1234])
+
+    def test_custom_encoder(self):
+
+        class SetEncoder(json.JSONEncoder):
+            def default(self, o):
+                if isinstance(o, set):
+                    return sorted(o)
+                return json.JSONEncoder.default(self, o)
+
+        class SetSerializer(JSONRPC20Serializer):
+            json_encoder = SetEncoder
+
+        output = StringIO()
+        SetSerializer.dump_batch([('a', [set([2, 1])]), ('b', {'x': set([3])})], output)
+        self.assertEqual(
+            [request['params'] for request in json.loads(output.getvalue())],
+            [[[1, 2]], {'x': [3]}]
+        )
+
+        with self.assertRaises(TypeError):
+            JSONRPC20Serializer.dump_batch([('a', [set([1])])], StringIO())
+
+    def test_bad_calls(self):
+
+        with self.assertRaises(TypeError):
+            JSONRPC20Serializer.dump_batch([(1, [1])], StringIO())
+        with self.assertRaises(TypeError):
+            JSONRPC20Serializer.dump_batch([('a', 'params')], StringIO())
+        with self.assertRaises(ValueError):
+            JSONRPC20Serializer.dump_batch([], StringIO())
+
+
 class BaseParserTestCase(TestCase):
 
     @staticmethod
@@ -284,6 +479,145 @@ class JSONRPC20SerializerParseRequestTestCases(BaseParserTestCase):
         assert params and params == request_data2['params']
         assert method and method == request_data2['method']
 
+    def test_request_parser_returns_named_records(self):
+
+        request_data = self.get_base_request_object(notification=False)
+
+        requests, is_batch_mode = JSONRPC20Serializer.parse_request(json.dumps(request_data))
+
+        parsed = requests[0]
+        assert isinstance(parsed, ParsedRequest)
+        self.assertEqual(parsed.method, request_data['method'])
+        self.assertEqual(parsed.params, request_data['params'])
+        self.assertEqual(parsed.request_id, request_data['id'])
+        assert parsed.error is None
+
+
+class JSONRPC20SerializerRawParamsParseRequestTestCases(BaseParserTestCase):
+
+    class RawParamsSerializer(JSONRPC20Serializer):
+        raw_params = True
+
+    def test_params_are_kept_raw(self):
+
+        serializer = self.RawParamsSerializer
+
+        request_data1 = self.get_base_request_object(params=[1, {'a': 'b'}])
+        request_data2 = self.get_base_request_object(params=None, notification=True)
+
+        requests, is_batch_mode = serializer.parse_request(json.dumps([
+            request_data1,
+            request_data2
+        ]))
+        assert is_batch_mode
+
+        method, params, request_id, error = requests[0]
+        assert not error
+        assert request_id == request_data1['id']
+        assert method == request_data1['method']
+        assert isinstance(params, RawJSON)
+        self.assertEqual(json.loads(params.json), request_data1['params'])
+
+        method, params, request_id, error = requests[1]
+        assert not error
+        assert params is None
+
+    def test_errors_are_same_as_in_non_raw_mode(self):
+
+        serializer = self.RawParamsSerializer
+
+        request_data = self.get_base_request_object(params="asdf", notification=False)
+        requests, is_batch_mode = serializer.parse_request(json.dumps(request_data))
+        method, params, request_id, error = requests[0]
+        assert request_id == request_data['id']
+        assert isinstance(error, errors.RPCInvalidMethodParams)
+
+        request_data = self.get_base_request_object(notification=False)
+        request_data.pop('jsonrpc')
+        requests, is_batch_mode = serializer.parse_request(json.dumps(request_data))
+        method, params, request_id, error = requests[0]
+        assert request_id == request_data['id']
+        assert isinstance(error, errors.RPCInvalidRequest)
+
+        with self.assertRaises(errors.RPCParseError):
+            serializer.parse_request('[{"jsonrpc": "2.0", "params": [1, 2}]')
+
+        with self.assertRaises(errors.RPCInvalidRequest):
+            serializer.parse_request('[]')
+
+
+class JSONRPC20SerializerBatchParsingTestCases(TestCase):
+
+    class UnicodeSubclass(unicode):
+        pass
+
+    batch = [
+        {'jsonrpc': '2.0', 'method': 'a', 'params': [1], 'id': 1},
+        {'jsonrpc': u'2.0', 'method': u'b', 'params': {'x': 1}},
+        {'jsonrpc': '2.0', 'method': 'c', 'id': None},
+        {'jsonrpc': '2.0', 'method': UnicodeSubclass(u'd'), 'params': (1,), 'id': 'x'},
+        {'jsonrpc': '2.0', 'method': 'e', 'params': RawJSON('[1]'), 'id': 2},
+        {'jsonrpc': '2.0', 'method': 'f', 'params': None, 'id': 3},
+        {'jsonrpc': '2.0', 'method': 'g', 'params': 'asdf', 'id': 4},
+        {'jsonrpc': '1.0', 'method': 'h', 'id': 5},
+        {'jsonrpc': 2.0, 'method': 'i', 'id': 6},
+        {'method': 'j', 'id': 7},
+        {'jsonrpc': '2.0', 'id': 8},
+        {'jsonrpc': '2.0', 'method': 10, 'id': 9},
+        {'jsonrpc': None, 'method': None, 'params': None},
+        {}
+    ]
+
+    def _describe(self, parsed):
+        method, params, request_id, error = parsed
+        if error is None:
+            return ParsedRequest, method, type(method), params, request_id
+        return error.__class__, error.error_data, error.request_id
+
+    def test_batch_parsing_matches_element_by_element_parsing(self):
+
+        parsed = JSONRPC20Serializer._parse_batch(self.batch)
+        expected = [JSONRPC20Serializer._parse_single_request_trap_errors(request) for request in self.batch]
+
+        self.assertEqual(
+            [self._describe(request) for request in parsed],
+            [self._describe(request) for request in expected]
+        )
+        self.assertEqual([request.error is None for request in parsed], [True] * 5 + [False] * 9)
+        for request in parsed:
+            self.assertIsInstance(request, ParsedRequest)
+
+    def test_fast_path_matches_envelope_checks(self):
+
+        for request in self.batch:
+            try:
+                expected = JSONRPC20Serializer._check_request_envelope(request)
+            except errors.RPCFault as ex:
+                with self.assertRaises(ex.__class__) as context:
+                    JSONRPC20Serializer._parse_single_request(request)
+                self.assertEqual(context.exception.error_data, ex.error_data)
+                self.assertEqual(context.exception.request_id, ex.request_id)
+            else:
+                self.assertEqual(JSONRPC20Serializer._parse_single_request(request), expected)
+
+    def test_non_object_elements_fail_as_before(self):
+
+        with self.assertRaises(AttributeError):
+            JSONRPC20Serializer._parse_batch([self.batch[0], 1])
+
+    def test_customized_parsing_is_respected(self):
+
+        class UpperCaseSerializer(JSONRPC20Serializer):
+
+            @classmethod
+            def _parse_single_request(cls, request_data):
+                method, params, request_id = super(UpperCaseSerializer, cls)._parse_single_request(request_data)
+                return method.upper(), params, request_id
+
+        requests, is_batch_mode = UpperCaseSerializer.parse_request(json.dumps(self.batch[:2]))
+
+        self.assertEqual([request.method for request in requests], ['A', 'B'])
+
 
 class JSONRPC20SerializerParseResponseTestCases(BaseParserTestCase):
 
@@ -349,3 +683,40 @@ class JSONRPC20SerializerParseResponseTestCases(BaseParserTestCase):
         with self.assertRaises(errors.RPCParseError):
             responses, is_batch_mode = JSONRPC20Serializer.parse_response(response_string)
 
+    def test_iter_parse_response_matches_parse_response(self):
+
+        response_string = json.dumps([
+            {'jsonrpc': '2.0', 'result': {'a': '[]}'}, 'id': 1},
+            {'jsonrpc': '2.0', 'error': {'code': -32601, 'message': 'Method not found'}, 'id': 2},
+            {'jsonrpc': '2.0', 'error': {'code': 1, 'message': 'custom', 'data': [1]}, 'id': 3},
+            {'jsonrpc': '1.0', 'result': 1, 'id': 4},
+            5
+        ])
+        chunks = [response_string[index:index + 10] for index in range(0, len(response_string), 10)]
+
+        expected, _ = JSONRPC20Serializer.parse_response(response_string)
+        parsed = list(JSONRPC20Serializer.iter_parse_response(chunks))
+
+        self.assertEqual(len(parsed), 5)
+        for (result, request_id, error), (expected_result, expected_id, expected_error) in zip(parsed, expected):
+            self.assertEqual(result, expected_result)
+            self.assertEqual(request_id, expected_id)
+            self.assertEqual(type(error), type(expected_error))
+
+        self.assertEqual(
+            list(JSONRPC20Serializer.iter_parse_response(['{"jsonrpc": "2.0", ', '"result": 1, "id": 1}'])),
+            [(1, 1, None)]
+        )
+
+    def test_iter_parse_response_complains_about_deformed_json(self):
+
+        for response_string in ('"blah"', '[]', '', '{"jsonrpc": "2.0", "result": 1, "id": 1}}'):
+            with self.assertRaises(errors.RPCParseError):
+                list(JSONRPC20Serializer.iter_parse_response([response_string]))
+
+        # elements before the damage are handed out
+        parsed = JSONRPC20Serializer.iter_parse_response(['[{"jsonrpc": "2.0", "result": 1, "id": 1}, {"jsonrpc": '])
+        self.assertEqual(next(parsed), (1, 1, None))
+        with self.assertRaises(errors.RPCParseError):
+            next(parsed)
+
@@ -0,0 +1,274 @@
+import importlib
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib2
+import warnings
+
+from unittest import TestCase
+
+import jsonrpcparts
+from jsonrpcparts import JSONPRCApplication
+from jsonrpcparts.serve import SO_REUSEPORT, load_application
+from jsonrpcparts.tracing import InMemorySpanExporter, Tracer
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+from jsonrpcparts.workers import WorkerPool
+
+APPLICATION_MODULE = """
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+
+application = JSONPRCWSGIApplication()
+application.register_function(lambda a, b: a + b, 'add')
+"""
+
+COLLECTION_MODULE = """
+from jsonrpcparts import JSONPRCApplication
+
+collection = JSONPRCApplication()
+collection.register_function(len, 'length')
+"""
+
+RELOADING_MODULE = """
+import serve_fixture_version
+from jsonrpcparts import JSONPRCCollection
+from jsonrpcparts.reloading import Reloader
+
+
+def setup(collection):
+    collection.register_function(lambda a, b: a + b, 'add')
+    collection.register_function(serve_fixture_version.version)
+
+collection = JSONPRCCollection()
+setup(collection)
+Reloader(collection, [serve_fixture_version], setup).install_signal_handler()
+"""
+
+
+def write_version_module(directory, version):
+    path = os.path.join(directory, 'serve_fixture_version.py')
+    with open(path, 'w') as module:
+        module.write('def version():\n    return %d\n' % version)
+    # .pyc is only recompiled when the source is newer (by a whole second)
+    mtime = time.time() + 10 * version
+    os.utime(path, (mtime, mtime))
+
+
+class LoadApplicationTestSuite(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'serve_fixture.py'), 'w') as module:
+            module.write(APPLICATION_MODULE + COLLECTION_MODULE)
+        sys.path.insert(0, self.directory)
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        sys.modules.pop('serve_fixture', None)
+        shutil.rmtree(self.directory)
+
+    def test_loads_wsgi_application(self):
+        application = load_application('serve_fixture:application')
+        self.assertIsInstance(application, JSONPRCWSGIApplication)
+        self.assertIn('add', application)
+
+    def test_wraps_collections(self):
+        application = load_application('serve_fixture:collection')
+        self.assertIsInstance(application, JSONPRCWSGIApplication)
+        self.assertIs(application['length'], len)
+        self.assertIs(importlib.import_module('serve_fixture').collection.served_by, application)
+
+    def test_keeps_processing_settings(self):
+        collection = importlib.import_module('serve_fixture').collection
+        log = []
+
+        def record(call_next, name, method, args, kwargs, request_id, context):
+            log.append(name)
+            return call_next(name, method, args, kwargs, request_id, context)
+
+        collection.add_call_middleware(record)
+        collection.set_tracer(Tracer(InMemorySpanExporter()))
+        collection.notification_pool = pool = WorkerPool(1)
+        try:
+            application = load_application('serve_fixture:collection')
+            self.assertIs(application.tracer, collection.tracer)
+            self.assertIs(application.notification_pool, pool)
+            application.handle_request_string('{"jsonrpc": "2.0", "method": "length", "params": [[1]], "id": 1}')
+            self.assertEqual(log, ['length'])
+            application.handle_request_string('{"jsonrpc": "2.0", "method": "length", "params": [[1]]}')
+            # what a stopping worker does
+            self.assertTrue(application.drain_notifications(5))
+            self.assertEqual((log, pool.completed), (['length', 'length'], 1))
+        finally:
+            pool.shutdown()
+
+    def test_warns_about_subclasses(self):
+        module = importlib.import_module('serve_fixture')
+
+        class Custom(JSONPRCApplication):
+            pass
+
+        module.custom = Custom()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            load_application('serve_fixture:custom')
+            load_application('serve_fixture:collection')
+        self.assertEqual(len(caught), 1)
+        self.assertIn('Custom', str(caught[0].message))
+
+    def test_bad_spec(self):
+        with self.assertRaises(ValueError):
+            load_application('serve_fixture')
+
+
+class PreforkServerTestSuite(TestCase):
+
+    workers = 2
+    reuse_port = True
+    application = 'serve_fixture:application'
+
+    def setUp(self):
+        if self.reuse_port and SO_REUSEPORT is None:
+            self.skipTest("SO_REUSEPORT is not supported here.")
+
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'serve_fixture.py'), 'w') as module:
+            module.write(APPLICATION_MODULE + RELOADING_MODULE)
+        write_version_module(self.directory, 1)
+        self.status_file = os.path.join(self.directory, 'status.json')
+
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(jsonrpcparts.__file__)))
+        environment = dict(os.environ, PYTHONPATH=os.pathsep.join([self.directory, package_root]))
+        command = [
+            sys.executable, '-m', 'jsonrpcparts.serve',
+            '--bind', '127.0.0.1:0',
+            '--workers', str(self.workers),
+            '--status-file', self.status_file,
+            '--graceful-timeout', '5',
+            self.application
+        ]
+        if not self.reuse_port:
+            command.insert(-1, '--no-reuse-port')
+
+        self.process = subprocess.Popen(command, env=environment, stderr=subprocess.PIPE)
+        banner = self.process.stderr.readline()
+        self.assertTrue(banner.startswith('Listening on '), banner)
+        self.url = banner.split()[2]
+
+        # workers start listening a moment after the master
+        deadline = time.time() + 10
+        while True:
+            try:
+                self._health()
+                break
+            except urllib2.URLError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        shutil.rmtree(self.directory)
+
+    def _call(self, method, *params):
+        request = urllib2.Request(
+            self.url,
+            json.dumps({'jsonrpc': '2.0', 'method': method, 'params': params, 'id': 1}),
+            {'Content-Type': 'application/json'}
+        )
+        return json.loads(urllib2.urlopen(request, timeout=5).read())['result']
+
+    def _health(self):
+        return json.loads(urllib2.urlopen(self.url + '/_health', timeout=5).read())
+
+    def _wait_for_status(self, condition, timeout=10, seen=None):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                with open(self.status_file) as status_file:
+                    status = json.load(status_file)
+            except (IOError, ValueError):
+                status = None
+            if status is not None and seen is not None:
+                seen.append(status)
+            if status is not None and condition(status):
+                return status
+            time.sleep(0.05)
+        self.fail("Status did not reach expected state in time.")
+
+    def _live_workers(self, status):
+        return sorted(worker['pid'] for worker in status['workers'] if not worker['retiring'])
+
+    def test_serves_calls_and_health(self):
+        self.assertEqual(self._call('add', 1, 2), 3)
+
+        health = self._health()
+        self.assertEqual(health['status'], 'ok')
+        self.assertIn(health['worker'], range(self.workers))
+
+        status = self._wait_for_status(lambda status: len(status['workers']) == self.workers)
+        self.assertIn(health['pid'], self._live_workers(status))
+
+    def test_restarts_dead_workers(self):
+        status = self._wait_for_status(lambda status: len(status['workers']) == self.workers)
+        victim = status['workers'][0]['pid']
+        os.kill(victim, signal.SIGKILL)
+
+        status = self._wait_for_status(
+            lambda status: status['restarts'] == 1 and len(status['workers']) == self.workers
+        )
+        self.assertNotIn(victim, self._live_workers(status))
+        self.assertEqual(self._call('add', 2, 2), 4)
+
+    def test_rolling_restart_and_stop(self):
+        status = self._wait_for_status(lambda status: len(status['workers']) == self.workers)
+        old_workers = set(self._live_workers(status))
+
+        self.process.send_signal(signal.SIGHUP)
+        seen = []
+        status = self._wait_for_status(
+            lambda status: len(status['workers']) == self.workers
+            and not old_workers & set(self._live_workers(status))
+            and not any(worker['retiring'] for worker in status['workers']),
+            seen=seen
+        )
+        self.assertEqual(status['restarts'], 0)
+        # one by one: never more than one extra worker
+        self.assertLessEqual(max(len(status['workers']) for status in seen), self.workers + 1)
+        self.assertEqual(self._call('add', 3, 4), 7)
+
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(), 0)
+        self.assertFalse(os.path.exists(self.status_file))
+
+
+class SharedSocketPreforkServerTestSuite(PreforkServerTestSuite):
+
+    reuse_port = False
+
+
+class CollectionPreforkServerTestSuite(PreforkServerTestSuite):
+
+    application = 'serve_fixture:collection'
+
+    def test_reload_signal(self):
+        status = self._wait_for_status(lambda status: len(status['workers']) == self.workers)
+        self.assertEqual(self._call('version'), 1)
+
+        write_version_module(self.directory, 2)
+        # the master passes the signal on to the workers
+        self.process.send_signal(signal.SIGUSR2)
+
+        deadline = time.time() + 10
+        while set(self._call('version') for _ in range(10)) != set([2]):
+            self.assertLess(time.time(), deadline, "Workers did not reload the methods in time.")
+            time.sleep(0.05)
+
+        self.assertIsNone(self.process.poll())
+        self.assertEqual(self._live_workers(self._wait_for_status(lambda status: True)), self._live_workers(status))
@@ -0,0 +1,158 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from StringIO import StringIO
+from unittest import TestCase
+
+from jsonrpcparts import JSONPRCApplication, JSONRPC20Serializer, errors
+from jsonrpcparts.binaryserializers import MsgPackRPC20Serializer, msgpack
+from jsonrpcparts.streaming import (
+    FramingError, LengthPrefixedFraming, NewlineFraming, StreamClient,
+    handle_stream, make_server
+)
+
+class FramingTestSuite(TestCase):
+
+    def test_newline_framing(self):
+
+        wfile = StringIO()
+        framing = NewlineFraming(None, wfile)
+        framing.write_message('{"a": 1}')
+        framing.write_message('[2]')
+
+        framing = NewlineFraming(StringIO(wfile.getvalue() + '\r\n\n'), None)
+        self.assertEqual(framing.read_message(), '{"a": 1}')
+        self.assertEqual(framing.read_message(), '[2]')
+        self.assertEqual(framing.read_message(), None)
+
+    def test_newline_framing_limits_message_size(self):
+
+        class SmallFraming(NewlineFraming):
+            max_message_size = 4
+
+        framing = SmallFraming(StringIO('1234\n12345\n'), None)
+        self.assertEqual(framing.read_message(), '1234')
+        with self.assertRaises(FramingError):
+            framing.read_message()
+
+    def test_length_prefixed_framing(self):
+
+        wfile = StringIO()
+        framing = LengthPrefixedFraming(None, wfile)
+        framing.write_message('line one\nline two')
+        framing.write_message('\x00\xff')
+
+        framing = LengthPrefixedFraming(StringIO(wfile.getvalue()), None)
+        self.assertEqual(framing.read_message(), 'line one\nline two')
+        self.assertEqual(framing.read_message(), '\x00\xff')
+        self.assertEqual(framing.read_message(), None)
+
+        framing = LengthPrefixedFraming(StringIO(wfile.getvalue()[:-1]), None)
+        framing.read_message()
+        with self.assertRaises(FramingError):
+            framing.read_message()
+
+
+class StreamTransportTestSuite(TestCase):
+
+    def setUp(self):
+        super(StreamTransportTestSuite, self).setUp()
+
+        self.notified = []
+        self.app = self._make_app(JSONRPC20Serializer)
+
+    def _make_app(self, serializer):
+
+        def adder(*args):
+            return sum(args)
+
+        app = JSONPRCApplication(serializer)
+        app.register_function(adder)
+        app.register_function(self.notified.append, 'notify_me')
+        return app
+
+    def _serve_socketpair(self, framing):
+        server_socket, client_socket = socket.socketpair()
+
+        def serve():
+            rfile = server_socket.makefile('rb', -1)
+            wfile = server_socket.makefile('wb', -1)
+            try:
+                handle_stream(self.app, rfile, wfile, framing)
+            finally:
+                rfile.close()
+                wfile.close()
+                server_socket.close()
+
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        return client_socket, thread
+
+    def _exercise(self, client):
+        self.assertEqual(client.call('adder', 1, 2), 3)
+        client.notify('notify_me', 'hello')
+        self.assertEqual(client.call('adder', 3, 4), 7)
+        with self.assertRaises(errors.RPCMethodNotFound):
+            client.call('missing')
+        self.assertEqual(self.notified, ['hello'])
+
+    def test_newline_framing_over_socketpair(self):
+
+        client_socket, thread = self._serve_socketpair(NewlineFraming)
+        client = StreamClient.from_socket(client_socket, NewlineFraming)
+
+        self._exercise(client)
+
+        client.close()
+        thread.join(5)
+        assert not thread.is_alive()
+
+    def test_length_prefixed_framing_over_socketpair(self):
+
+        serializer = MsgPackRPC20Serializer if msgpack else JSONRPC20Serializer
+        self.app = self._make_app(serializer)
+
+        client_socket, thread = self._serve_socketpair(LengthPrefixedFraming)
+        client = StreamClient.from_socket(client_socket, LengthPrefixedFraming, serializer)
+
+        self._exercise(client)
+
+        client.close()
+        thread.join(5)
+        assert not thread.is_alive()
+
+    def test_tcp_server(self):
+
+        server = make_server(self.app, ('127.0.0.1', 0))
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        try:
+            client = StreamClient.connect(server.server_address, timeout=5)
+            self._exercise(client)
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_unix_socket_server(self):
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'rpc.sock')
+
+        server = make_server(self.app, path, LengthPrefixedFraming)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+        try:
+            client = StreamClient.connect(path, LengthPrefixedFraming, timeout=5)
+            self._exercise(client)
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(directory)
@@ -0,0 +1,202 @@
+import json
+import StringIO
+
+import mock
+import requests
+
+from unittest import TestCase
+
+from jsonrpcparts import JSONRPC20Serializer, errors
+from jsonrpcparts.client import WebClient
+from jsonrpcparts.context import takes_request_context
+from jsonrpcparts.tracing import InMemorySpanExporter, Span, Tracer, format_traceparent, parse_traceparent
+from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+class TraceparentTestSuite(TestCase):
+
+    def test_parse(self):
+
+        self.assertEqual(parse_traceparent('00-%s-%s-01' % (TRACE_ID, PARENT_ID)), (TRACE_ID, PARENT_ID, True))
+        self.assertEqual(parse_traceparent(' 00-%s-%s-00 ' % (TRACE_ID, PARENT_ID)), (TRACE_ID, PARENT_ID, False))
+        # future versions may add fields
+        self.assertEqual(parse_traceparent('01-%s-%s-03-more' % (TRACE_ID, PARENT_ID)), (TRACE_ID, PARENT_ID, True))
+
+        for value in (None, '', 'garbage', '00-%s-%s-01-more' % (TRACE_ID, PARENT_ID),
+                      'ff-%s-%s-01' % (TRACE_ID, PARENT_ID), '00-%s-%s-01' % ('0' * 32, PARENT_ID),
+                      '00-%s-%s-01' % (TRACE_ID, '0' * 16), '00-%s-%s-01' % (TRACE_ID.upper(), PARENT_ID)):
+            self.assertIsNone(parse_traceparent(value), value)
+
+    def test_format(self):
+
+        self.assertEqual(format_traceparent(TRACE_ID, PARENT_ID, True), '00-%s-%s-01' % (TRACE_ID, PARENT_ID))
+        self.assertEqual(format_traceparent(TRACE_ID, PARENT_ID, False), '00-%s-%s-00' % (TRACE_ID, PARENT_ID))
+
+
+class TracerTestSuite(TestCase):
+
+    def setUp(self):
+        super(TracerTestSuite, self).setUp()
+        self.exporter = InMemorySpanExporter()
+        self.tracer = Tracer(self.exporter)
+
+    def test_nesting(self):
+
+        tracer = self.tracer
+        with tracer.start_span('outer') as outer:
+            self.assertIs(tracer.current_span(), outer)
+            with tracer.start_span('inner') as inner:
+                self.assertIs(tracer.current_span(), inner)
+            self.assertIs(tracer.current_span(), outer)
+        self.assertIsNone(tracer.current_span())
+
+        spans = self.exporter.get_finished_spans()
+        self.assertEqual([span.name for span in spans], ['inner', 'outer'])
+        self.assertIsNone(outer.parent_id)
+        self.assertEqual(inner.parent_id, outer.span_id)
+        self.assertEqual(inner.trace_id, outer.trace_id)
+        self.assertEqual(len(outer.trace_id), 32)
+        self.assertEqual(len(outer.span_id), 16)
+        self.assertNotEqual(inner.span_id, outer.span_id)
+        self.assertTrue(outer.duration >= inner.duration >= 0)
+
+    def test_errors(self):
+
+        with self.assertRaises(errors.RPCMethodNotFound):
+            with self.tracer.start_span('failing') as span:
+                raise errors.RPCMethodNotFound()
+
+        self.assertEqual(span.status, Span.ERROR)
+        self.assertEqual(span.attributes['rpc.jsonrpc.error_code'], errors.METHOD_NOT_FOUND)
+        self.assertEqual(span.attributes['exception.type'], 'RPCMethodNotFound')
+
+    def test_continues_remote_trace(self):
+
+        span = self.tracer.start_span('remote', traceparent='00-%s-%s-01' % (TRACE_ID, PARENT_ID))
+        self.assertEqual((span.trace_id, span.parent_id, span.sampled), (TRACE_ID, PARENT_ID, True))
+
+        # invalid traceparent starts a new trace
+        span = self.tracer.start_span('remote', traceparent='nonsense')
+        self.assertNotEqual(span.trace_id, TRACE_ID)
+        self.assertIsNone(span.parent_id)
+
+    def test_sampling(self):
+
+        tracer = Tracer(self.exporter, sample_rate=0)
+        with tracer.start_span('outer') as outer:
+            with tracer.start_span('inner') as inner:
+                headers = {}
+                tracer.inject(headers)
+        # not exported, but the ids travel on, with the decision
+        self.assertEqual(self.exporter.get_finished_spans(), [])
+        self.assertFalse(inner.sampled)
+        self.assertEqual(headers, {'traceparent': '00-%s-%s-00' % (outer.trace_id, inner.span_id)})
+
+        with tracer.start_span('remote', traceparent='00-%s-%s-01' % (TRACE_ID, PARENT_ID)):
+            pass
+        self.assertEqual(len(self.exporter.get_finished_spans()), 1)
+
+        self.exporter.clear()
+        self.assertEqual(self.exporter.get_finished_spans(), [])
+
+
+class TracedApplicationTestSuite(TestCase):
+
+    def setUp(self):
+        super(TracedApplicationTestSuite, self).setUp()
+
+        self.exporter = InMemorySpanExporter()
+        self.tracer = Tracer(self.exporter)
+        self.spans_seen = []
+
+        @takes_request_context
+        def add(a, b, request_context):
+            self.spans_seen.append(request_context.span)
+            return a + b
+
+        def fail():
+            raise errors.RPCPermissionDenied()
+
+        self.app = JSONPRCWSGIApplication()
+        self.app.register_function(add)
+        self.app.register_function(fail)
+        self.app.set_tracer(self.tracer)
+
+    def wsgi_post(self, url, data=None, headers=None, **kw):
+        """requests.post stand-in that hands the request to the application"""
+        environ = {
+            'wsgi.input': StringIO.StringIO(data),
+            'CONTENT_LENGTH': str(len(data)),
+            'CONTENT_TYPE': headers['Content-Type'],
+            'PATH_INFO': '/rpc'
+        }
+        if 'traceparent' in headers:
+            environ['HTTP_TRACEPARENT'] = headers['traceparent']
+        status = []
+        body = ''.join(self.app(environ, lambda code, response_headers: status.append(code)))
+        response = requests.Response()
+        response.status_code = int(status[0].split()[0])
+        response._content = body
+        response.headers['Content-Type'] = 'application/json'
+        return response
+
+    def test_batch_spans(self):
+
+        batch = JSONRPC20Serializer.json_dumps([
+            JSONRPC20Serializer.assemble_request('add', [1, 2]),
+            JSONRPC20Serializer.assemble_request('fail')
+        ])
+        environ = {
+            'wsgi.input': StringIO.StringIO(batch),
+            'CONTENT_LENGTH': str(len(batch)),
+            'CONTENT_TYPE': 'application/json',
+            'PATH_INFO': '/rpc',
+            'HTTP_TRACEPARENT': '00-%s-%s-01' % (TRACE_ID, PARENT_ID)
+        }
+        responses = json.loads(''.join(self.app(environ, lambda *args: None)))
+        self.assertEqual(responses[0]['result'], 3)
+
+        spans = dict((span.name, span) for span in self.exporter.get_finished_spans())
+        self.assertEqual(sorted(spans), ['add', 'fail', 'jsonrpc.parse', 'jsonrpc.request', 'jsonrpc.serialize'])
+
+        request = spans['jsonrpc.request']
+        self.assertEqual((request.trace_id, request.parent_id, request.kind), (TRACE_ID, PARENT_ID, Span.SERVER))
+        for name in ('add', 'fail', 'jsonrpc.parse', 'jsonrpc.serialize'):
+            self.assertEqual(spans[name].parent_id, request.span_id, name)
+            self.assertEqual(spans[name].trace_id, TRACE_ID, name)
+
+        self.assertEqual(spans['add'].attributes['rpc.method'], 'add')
+        self.assertEqual(spans['fail'].status, Span.ERROR)
+        self.assertEqual(spans['fail'].attributes['rpc.jsonrpc.error_code'], errors.PERMISSION_DENIED)
+        # methods find the request's span in the request context
+        self.assertEqual(self.spans_seen, [request])
+
+    def test_client_propagates_trace(self):
+
+        client = WebClient('http://example.com/rpc')
+        client.tracer = self.tracer
+
+        with mock.patch('requests.post', side_effect=self.wsgi_post):
+            with self.tracer.start_span('job') as job:
+                self.assertEqual(client.call('add', 2, 2), 4)
+
+        spans = dict((span.name, span) for span in self.exporter.get_finished_spans())
+        call = [span for span in spans.values() if span.kind == Span.CLIENT][0]
+        self.assertEqual(call.parent_id, job.span_id)
+        self.assertEqual(call.attributes['http.status_code'], 200)
+        # the server's spans are in the same trace, under the client's
+        self.assertEqual(spans['jsonrpc.request'].parent_id, call.span_id)
+        self.assertEqual(len(set(span.trace_id for span in spans.values())), 1)
+
+    def test_disabling(self):
+
+        self.app.set_tracer(None)
+        self.assertIsNone(self.app._process_call)
+
+        self.app.handle_request_string(JSONRPC20Serializer.json_dumps(
+            JSONRPC20Serializer.assemble_request('add', [1, 2])
+        ))
+        self.assertEqual(self.exporter.get_finished_spans(), [])
@@ -0,0 +1,147 @@
+from unittest import TestCase
+
+from jsonrpcparts.validation import (
+    ValidationError, compile_params_validator, compile_schema, params_schema
+)
+
+
+class CompileSchemaTestSuite(TestCase):
+
+    def assertInvalid(self, validate, value, path, keyword):
+        with self.assertRaises(ValidationError) as context:
+            validate(value)
+        self.assertEqual(context.exception.path, path)
+        self.assertEqual(context.exception.keyword, keyword)
+
+    def test_types(self):
+        validate = compile_schema({'type': ['integer', 'null']})
+        validate(1)
+        validate(10L)
+        validate(None)
+        self.assertInvalid(validate, 1.5, 'params', 'type')
+        self.assertInvalid(validate, True, 'params', 'type')
+        self.assertInvalid(validate, '1', 'params', 'type')
+
+        validate = compile_schema({'type': 'number'})
+        validate(1)
+        validate(1.5)
+        self.assertInvalid(validate, False, 'params', 'type')
+
+    def test_numbers_and_strings(self):
+        validate = compile_schema({
+            'type': ['number', 'string'],
+            'minimum': 0,
+            'exclusiveMaximum': 10,
+            'maxLength': 3,
+            'pattern': '^[a-z]+$'
+        })
+        validate(0)
+        validate(9.9)
+        validate(u'abc')
+        self.assertInvalid(validate, -1, 'params', 'minimum')
+        self.assertInvalid(validate, 10, 'params', 'exclusiveMaximum')
+        self.assertInvalid(validate, 'abcd', 'params', 'maxLength')
+        self.assertInvalid(validate, 'ab1', 'params', 'pattern')
+
+    def test_enum(self):
+        validate = compile_schema({'enum': ['red', 1, None]})
+        validate('red')
+        validate(None)
+        self.assertInvalid(validate, 'blue', 'params', 'enum')
+        self.assertInvalid(validate, [1], 'params', 'enum')
+
+        validate = compile_schema({'enum': [[1, 2], {'a': 1}]})
+        validate([1, 2])
+        self.assertInvalid(validate, [2, 1], 'params', 'enum')
+
+    def test_nested_structures(self):
+        validate = compile_schema({
+            'type': 'object',
+            'properties': {
+                'points': {
+                    'type': 'array',
+                    'minItems': 1,
+                    'items': {
+                        'type': 'object',
+                        'properties': {'x': int, 'y': int},
+                        'required': ['x', 'y']
+                    }
+                },
+                'label': basestring
+            },
+            'required': ['points'],
+            'additionalProperties': False
+        })
+        validate({'points': [{'x': 1, 'y': 2}], 'label': u'a'})
+        self.assertInvalid(validate, {}, 'params', 'required')
+        self.assertInvalid(validate, {'points': []}, 'params.points', 'minItems')
+        self.assertInvalid(validate, {'points': [{'x': 1, 'y': 2}, {'x': 1}]}, 'params.points[1]', 'required')
+        self.assertInvalid(validate, {'points': [{'x': 1, 'y': 'b'}]}, 'params.points[0].y', 'type')
+        self.assertInvalid(validate, {'points': [{'x': 1, 'y': 2}], 'color': 1}, 'params', 'additionalProperties')
+
+    def test_additional_properties_schema(self):
+        validate = compile_schema({
+            'type': 'object',
+            'properties': {'name': basestring},
+            'additionalProperties': int
+        })
+        validate({'name': 'a', 'b': 1, 'c': 2})
+        self.assertInvalid(validate, {'name': 'a', 'b': 'x'}, 'params.b', 'type')
+
+    def test_unsupported_schemas(self):
+        with self.assertRaises(ValueError):
+            compile_schema({'type': 'object', 'oneOf': []})
+        with self.assertRaises(ValueError):
+            compile_schema({'type': 'decimal'})
+        with self.assertRaises(ValueError):
+            compile_schema(set)
+
+
+class CompileParamsValidatorTestSuite(TestCase):
+
+    def test_named_params(self):
+        validate = compile_params_validator(
+            {'type': 'object', 'properties': {'a': int, 'b': int}, 'required': ['a']},
+            ['a', 'b']
+        )
+        validate({'a': 1})
+        # positional params are checked by argument names
+        validate([1, 2])
+        with self.assertRaises(ValidationError) as context:
+            validate([1, 'b'])
+        self.assertEqual(context.exception.path, 'params.b')
+        with self.assertRaises(ValidationError):
+            validate([1, 2, 3])
+        with self.assertRaises(ValidationError):
+            validate(None)
+
+        validate = compile_params_validator({'type': 'object', 'properties': {'a': int}})
+        validate(None)
+        with self.assertRaises(ValidationError):
+            validate([1])
+
+    def test_positional_params(self):
+        validate = compile_params_validator({'type': 'array', 'items': int, 'maxItems': 2})
+        validate([1, 2])
+        validate(None)
+        with self.assertRaises(ValidationError):
+            validate({'a': 1})
+        with self.assertRaises(ValidationError):
+            validate([1, 2, 3])
+
+    def test_params_must_be_a_container(self):
+        with self.assertRaises(ValueError):
+            compile_params_validator({'type': 'string'})
+
+    def test_params_schema_decorator(self):
+
+        @params_schema(a=int, b=basestring)
+        def method(a, b):
+            pass
+
+        validate = compile_params_validator(method.params_schema, ['a', 'b'])
+        validate({'a': 1, 'b': 'x'})
+        with self.assertRaises(ValidationError):
+            validate({'a': 1})
+        with self.assertRaises(ValidationError):
+            validate({'a': 1, 'b': 'x', 'c': 2})
@@ -0,0 +1,150 @@
+import threading
+import time
+
+from StringIO import StringIO
+from unittest import TestCase
+
+from jsonrpcparts import JSONPRCApplication, JSONRPC20Serializer, errors
+from jsonrpcparts.websocket import (
+    WebSocketClient, WebSocketFraming, make_websocket_server, _mask
+)
+
+class WebSocketFramingTestSuite(TestCase):
+
+    def test_masking_is_reversible(self):
+
+        data = ''.join(chr(i % 256) for i in range(1000))
+        masked = _mask(data, '\x01\x80\xff\x00')
+        assert masked != data
+        self.assertEqual(_mask(masked, '\x01\x80\xff\x00'), data)
+        self.assertEqual(_mask('', 'abcd'), '')
+
+    def test_frames_round_trip(self):
+
+        wfile = StringIO()
+        client_side = WebSocketFraming(None, wfile, mask=True)
+        for message in ['short', 'x' * 300, 'y' * 70000]:
+            client_side.write_message(message)
+
+        server_side = WebSocketFraming(StringIO(wfile.getvalue()), StringIO())
+        self.assertEqual(server_side.read_message(), 'short')
+        self.assertEqual(server_side.read_message(), 'x' * 300)
+        self.assertEqual(server_side.read_message(), 'y' * 70000)
+        self.assertEqual(server_side.read_message(), None)
+
+    def test_fragments_and_control_frames(self):
+
+        stream = (
+            '\x01\x03abc'      # text, not final
+            '\x89\x02hi'       # ping in between of fragments
+            '\x80\x03def'      # final continuation
+            '\x88\x02\x03\xe8' # close
+        )
+        wfile = StringIO()
+        framing = WebSocketFraming(StringIO(stream), wfile)
+
+        self.assertEqual(framing.read_message(), 'abcdef')
+        self.assertEqual(framing.read_message(), None)
+        # pong and echoed close
+        self.assertEqual(wfile.getvalue(), '\x8a\x02hi\x88\x02\x03\xe8')
+
+
+class WebSocketTransportTestSuite(TestCase):
+
+    def setUp(self):
+        super(WebSocketTransportTestSuite, self).setUp()
+
+        def adder(*args):
+            return sum(args)
+
+        def sleeper(seconds, value):
+            time.sleep(seconds)
+            return value
+
+        app = JSONPRCApplication(JSONRPC20Serializer)
+        app.register_function(adder)
+        app.register_function(sleeper)
+        # the response can not be serialized, the server answers with an error without id
+        app.register_function(lambda: object(), 'unserializable')
+
+        self.server = make_websocket_server(app, ('127.0.0.1', 0), path='/rpc', workers=4)
+        thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+        thread.daemon = True
+        thread.start()
+
+        self.url = 'ws://127.0.0.1:%d/rpc' % self.server.server_address[1]
+        self.client = WebSocketClient(self.url, timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        super(WebSocketTransportTestSuite, self).tearDown()
+
+    def test_call(self):
+
+        self.assertEqual(self.client.call('adder', 1, 2, 3), 6)
+        with self.assertRaises(errors.RPCMethodNotFound):
+            self.client.call('missing')
+
+    def test_error_response_without_id(self):
+
+        with self.assertRaises(errors.RPCInternalError):
+            self.client.call_async('unserializable').result(1)
+        with self.assertRaises(errors.RPCInternalError):
+            self.client.call('unserializable')
+        self.assertEqual(self.client._pending, {})
+        self.assertEqual(self.client.call('adder', 1), 1)
+
+    def test_responses_come_back_out_of_order(self):
+
+        slow = self.client.call_async('sleeper', 0.5, 'slow')
+        fast = self.client.call_async('sleeper', 0, 'fast')
+
+        self.assertEqual(fast.result(5), 'fast')
+        assert not slow.done()
+        self.assertEqual(slow.result(5), 'slow')
+
+    def test_many_calls_in_flight(self):
+
+        pending = [self.client.call_async('adder', i, 1) for i in range(200)]
+        self.assertEqual([call.result(5) for call in pending], range(1, 201))
+
+    def test_bulk_calls(self):
+
+        results = self.client.call_bulk([('adder', [1, 2]), ('missing', None), ('sleeper', [0, 'done'])])
+        self.assertEqual(results[0], 3)
+        self.assertIsInstance(results[1], errors.RPCMethodNotFound)
+        self.assertEqual(results[2], 'done')
+
+        results = list(self.client.iter_call_bulk([('sleeper', [0.5, 'slow']), ('sleeper', [0, 'fast'])]))
+        self.assertEqual(sorted(results), [(0, 'slow'), (1, 'fast')])
+
+        # one of the responses can not be serialized, the batch gets one error response
+        with self.assertRaises(errors.RPCInternalError):
+            self.client.call_bulk([('adder', [1]), ('unserializable', None)])
+        with self.assertRaises(errors.RPCInternalError):
+            list(self.client.iter_call_bulk([('adder', [1]), ('unserializable', None)]))
+
+        self.client.notify_bulk([('adder', [1]), ('adder', [2])])
+        self.assertEqual(self.client.call('adder', 1), 1)
+        self.assertEqual(self.client._pending, {})
+
+    def test_server_pushes_notifications(self):
+
+        received = []
+        arrived = threading.Event()
+
+        def on_notification(method, params):
+            received.append((method, params))
+            arrived.set()
+
+        self.client.on_notification = on_notification
+        # make sure connection is registered on the server side
+        self.client.call('adder')
+
+        for connection in list(self.server.connections):
+            connection.notify('news', 'hello')
+
+        assert arrived.wait(5)
+        self.assertEqual(received, [('news', ['hello'])])
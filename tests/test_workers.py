@@ -0,0 +1,133 @@
+import threading
+import time
+
+from unittest import TestCase
+
+from jsonrpcparts.workers import WorkerPool
+
+
+class WorkerPoolTestSuite(TestCase):
+
+    def setUp(self):
+        super(WorkerPoolTestSuite, self).setUp()
+        self.release = threading.Event()
+        self.done = []
+
+    def blocking(self, value):
+        self.release.wait(5)
+        self.done.append(value)
+
+    def submit_taken(self, pool, value):
+        pool.submit(self.blocking, value)
+        # until the thread takes it from the queue
+        while pool.pending:
+            time.sleep(0.001)
+
+    def test_runs_work(self):
+
+        pool = WorkerPool(2)
+        for number in range(10):
+            self.assertTrue(pool.submit(self.done.append, number))
+        pool.submit(int, 'not a number')
+        self.assertTrue(pool.shutdown())
+
+        self.assertEqual(sorted(self.done), range(10))
+        self.assertEqual((pool.submitted, pool.completed, pool.failed), (11, 11, 1))
+
+    def test_drop(self):
+
+        pool = WorkerPool(1, queue_size=1, overflow=WorkerPool.DROP)
+        self.submit_taken(pool, 0)
+        results = [pool.submit(self.blocking, number) for number in range(1, 4)]
+        self.assertEqual(results, [True, False, False])
+        self.assertEqual(pool.dropped, 2)
+
+        self.release.set()
+        pool.shutdown()
+        self.assertEqual(self.done, [0, 1])
+
+    def test_inline(self):
+
+        pool = WorkerPool(1, queue_size=1, overflow=WorkerPool.INLINE)
+        self.submit_taken(pool, 'running')
+        pool.submit(self.blocking, 'queued')
+        pool.submit(self.done.append, 'inline')
+        self.assertEqual(self.done, ['inline'])
+        self.release.set()
+        pool.shutdown()
+
+        self.assertEqual(self.done, ['inline', 'running', 'queued'])
+        self.assertEqual((pool.inlined, pool.dropped, pool.completed), (1, 0, 3))
+
+        with self.assertRaises(ValueError):
+            WorkerPool(1, overflow='never')
+
+    def test_shutdown_timeout(self):
+
+        pool = WorkerPool(1)
+        self.submit_taken(pool, 'slow')
+        pool.submit(self.blocking, 'queued')
+        self.assertEqual(pool.pending, 1)
+        self.assertFalse(pool.shutdown(timeout=0.05))
+
+        # nothing left to run work submitted after shutdown, it runs inline
+        pool.submit(self.done.append, 'after')
+        self.assertEqual(self.done, ['after'])
+
+        self.release.set()
+        self.assertTrue(pool.shutdown())
+        self.assertEqual(self.done, ['after', 'slow', 'queued'])
+
+    def test_shutdown_after_timeout_finishes(self):
+
+        pool = WorkerPool(1, queue_size=1)
+        self.submit_taken(pool, 'running')
+        pool.submit(self.blocking, 'queued')
+        # the queue is full, no room for the sentinel yet
+        self.assertFalse(pool.shutdown(timeout=0.05))
+
+        self.release.set()
+        self.assertTrue(pool.shutdown(timeout=5))
+        self.assertEqual(self.done, ['running', 'queued'])
+
+    def test_shutdown_timeout_with_blocked_submitter(self):
+
+        pool = WorkerPool(1, queue_size=1)
+        self.submit_taken(pool, 'running')
+        pool.submit(self.blocking, 'queued')
+        # waits for room in the full queue
+        submitter = threading.Thread(target=pool.submit, args=(self.done.append, 'inline'))
+        submitter.start()
+        time.sleep(0.1)
+
+        started = time.time()
+        self.assertFalse(pool.shutdown(timeout=0.2))
+        self.assertLess(time.time() - started, 1)
+        # the shut down pool runs it in the submitting thread
+        submitter.join(5)
+        self.assertEqual((self.done, pool.inlined), (['inline'], 1))
+
+        self.release.set()
+        self.assertTrue(pool.shutdown(timeout=5))
+        self.assertEqual(self.done, ['inline', 'running', 'queued'])
+
+    def test_no_work_is_lost_on_shutdown(self):
+
+        pool = WorkerPool(2, queue_size=4)
+        stop = threading.Event()
+
+        def submitter():
+            while not stop.is_set():
+                pool.submit(self.done.append, 1)
+
+        submitters = [threading.Thread(target=submitter) for _ in range(4)]
+        for thread in submitters:
+            thread.start()
+        time.sleep(0.05)
+        self.assertTrue(pool.shutdown(timeout=5))
+        stop.set()
+        for thread in submitters:
+            thread.join()
+
+        self.assertEqual(len(self.done), pool.submitted)
+        self.assertEqual(pool.completed, pool.submitted)
@@ -3,9 +3,11 @@ import time
 
 import StringIO
 
-from unittest import TestCase
+from unittest import TestCase, skipIf
 
-from jsonrpcparts import JSONRPC20Serializer, errors
+from jsonrpcparts import JSONRPC20Serializer, compression, errors
+from jsonrpcparts.context import takes_request_context
+from jsonrpcparts.binaryserializers import MsgPackRPC20Serializer, msgpack
 from jsonrpcparts.wsgiapplication import JSONPRCWSGIApplication
 
 class MockWSGIEnviron(dict):
@@ -82,3 +84,201 @@ class JSONPRCWSGIApplicationTestSuite(TestCase):
         assert 'error' not in response_json
         assert response_json['id'] == request2['id']
         assert response_json['result'] == 7
+
+    def test_unsupported_content_type(self):
+
+        environ = MockWSGIEnviron(
+            'adder(1, 2)',
+            [('CONTENT_TYPE', 'text/plain')]
+        )
+        start_response = MockWSGIStartResponse()
+
+        body = ''.join(self.app(environ, start_response))
+
+        code, headers, _ = start_response.call_log[0]
+        self.assertEqual(code, '415 Unsupported Media Type')
+        assert 'application/json' in body
+
+    def test_content_type_parameters_are_ignored(self):
+
+        request = JSONRPC20Serializer.assemble_request('adder', (2, 3))
+        environ = MockWSGIEnviron(
+            JSONRPC20Serializer.json_dumps(request),
+            [('CONTENT_TYPE', 'application/json; charset=utf-8')]
+        )
+        start_response = MockWSGIStartResponse()
+
+        response_data = JSONRPC20Serializer.json_loads(''.join(self.app(environ, start_response)))
+
+        self.assertEqual(response_data['result'], 5)
+
+    @skipIf(msgpack is None, "msgpack is not installed")
+    def test_negotiates_serializer(self):
+
+        self.app.register_serializer(MsgPackRPC20Serializer)
+
+        request = JSONRPC20Serializer.assemble_request('adder', (2, 3))
+
+        # MessagePack in, JSON out
+        environ = MockWSGIEnviron(
+            MsgPackRPC20Serializer.dumps(request),
+            [
+                ('CONTENT_TYPE', 'application/msgpack'),
+                ('HTTP_ACCEPT', 'text/html;q=0.9, application/json;q=0.5, application/msgpack;q=0')
+            ]
+        )
+        start_response = MockWSGIStartResponse()
+
+        response_data = JSONRPC20Serializer.json_loads(''.join(self.app(environ, start_response)))
+
+        self.assertEqual(response_data['result'], 5)
+        self.assertEqual(response_data['id'], request['id'])
+        code, headers, _ = start_response.call_log[0]
+        self.assertIn(('Content-Type', 'application/json'), headers)
+
+        # JSON in, MessagePack out
+        environ = MockWSGIEnviron(
+            JSONRPC20Serializer.json_dumps(request),
+            [
+                ('CONTENT_TYPE', 'application/json'),
+                ('HTTP_ACCEPT', 'application/msgpack')
+            ]
+        )
+        start_response = MockWSGIStartResponse()
+
+        response_data = MsgPackRPC20Serializer.loads(''.join(self.app(environ, start_response)))
+
+        self.assertEqual(response_data['result'], 5)
+        code, headers, _ = start_response.call_log[0]
+        self.assertIn(('Content-Type', 'application/msgpack'), headers)
+
+    def test_request_context(self):
+
+        seen = []
+
+        @takes_request_context
+        def whoami(request_context, greeting='hi'):
+            seen.append(request_context)
+            return [greeting, request_context.environ['REMOTE_USER']]
+
+        self.app.register_function(whoami)
+        requests_string = JSONRPC20Serializer.json_dumps([
+            JSONRPC20Serializer.assemble_request('whoami', {'greeting': 'hello'}),
+            JSONRPC20Serializer.assemble_request('whoami')
+        ])
+        environ = MockWSGIEnviron(
+            requests_string,
+            [('CONTENT_TYPE', 'application/json'), ('REMOTE_USER', 'alice')]
+        )
+
+        responses = JSONRPC20Serializer.json_loads(''.join(self.app(environ, MockWSGIStartResponse())))
+
+        self.assertEqual([response['result'] for response in responses], [['hello', 'alice'], ['hi', 'alice']])
+        # one context for the whole request, given back to the pool afterwards
+        self.assertIs(seen[0], seen[1])
+        self.assertIsNone(seen[0].environ)
+        self.assertIs(self.app.request_context_pool.acquire(), seen[0])
+
+
+class CompressionTestSuite(TestCase):
+
+    def setUp(self):
+        super(CompressionTestSuite, self).setUp()
+
+        self.app = JSONPRCWSGIApplication(JSONRPC20Serializer)
+        self.app.register_function(lambda text, times: text * times, 'repeat')
+
+    def _request(self, request_string, headers=()):
+        environ = MockWSGIEnviron(
+            request_string,
+            [('CONTENT_TYPE', 'application/json')] + list(headers)
+        )
+        start_response = MockWSGIStartResponse()
+        body = ''.join(self.app(environ, start_response))
+        code, headers, _ = start_response.call_log[0]
+        return code, dict(headers), body
+
+    def test_compresses_large_responses(self):
+
+        request_string = JSONRPC20Serializer.json_dumps(
+            JSONRPC20Serializer.assemble_request('repeat', ('abc', 1000))
+        )
+
+        code, headers, body = self._request(request_string, [('HTTP_ACCEPT_ENCODING', 'gzip;q=0.5, deflate')])
+
+        self.assertEqual(headers['Content-Encoding'], 'deflate')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        response_data = JSONRPC20Serializer.json_loads(compression.decompress(body, 'deflate'))
+        self.assertEqual(response_data['result'], 'abc' * 1000)
+
+        # not accepted by client
+        code, headers, body = self._request(request_string)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(JSONRPC20Serializer.json_loads(body)['result'], 'abc' * 1000)
+
+    def test_small_responses_are_not_compressed(self):
+
+        request_string = JSONRPC20Serializer.json_dumps(
+            JSONRPC20Serializer.assemble_request('repeat', ('abc', 2))
+        )
+
+        code, headers, body = self._request(request_string, [('HTTP_ACCEPT_ENCODING', 'gzip')])
+
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(JSONRPC20Serializer.json_loads(body)['result'], 'abcabc')
+
+    def test_decompresses_requests(self):
+
+        request = JSONRPC20Serializer.assemble_request('repeat', ('x', 3))
+        request_string = compression.compress(JSONRPC20Serializer.json_dumps(request), 'gzip')
+
+        code, headers, body = self._request(request_string, [('HTTP_CONTENT_ENCODING', 'gzip')])
+
+        self.assertEqual(code, '200 OK')
+        self.assertEqual(JSONRPC20Serializer.json_loads(body)['result'], 'xxx')
+
+    def test_bad_request_encodings(self):
+
+        code, headers, body = self._request('{}', [('HTTP_CONTENT_ENCODING', 'br')])
+        self.assertEqual(code, '415 Unsupported Media Type')
+        self.assertIn('gzip', body)
+
+        code, headers, body = self._request('{}', [('HTTP_CONTENT_ENCODING', 'gzip')])
+        self.assertEqual(code, '400 Bad Request')
+
+    def test_decompressed_size_is_limited(self):
+
+        self.app.max_decompressed_size = 1000
+        request = JSONRPC20Serializer.assemble_request('repeat', ('x' * 2000, 1))
+        request_string = compression.compress(JSONRPC20Serializer.json_dumps(request), 'gzip')
+
+        code, headers, body = self._request(request_string, [('HTTP_CONTENT_ENCODING', 'gzip')])
+
+        self.assertEqual(code, '400 Bad Request')
+
+
+class ETagTestSuite(CompressionTestSuite):
+
+    def test_etags(self):
+
+        request_string = JSONRPC20Serializer.json_dumps(
+            JSONRPC20Serializer.assemble_request('repeat', ('x', 3))
+        )
+
+        code, headers, body = self._request(request_string)
+        self.assertNotIn('ETag', headers)
+
+        self.app.etags = True
+        code, headers, body = self._request(request_string)
+        etag = headers['ETag']
+        self.assertEqual(code, '200 OK')
+
+        code, headers, body = self._request(request_string, [('HTTP_IF_NONE_MATCH', '"other", ' + etag)])
+        self.assertEqual(code, '304 Not Modified')
+        self.assertEqual(headers['ETag'], etag)
+        self.assertEqual(body, '')
+
+        code, headers, body = self._request(request_string, [('HTTP_IF_NONE_MATCH', '"other"')])
+        self.assertEqual(code, '200 OK')
+        self.assertEqual(JSONRPC20Serializer.json_loads(body)['result'], 'xxx')